@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Connection admission control for the Hyperfocus Gift Engine
+
+Keeps memory per connection bounded and predictable:
+
+- a global cap on connected clients and a per-IP cap,
+- a small inbound size limit per message type, on top of the transport-level
+  `max_size` the WebSocket server enforces before anything is parsed,
+- per-connection token buckets on inbound commands, so a chatty or hostile
+  client can't make the engine spend its loop answering it.
+
+Every frame is charged to the connection's "*" bucket and size-checked before
+it is parsed; command types with their own limits are charged again once
+parsed. Rate-limited, oversized and malformed frames all count as violations.
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_MAX_CLIENTS = 1000
+DEFAULT_MAX_CLIENTS_PER_IP = 20
+
+# Inbound size limits in bytes per message type
+INBOUND_SIZE_LIMITS = {
+    "ping": 256,
+    "connection:init": 4096,
+    "admin": 4096,
+}
+DEFAULT_INBOUND_SIZE_LIMIT = 1024
+
+# Transport-level cap handed to websockets.serve: nothing larger is ever buffered
+MAX_INBOUND_MESSAGE = max(max(INBOUND_SIZE_LIMITS.values()), DEFAULT_INBOUND_SIZE_LIMIT)
+
+# Messages the server buffers per connection before applying backpressure
+MAX_INBOUND_QUEUE = 8
+
+# (sustained commands per second, burst) per message type; "*" covers every frame
+INBOUND_RATE_LIMITS = {
+    "ping": (1.0, 5),
+    "connection:init": (0.2, 3),
+    "admin": (2.0, 10),
+    "snapshot": (0.5, 3),
+}
+DEFAULT_INBOUND_RATE_LIMIT = (10.0, 20)
+
+# Rate-limit violations tolerated before the connection is closed
+MAX_RATE_VIOLATIONS = 50
+
+# WebSocket close codes
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_POLICY_VIOLATION = 1008
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def consume(self, amount: float = 1.0) -> bool:
+        """Take tokens if available; returns False when over the limit"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+
+class ConnectionLimits:
+    __slots__ = ("buckets", "violations")
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.violations = 0
+
+    def _consume(self, key: str) -> bool:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = INBOUND_RATE_LIMITS.get(key, DEFAULT_INBOUND_RATE_LIMIT)
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+        if bucket.consume():
+            return True
+        self.violations += 1
+        return False
+
+    def allow_frame(self, size: int) -> bool:
+        """Check a raw frame, before parsing it, against the size cap and the "*" bucket"""
+        if size > MAX_INBOUND_MESSAGE:
+            self.violations += 1
+            return False
+        return self._consume("*")
+
+    def allow(self, message_type: Optional[str]) -> bool:
+        """Check a parsed message type against its own token bucket, if it has one"""
+        if message_type not in INBOUND_RATE_LIMITS:
+            return True  # Already charged to "*" by allow_frame()
+        return self._consume(message_type)
+
+    def malformed(self):
+        """Count a frame that isn't a JSON object (or a valid tap)"""
+        self.violations += 1
+
+    @property
+    def exceeded(self) -> bool:
+        return self.violations > MAX_RATE_VIOLATIONS
+
+
+def inbound_size_limit(message_type: Optional[str]) -> int:
+    return INBOUND_SIZE_LIMITS.get(message_type, DEFAULT_INBOUND_SIZE_LIMIT)
+
+
+class AdmissionController:
+    def __init__(self, max_clients: int = DEFAULT_MAX_CLIENTS,
+                 max_clients_per_ip: int = DEFAULT_MAX_CLIENTS_PER_IP):
+        """
+        Initialize admission control
+
+        Args:
+            max_clients: Connections accepted in total
+            max_clients_per_ip: Connections accepted from one address
+        """
+        self.max_clients = max_clients
+        self.max_clients_per_ip = max_clients_per_ip
+        self.clients_per_ip: Dict[str, int] = {}
+        self.total = 0
+        self.rejected = 0
+
+    def admit(self, client_ip: str) -> Tuple[bool, str]:
+        """Reserve a slot for a new connection; returns (admitted, reason)"""
+        if self.total >= self.max_clients:
+            self.rejected += 1
+            return False, "server full"
+        if self.clients_per_ip.get(client_ip, 0) >= self.max_clients_per_ip:
+            self.rejected += 1
+            return False, "too many connections from this address"
+        self.total += 1
+        self.clients_per_ip[client_ip] = self.clients_per_ip.get(client_ip, 0) + 1
+        return True, ""
+
+    def release(self, client_ip: str):
+        """Free the slot taken by admit()"""
+        self.total -= 1
+        remaining = self.clients_per_ip.get(client_ip, 1) - 1
+        if remaining > 0:
+            self.clients_per_ip[client_ip] = remaining
+        else:
+            self.clients_per_ip.pop(client_ip, None)
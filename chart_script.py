@@ -1,5 +1,4 @@
 import plotly.graph_objects as go
-import json
 
 # Data from the provided JSON
 data = {
@@ -25,62 +24,68 @@ data = {
     ]
 }
 
-# Create the radar chart
-fig = go.Figure()
 
-# Criteria labels (shortened to fit 15 char limit)
-criteria = ["Dev Speed", "Performance", "Code Reuse", "Native Feat", "User Exp", "Maintenance"]
+def build_figure():
+    """Radar chart comparing the mobile approaches"""
+    # Create the radar chart
+    fig = go.Figure()
 
-# Add each approach as a trace
-for approach in data["approaches"]:
-    # Get ratings in the same order as criteria
-    ratings = [
-        approach["ratings"]["Development Speed"],
-        approach["ratings"]["Performance"], 
-        approach["ratings"]["Code Reuse"],
-        approach["ratings"]["Native Features"],
-        approach["ratings"]["User Experience"],
-        approach["ratings"]["Maintenance"]
-    ]
+    # Criteria labels (shortened to fit 15 char limit)
+    criteria = ["Dev Speed", "Performance", "Code Reuse", "Native Feat", "User Exp", "Maintenance"]
+
+    # Add each approach as a trace
+    for approach in data["approaches"]:
+        # Get ratings in the same order as criteria
+        ratings = [
+            approach["ratings"]["Development Speed"],
+            approach["ratings"]["Performance"], 
+            approach["ratings"]["Code Reuse"],
+            approach["ratings"]["Native Features"],
+            approach["ratings"]["User Experience"],
+            approach["ratings"]["Maintenance"]
+        ]
     
-    # Shorten approach name for legend
-    name_short = approach["name"].replace("React Native + WebGPU", "RN + WebGPU").replace("Flutter + WebView", "Flutter + WebV")
+        # Shorten approach name for legend
+        name_short = approach["name"].replace("React Native + WebGPU", "RN + WebGPU").replace("Flutter + WebView", "Flutter + WebV")
     
-    fig.add_trace(go.Scatterpolar(
-        r=ratings + [ratings[0]],  # Close the shape by repeating first value
-        theta=criteria + [criteria[0]], # Close the shape by repeating first theta
-        fill='toself',
-        name=name_short,
-        line_color=approach["color"],
-        fillcolor=approach["color"],
-        opacity=0.3
-    ))
+        fig.add_trace(go.Scatterpolar(
+            r=ratings + [ratings[0]],  # Close the shape by repeating first value
+            theta=criteria + [criteria[0]], # Close the shape by repeating first theta
+            fill='toself',
+            name=name_short,
+            line_color=approach["color"],
+            fillcolor=approach["color"],
+            opacity=0.3
+        ))
 
-# Update layout
-fig.update_layout(
-    title="Mobile App Approaches",
-    polar=dict(
-        radialaxis=dict(
-            visible=True,
-            range=[0, 5],
-            tickvals=[1, 2, 3, 4, 5],
-            ticktext=['1⭐', '2⭐', '3⭐', '4⭐', '5⭐']
+    # Update layout
+    fig.update_layout(
+        title="Mobile App Approaches",
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 5],
+                tickvals=[1, 2, 3, 4, 5],
+                ticktext=['1⭐', '2⭐', '3⭐', '4⭐', '5⭐']
+            )
+        ),
+        legend=dict(
+            orientation='h', 
+            yanchor='bottom', 
+            y=1.05, 
+            xanchor='center', 
+            x=0.5
         )
-    ),
-    legend=dict(
-        orientation='h', 
-        yanchor='bottom', 
-        y=1.05, 
-        xanchor='center', 
-        x=0.5
     )
-)
+    return fig
+
 
-# Save the chart
-fig.write_image("mobile_approaches_radar.png")
-fig.write_image("mobile_approaches_radar.svg", format="svg")
+if __name__ == "__main__":
+    from render_reports import render
 
-print("Radar chart created successfully!")
-print("\nApproach Strengths:")
-for approach in data["approaches"]:
-    print(f"\n{approach['name']}: {approach['strengths']}")
\ No newline at end of file
+    # Rendered through the shared exporter; skipped when the figure hasn't changed
+    rendered, skipped = render({"mobile_approaches_radar": build_figure()}, ".")
+    print("Radar chart created successfully!" if rendered else "Radar chart unchanged (cached)")
+    print("\nApproach Strengths:")
+    for approach in data["approaches"]:
+        print(f"\n{approach['name']}: {approach['strengths']}")
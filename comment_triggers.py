@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Comment trigger engine for the Hyperfocus Gift Engine
+
+Keywords, emoji and chat commands from a trigger file are compiled into one
+Aho-Corasick automaton, so every comment is matched against all rules in a
+single pass over its characters, however many rules there are. A match can
+fire an effect (sent to clients as a "comment_trigger" event) and/or bump a
+named counter (e.g. votes).
+
+Trigger file (JSON):
+
+    {
+      "case_sensitive": false,
+      "rules": [
+        {"match": "hype", "effect": {"type": "hype_wave", "intensity": 4}},
+        {"match": "🔥", "counter": "fire"},
+        {"match": "!vote red", "kind": "command", "counter": "vote_red"}
+      ]
+    }
+
+Rule kinds:
+
+- "keyword" (default for word-like patterns): matches whole words only
+- "substring" (default for anything else, such as emoji): matches anywhere
+- "command": matches only at the start of the comment
+
+Each rule fires at most once per comment. Effects are limited to one per
+rule per `cooldown` seconds (DEFAULT_COOLDOWN); counters count every match.
+The file is re-checked every RELOAD_CHECK_INTERVAL seconds and recompiled
+off the event loop when it changes; counters carry over by name.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_COOLDOWN = 1.0
+RELOAD_CHECK_INTERVAL = 2.0
+RULE_KINDS = ("keyword", "substring", "command")
+
+
+class TriggerRule:
+    __slots__ = ("name", "pattern", "kind", "effect", "counter", "cooldown", "last_fired")
+
+    def __init__(self, name: str, pattern: str, kind: str, effect: Optional[Dict[str, Any]],
+                 counter: Optional[str], cooldown: float):
+        self.name = name
+        self.pattern = pattern
+        self.kind = kind
+        self.effect = effect
+        self.counter = counter
+        self.cooldown = cooldown
+        self.last_fired = 0.0
+
+
+class TriggerAutomaton:
+    def __init__(self, rules: List[TriggerRule], case_sensitive: bool = False):
+        """
+        Compile rules into an Aho-Corasick automaton
+
+        Args:
+            rules: Rules to match (patterns already case-folded if needed)
+            case_sensitive: Match comments as-is instead of lowercased
+        """
+        self.rules = rules
+        self.case_sensitive = case_sensitive
+        # State 0 is the root; goto[state] maps a character to the next state
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for index, rule in enumerate(rules):
+            state = 0
+            for char in rule.pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(index)
+
+        # Breadth-first failure links; each state's outputs include those of its failure state
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                target = goto[fallback].get(char, 0)
+                fail[next_state] = target if target != next_state else 0
+                outputs[next_state].extend(outputs[fail[next_state]])
+
+        self.goto = goto
+        self.fail = fail
+        self.outputs: List[Tuple[int, ...]] = [tuple(output) for output in outputs]
+        self.alphabet = frozenset(char for transitions in goto for char in transitions)
+
+    def __len__(self):
+        return len(self.goto)
+
+    def match(self, text: str) -> List[TriggerRule]:
+        """Rules matched in `text`, each at most once, in order of first match"""
+        if not self.case_sensitive:
+            text = text.lower()
+        goto, fail, outputs, alphabet, rules = self.goto, self.fail, self.outputs, self.alphabet, self.rules
+        start = len(text) - len(text.lstrip())
+        matched: List[TriggerRule] = []
+        seen = set()
+        state = 0
+        for end, char in enumerate(text):
+            if char not in alphabet:
+                state = 0  # No pattern contains this character
+                continue
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            for index in outputs[state]:
+                if index in seen:
+                    continue
+                rule = rules[index]
+                begin = end + 1 - len(rule.pattern)
+                if rule.kind == "command":
+                    if begin != start:
+                        continue
+                elif rule.kind == "keyword":
+                    if (begin > 0 and text[begin - 1].isalnum()) or \
+                            (end + 1 < len(text) and text[end + 1].isalnum()):
+                        continue
+                seen.add(index)
+                matched.append(rule)
+        return matched
+
+
+def compile_rules(config: Dict[str, Any]) -> TriggerAutomaton:
+    """Build an automaton from a parsed trigger file; raises ValueError on bad rules"""
+    case_sensitive = bool(config.get("case_sensitive", False))
+    rules = []
+    for number, entry in enumerate(config.get("rules", []), start=1):
+        if not isinstance(entry, dict) or not isinstance(entry.get("match"), str) or not entry["match"]:
+            raise ValueError(f"Rule {number} needs a non-empty \"match\" string")
+        pattern = entry["match"] if case_sensitive else entry["match"].lower()
+        kind = entry.get("kind") or ("keyword" if pattern.replace(" ", "").isalnum() else "substring")
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Rule {number} has unknown kind {kind!r}")
+        effect = entry.get("effect")
+        counter = entry.get("counter")
+        if effect is None and counter is None:
+            raise ValueError(f"Rule {number} ({pattern!r}) has neither an effect nor a counter")
+        rules.append(TriggerRule(
+            name=str(entry.get("name", entry["match"])),
+            pattern=pattern,
+            kind=kind,
+            effect=effect,
+            counter=str(counter) if counter is not None else None,
+            cooldown=float(entry.get("cooldown", DEFAULT_COOLDOWN))
+        ))
+    return TriggerAutomaton(rules, case_sensitive)
+
+
+def load_triggers(path: str) -> TriggerAutomaton:
+    with open(path, encoding="utf-8") as f:
+        return compile_rules(json.load(f))
+
+
+class CommentTriggers:
+    def __init__(self, path: str, timers: Optional[TimerWheel] = None):
+        """
+        Initialize the trigger engine (call load() before use)
+
+        Args:
+            path: Trigger file to compile and watch for changes
+            timers: Timer wheel for the change checks (the engine's shared wheel)
+        """
+        self.path = path
+        self.timers = timers if timers is not None else TimerWheel()
+        self.automaton = TriggerAutomaton([])
+        self.counters: Dict[str, int] = {}
+        self.comments_matched = 0
+        self.effects_fired = 0
+        self.reloads = 0
+        self._mtime: Optional[float] = None
+        self._check_handle = None
+        self._reloading: Optional[asyncio.Task] = None
+
+    def load(self) -> int:
+        """Compile the trigger file now; returns the number of rules"""
+        self._mtime = os.stat(self.path).st_mtime
+        self.automaton = load_triggers(self.path)
+        return len(self.automaton.rules)
+
+    async def reload(self) -> int:
+        """Recompile the trigger file off the event loop and swap it in"""
+        mtime = os.stat(self.path).st_mtime
+        automaton = await asyncio.get_running_loop().run_in_executor(None, load_triggers, self.path)
+        # Matching never awaits, so the swap is atomic for on_comment
+        self.automaton = automaton
+        self._mtime = mtime
+        self.reloads += 1
+        logger.info(f"Compiled {len(automaton.rules)} comment triggers ({len(automaton)} states) from {self.path}")
+        return len(automaton.rules)
+
+    def _check(self):
+        self._check_handle = self.timers.call_later(RELOAD_CHECK_INTERVAL, self._check)
+        if self._reloading is not None and not self._reloading.done():
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return  # Being replaced; keep the current rules
+        if mtime != self._mtime:
+            self._reloading = asyncio.create_task(self._reload_logged())
+
+    async def _reload_logged(self):
+        try:
+            await self.reload()
+        except (OSError, ValueError) as e:
+            # Keep matching with the last good rules until the file is fixed
+            self._mtime = os.stat(self.path).st_mtime if os.path.exists(self.path) else None
+            logger.error(f"Keeping previous comment triggers; could not compile {self.path}: {e}")
+
+    def start(self):
+        if self._check_handle is None:
+            self._check_handle = self.timers.call_later(RELOAD_CHECK_INTERVAL, self._check)
+
+    def stop(self):
+        if self._check_handle is not None:
+            self._check_handle.cancel()
+            self._check_handle = None
+
+    def match(self, message: str) -> List[Dict[str, Any]]:
+        """
+        Run a comment through the automaton and count its matches
+
+        Returns the effects to send, as {"trigger", "effect", "counter", "count"} dicts
+        """
+        rules = self.automaton.match(message)
+        if not rules:
+            return []
+        self.comments_matched += 1
+        fired = []
+        now = time.monotonic()
+        counters = self.counters
+        for rule in rules:
+            count = None
+            if rule.counter is not None:
+                count = counters[rule.counter] = counters.get(rule.counter, 0) + 1
+            if rule.effect is None or now - rule.last_fired < rule.cooldown:
+                continue
+            rule.last_fired = now
+            self.effects_fired += 1
+            fired.append({
+                "trigger": rule.name,
+                "effect": rule.effect,
+                "counter": rule.counter,
+                "count": count
+            })
+        return fired
+
+    def reset_counters(self):
+        self.counters = {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "rules": len(self.automaton.rules),
+            "states": len(self.automaton),
+            "reloads": self.reloads,
+            "comments_matched": self.comments_matched,
+            "effects_fired": self.effects_fired,
+            "counters": dict(self.counters)
+        }
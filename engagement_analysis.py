@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Data-driven gift engagement analysis for the Hyperfocus Gift Engine
+
+Reads the Parquet archives written with --archive-dir (see event_archive.py)
+in record-batch chunks and aggregates them with NumPy, one stream at a time,
+so memory stays bounded by the chunk size and one stream's distinct
+(gift, sender) pairs no matter how many months are scanned.
+
+Per gift, across all streams:
+
+- sends / coins:   completed gifts (the last event of a streak) and
+                   diamond_count x repeat_count
+- repeat rate:     share of (stream, sender) pairs that sent the gift 2+ times
+- follow-on rate:  share of sends followed by a gift from another viewer
+                   within the window (default 30 s)
+- comment uplift:  comments in the window after the gift, relative to the
+                   stream's average comment rate while active
+
+Gifts are ranked by engagement index = comment uplift x (1 + follow-on rate),
+among gifts with at least --min-sends sends. The report replaces
+high_engagement_gifts_analysis.md and observed coin values are turned into a
+tier file the engine loads with --gift-tiers.
+
+Example usage:
+    python engagement_analysis.py archive/
+    python engagement_analysis.py archive/ --stream someuser --since 2025-01-01 --window 60
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependencies
+    np = None
+
+from event_archive import archive_files
+from gift_scheduler import GIFT_TIERS, TIER_COIN_THRESHOLDS
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_REPORT = "high_engagement_gifts_analysis.md"
+DEFAULT_TIERS_FILE = "gift_tiers.json"
+DEFAULT_WINDOW_SECONDS = 30.0
+DEFAULT_CHUNK_ROWS = 262144
+DEFAULT_MIN_SENDS = 20
+TOP_GIFTS = 10
+ACTIVE_GAP_MS = 300000  # Gaps longer than this count as the stream being offline
+
+READ_COLUMNS = ["timestamp", "event", "user", "gift_name", "diamond_count", "repeat_count", "is_streaking"]
+METRICS = ("sends", "coins", "senders", "repeaters", "follow_on", "comments_after",
+           "expected_comments", "max_price")
+
+
+def _codes(column, lookup) -> "np.ndarray":
+    """Map a (dictionary) string column to codes from lookup(values); nulls become -1"""
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    mapping = np.append(np.asarray(lookup(column.dictionary.to_pylist()), dtype=np.int64), -1)
+    indices = pc.fill_null(column.indices, len(column.dictionary)).to_numpy()
+    return mapping[indices]
+
+
+def _ints(column) -> "np.ndarray":
+    return pc.fill_null(column.cast(pa.int64()), 0).to_numpy()
+
+
+class GiftStats:
+    """Per-gift totals across every stream analyzed"""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.totals = {name: np.zeros(0, dtype=np.float64) for name in METRICS}
+        self.streams = 0
+        self.comments = 0
+        self.active_seconds = 0.0
+
+    def codes(self, names: List[Optional[str]]) -> List[int]:
+        codes = []
+        for name in names:
+            if name is None:
+                codes.append(-1)
+                continue
+            code = self.index.get(name)
+            if code is None:
+                code = self.index[name] = len(self.names)
+                self.names.append(name)
+            codes.append(code)
+        return codes
+
+    def add(self, metric: str, values: "np.ndarray"):
+        total = self.totals[metric]
+        if len(total) < len(values):
+            total = self.totals[metric] = np.pad(total, (0, len(values) - len(total)))
+        total[:len(values)] += values
+
+    def maximum(self, metric: str, values: "np.ndarray"):
+        self.add(metric, np.zeros(len(values)))
+        total = self.totals[metric]
+        total[:len(values)] = np.maximum(total[:len(values)], values)
+
+    def column(self, metric: str) -> "np.ndarray":
+        total = self.totals[metric]
+        return np.pad(total, (0, len(self.names) - len(total)))
+
+
+class StreamPass:
+    """Chunked aggregation over one stream's archive, in time order"""
+
+    def __init__(self, stats: GiftStats, window_ms: int):
+        self.stats = stats
+        self.window_ms = window_ms
+        self.users: Dict[str, int] = {}
+        # Rows whose follow-on window isn't complete yet: t, is_gift, gift, user, coins
+        self.carry = (np.zeros(0, np.int64), np.zeros(0, bool), np.zeros(0, np.int64),
+                      np.zeros(0, np.int64), np.zeros(0, np.int64))
+        self.pair_keys = np.zeros(0, np.int64)
+        self.pair_counts = np.zeros(0, np.int64)
+        self.sends = np.zeros(0, np.float64)
+        self.comments = 0
+        self.active_ms = 0
+        self.last_t: Optional[int] = None
+
+    def _user_codes(self, names: List[Optional[str]]) -> List[int]:
+        users = self.users
+        return [-1 if name is None else users.setdefault(name, len(users)) for name in names]
+
+    def add_batch(self, batch):
+        columns = dict(zip(batch.schema.names, batch.columns))
+        t = columns["timestamp"].cast(pa.int64()).to_numpy(zero_copy_only=False)
+        event = _codes(columns["event"], lambda values: [
+            1 if value == "gift_received" else 2 if value == "comment" else 0 for value in values])
+        streaking = pc.fill_null(columns["is_streaking"], False).to_numpy(zero_copy_only=False)
+        gift = _codes(columns["gift_name"], self.stats.codes)
+        is_gift = (event == 1) & ~streaking & (gift >= 0)  # One row per completed streak
+        keep = is_gift | (event == 2)
+        user = _codes(columns["user"], self._user_codes)
+        price = _ints(columns["diamond_count"])
+        coins = price * np.maximum(_ints(columns["repeat_count"]), 1)
+        if is_gift.any():
+            max_price = np.zeros(gift[is_gift].max() + 1)
+            np.maximum.at(max_price, gift[is_gift], price[is_gift])
+            self.stats.maximum("max_price", max_price)
+        rows = (t[keep], is_gift[keep], gift[keep], user[keep], coins[keep])
+        self._process(tuple(np.concatenate(pair) for pair in zip(self.carry, rows)), final=False)
+
+    def finish(self):
+        self._process(self.carry, final=True)
+        stats = self.stats
+        active_seconds = self.active_ms / 1000.0
+        if active_seconds > 0:
+            # Comments expected in a window at this stream's average rate
+            rate = self.comments / active_seconds
+            stats.add("expected_comments", self.sends * rate * self.window_ms / 1000.0)
+        if len(self.pair_keys):
+            gift = self.pair_keys >> 32
+            stats.add("senders", np.bincount(gift).astype(np.float64))
+            stats.add("repeaters", np.bincount(gift[self.pair_counts >= 2], minlength=gift.max() + 1)
+                      .astype(np.float64))
+        stats.streams += 1
+        stats.comments += self.comments
+        stats.active_seconds += active_seconds
+
+    def _process(self, rows: Tuple["np.ndarray", ...], final: bool):
+        order = np.argsort(rows[0], kind="stable")
+        t, is_gift, gift, user, coins = (column[order] for column in rows)
+        if not len(t):
+            return
+        window = self.window_ms
+        # Gifts whose window ends inside this chunk are complete; the rest wait for the next one
+        ready_before = t[-1] - window if not final else t[-1]
+        done = t <= ready_before
+        self.carry = tuple(column[~done] for column in (t, is_gift, gift, user, coins))
+
+        gift_t, gift_code, gift_user = t[is_gift], gift[is_gift], user[is_gift]
+        ready = done[is_gift]
+        comment_t = t[~is_gift]
+
+        # Next gift from a different viewer: the first gift after the sender's run of gifts
+        boundaries = np.flatnonzero(gift_user[1:] != gift_user[:-1]) + 1
+        run_end = np.searchsorted(boundaries, np.arange(len(gift_t)), side="right")
+        has_next = run_end < len(boundaries)
+        follow_on = np.zeros(len(gift_t), dtype=bool)
+        follow_on[has_next] = gift_t[boundaries[run_end[has_next]]] - gift_t[has_next] <= window
+
+        comments_after = (np.searchsorted(comment_t, gift_t + window, side="right")
+                          - np.searchsorted(comment_t, gift_t, side="right"))
+
+        codes = gift_code[ready]
+        if len(codes):
+            size = codes.max() + 1
+            stats = self.stats
+            sends = np.bincount(codes, minlength=size).astype(np.float64)
+            stats.add("sends", sends)
+            stats.add("coins", np.bincount(codes, coins[is_gift][ready], minlength=size))
+            stats.add("follow_on", np.bincount(codes, follow_on[ready], minlength=size))
+            stats.add("comments_after", np.bincount(codes, comments_after[ready], minlength=size))
+            if len(self.sends) < size:
+                self.sends = np.pad(self.sends, (0, size - len(self.sends)))
+            self.sends[:size] += sends
+            self._count_pairs((codes << 32) | gift_user[ready])
+
+        # Comment totals and active time over the rows leaving the window
+        self.comments += int(np.count_nonzero(~is_gift & done))
+        done_t = t[done]
+        if len(done_t):
+            if self.last_t is not None:
+                done_t = np.concatenate(([self.last_t], done_t))
+            self.active_ms += int(np.minimum(np.diff(done_t), ACTIVE_GAP_MS).sum())
+            self.last_t = int(done_t[-1])
+
+    def _count_pairs(self, keys: "np.ndarray"):
+        keys = np.concatenate((self.pair_keys, keys))
+        counts = np.concatenate((self.pair_counts, np.ones(len(keys) - len(self.pair_keys), np.int64)))
+        order = np.argsort(keys, kind="stable")
+        keys, counts = keys[order], counts[order]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        self.pair_keys = keys[starts]
+        self.pair_counts = np.add.reduceat(counts, starts)
+
+
+def analyze(root_dir: str, streams: Optional[List[str]] = None, since: Optional[str] = None,
+            until: Optional[str] = None, window_seconds: float = DEFAULT_WINDOW_SECONDS,
+            chunk_rows: int = DEFAULT_CHUNK_ROWS) -> GiftStats:
+    """Aggregate per-gift engagement over every matching archive file"""
+    stats = GiftStats()
+    for stream, files in archive_files(root_dir, streams, since, until).items():
+        stream_pass = StreamPass(stats, int(window_seconds * 1000))
+        for path in files:
+            parquet = pq.ParquetFile(path)
+            for batch in parquet.iter_batches(batch_size=chunk_rows, columns=READ_COLUMNS):
+                stream_pass.add_batch(batch)
+        stream_pass.finish()
+        logger.info(f"Analyzed @{stream}: {len(files)} file(s), {len(stream_pass.users)} viewers")
+    return stats
+
+
+def gift_table(stats: GiftStats) -> List[Dict[str, Any]]:
+    """Per-gift metrics, highest engagement index first"""
+    sends = stats.column("sends")
+    senders = stats.column("senders")
+    expected = stats.column("expected_comments")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        repeat_rate = np.where(senders > 0, stats.column("repeaters") / senders, 0.0)
+        follow_on_rate = np.where(sends > 0, stats.column("follow_on") / sends, 0.0)
+        uplift = np.where(expected > 0, stats.column("comments_after") / expected, 0.0)
+    engagement = uplift * (1 + follow_on_rate)
+    coins = stats.column("coins")
+    price = stats.column("max_price")
+    rows = []
+    for code in np.argsort(-engagement, kind="stable"):
+        rows.append({
+            "gift": stats.names[code],
+            "sends": int(sends[code]),
+            "coins": int(coins[code]),
+            "price": int(price[code]),
+            "senders": int(senders[code]),
+            "repeat_rate": float(repeat_rate[code]),
+            "follow_on_rate": float(follow_on_rate[code]),
+            "comment_uplift": float(uplift[code]),
+            "engagement": float(engagement[code])
+        })
+    return rows
+
+
+def assign_tiers(rows: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Price tier per gift from its observed coin value (the scheduler's thresholds)"""
+    tiers = {}
+    for row in rows:
+        if not row["price"]:
+            continue  # No coin value recorded; the engine keeps its own mapping
+        tier = "volume"
+        for name, threshold in TIER_COIN_THRESHOLDS:
+            if row["price"] >= threshold:
+                tier = name
+                break
+        tiers[row["gift"]] = tier
+    return tiers
+
+
+def render_report(stats: GiftStats, rows: List[Dict[str, Any]], tiers: Dict[str, str],
+                  window_seconds: float, min_sends: int, source: str) -> str:
+    ranked = [row for row in rows if row["sends"] >= min_sends]
+    total_sends = sum(row["sends"] for row in rows)
+    total_coins = sum(row["coins"] for row in rows)
+    lines = [
+        "# 🎯 Gift Engagement Analysis",
+        "",
+        f"Generated {time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime())} by `engagement_analysis.py` "
+        f"from `{source}`: {stats.streams} stream(s), {stats.active_seconds / 3600:.1f} active hours, "
+        f"{total_sends:,} gifts ({total_coins:,} coins) and {stats.comments:,} comments.",
+        "",
+        "## How gifts are scored",
+        "",
+        "- **Repeat rate**: share of viewers (per stream) who sent the gift more than once",
+        f"- **Follow-on**: share of sends followed by another viewer's gift within {window_seconds:g}s",
+        f"- **Comment uplift**: comments in the {window_seconds:g}s after the gift, relative to the "
+        "stream's average comment rate (1.0 = no change)",
+        "- **Engagement index**: comment uplift × (1 + follow-on rate)",
+        "",
+        f"## 🏆 Top {TOP_GIFTS} gifts by engagement (at least {min_sends} sends)",
+        "",
+    ]
+    header = ["| # | Gift | Sends | Coins | Repeat rate | Follow-on | Comment uplift | Engagement |",
+              "|---|------|------:|------:|------------:|----------:|---------------:|-----------:|"]
+
+    def row_line(rank, row):
+        return (f"| {rank} | {row['gift']} | {row['sends']:,} | {row['coins']:,} | {row['repeat_rate']:.1%} | "
+                f"{row['follow_on_rate']:.1%} | {row['comment_uplift']:.2f}x | {row['engagement']:.2f} |")
+
+    if ranked:
+        lines += header + [row_line(rank, row) for rank, row in enumerate(ranked[:TOP_GIFTS], 1)]
+    else:
+        lines.append("_Not enough data yet: no gift reached the minimum number of sends._")
+    lines += ["", "## 📊 All gifts", ""]
+    lines += header + [row_line(rank, row) for rank, row in enumerate(rows, 1)]
+
+    lines += ["", "## 🎚️ Tier assignments", "",
+              "Price tiers from observed coin values, using the scheduler's thresholds "
+              "(written to the tier file; load it with `--gift-tiers`).", "",
+              "| Gift | Coins | Tier | Built-in tier |", "|------|------:|------|---------------|"]
+    prices = {row["gift"]: row["price"] for row in rows}
+    for gift, tier in sorted(tiers.items(), key=lambda item: -prices[item[0]]):
+        builtin = GIFT_TIERS.get(gift, "-")
+        changed = " ⚠️" if builtin not in ("-", tier) else ""
+        lines.append(f"| {gift} | {prices[gift]:,} | {tier} | {builtin}{changed} |")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def main():
+    """Analyze archived events and regenerate the report and tier file"""
+    parser = argparse.ArgumentParser(description='Hyperfocus gift engagement analysis')
+    parser.add_argument('archive_dir', help='Directory written with --archive-dir')
+    parser.add_argument('--stream', action='append', default=None,
+                        help='Only analyze this stream (may be repeated)')
+    parser.add_argument('--since', default=None, help='First day to include (YYYY-MM-DD)')
+    parser.add_argument('--until', default=None, help='Last day to include (YYYY-MM-DD)')
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW_SECONDS,
+                        help=f'Seconds after a gift for follow-on gifts and comments (default: {DEFAULT_WINDOW_SECONDS:g})')
+    parser.add_argument('--min-sends', type=int, default=DEFAULT_MIN_SENDS,
+                        help=f'Sends a gift needs to be ranked (default: {DEFAULT_MIN_SENDS})')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f'Rows read per chunk (default: {DEFAULT_CHUNK_ROWS})')
+    parser.add_argument('--report', default=DEFAULT_REPORT, help=f'Markdown report (default: {DEFAULT_REPORT})')
+    parser.add_argument('--tiers-file', default=DEFAULT_TIERS_FILE,
+                        help=f'Gift tier file for --gift-tiers (default: {DEFAULT_TIERS_FILE})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if np is None:
+        print("Error: the analysis needs numpy and pyarrow (pip install numpy pyarrow)")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    stats = analyze(args.archive_dir, args.stream, args.since, args.until, args.window, args.chunk_rows)
+    if not stats.streams:
+        print(f"Error: no archived events found in {args.archive_dir}")
+        sys.exit(1)
+    rows = gift_table(stats)
+    tiers = assign_tiers(rows)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        f.write(render_report(stats, rows, tiers, args.window, args.min_sends, args.archive_dir))
+    with open(args.tiers_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "source": args.archive_dir,
+            "tiers": tiers
+        }, f, indent=2)
+
+    print(f"Analyzed {int(stats.column('sends').sum()):,} gifts from {stats.streams} stream(s) "
+          f"in {time.perf_counter() - started:.1f}s")
+    print(f"Report: {args.report}")
+    print(f"Tiers:  {args.tiers_file} ({len(tiers)} gifts)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Columnar event archive for the Hyperfocus Gift Engine
+
+Every gift and comment the engine receives is appended to in-memory column
+buffers and written by a background task to Parquet files, partitioned by
+stream and day (Hive style, so pyarrow.dataset, DuckDB, Polars and Spark all
+read the partitions as columns):
+
+    <root>/stream=<username>/date=YYYY-MM-DD/part-<opened>-<pid>-<n>.parquet
+
+Rows stay buffered until they fill a row group (row_group_size) or the part
+is due to rotate, so row groups are large even on quiet streams; the
+repeating string columns (event, user, gift name, tier) are dictionary
+encoded and the files are zstd compressed, so scans over months of gifts
+only read the columns they need.
+A part file is only complete once its footer is written: files are written
+as *.parquet.tmp and renamed when closed, after FILE_ROTATE_SECONDS or at
+shutdown. A crash loses the rows still buffered plus the unfinished part
+(at most FILE_ROTATE_SECONDS of events); the footerless *.parquet.tmp it
+leaves behind can't be read, and is removed when the archive next starts.
+
+Gift rows are recorded as TikTok sends them, before the scheduler merges
+anything. During a streak TikTok repeats the gift with a growing repeat_count
+and is_streaking set; the final event of a streak has is_streaking false.
+
+pyarrow is optional; the engine only needs it with --archive-dir.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency
+    pa = None
+    pq = None
+
+from event_tracing import to_unix_nanos
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_ROW_GROUP_SIZE = 65536
+DEFAULT_FLUSH_INTERVAL = 60.0
+FILE_ROTATE_SECONDS = 900
+MAX_BUFFERED_ROWS = 1 << 20  # Drop rows rather than grow without bound if writes stall
+MS_PER_DAY = 86400000
+
+COLUMNS = ("timestamp", "event", "user", "gift_name", "gift_id", "diamond_count",
+           "repeat_count", "is_streaking", "tier")
+DICTIONARY_COLUMNS = ["event", "user", "gift_name", "tier"]
+
+
+def archive_available() -> bool:
+    """True if pyarrow is installed"""
+    return pa is not None
+
+
+def archive_schema():
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("event", dictionary),
+        ("user", dictionary),
+        ("gift_name", dictionary),
+        ("gift_id", pa.int64()),
+        ("diamond_count", pa.int32()),
+        ("repeat_count", pa.int32()),
+        ("is_streaking", pa.bool_()),
+        ("tier", dictionary),
+    ])
+
+
+def archive_files(root_dir: str, streams: Optional[List[str]] = None, since: Optional[str] = None,
+                  until: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Finished part files per stream, oldest first
+
+    Args:
+        root_dir: Archive directory (as passed to --archive-dir)
+        streams: Only these streams (default: all)
+        since: First date to include (YYYY-MM-DD)
+        until: Last date to include (YYYY-MM-DD)
+    """
+    found: Dict[str, List[str]] = {}
+    if not os.path.isdir(root_dir):
+        return found
+    for stream_dir in sorted(os.listdir(root_dir)):
+        if not stream_dir.startswith("stream="):
+            continue
+        stream = stream_dir[len("stream="):]
+        if streams and stream not in streams:
+            continue
+        files = []
+        for date_dir in sorted(os.listdir(os.path.join(root_dir, stream_dir))):
+            date = date_dir[len("date="):]
+            if not date_dir.startswith("date=") or (since and date < since) or (until and date > until):
+                continue
+            directory = os.path.join(root_dir, stream_dir, date_dir)
+            # part-<opened>-<pid>-<n>.parquet; files still being written end in .tmp
+            names = [name for name in os.listdir(directory) if name.endswith(".parquet")]
+            names.sort(key=lambda name: [int(p) if p.isdigit() else p for p in name[:-len(".parquet")].split("-")])
+            files.extend(os.path.join(directory, name) for name in names)
+        if files:
+            found[stream] = files
+    return found
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _log_orphan_errors(future):
+    if future.exception() is not None:
+        logger.error(f"Could not clean up unfinished archive files: {future.exception()}")
+
+
+class EventArchive:
+    def __init__(self, root_dir: str, stream: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, timers: Optional[TimerWheel] = None):
+        """
+        Initialize the archive
+
+        Args:
+            root_dir: Directory the stream=/date= partitions are created under
+            stream: Stream (TikTok username) the events belong to
+            row_group_size: Rows per Parquet row group; buffers are written once they hold this many
+            flush_interval: Seconds between checks for a part that is due to rotate
+            timers: Timer wheel for the flush interval (the engine's shared wheel)
+        """
+        if pa is None:
+            raise RuntimeError("The event archive needs pyarrow (pip install pyarrow)")
+        self.root_dir = root_dir
+        self.stream = stream or "unknown"
+        self.row_group_size = row_group_size
+        self.flush_interval = flush_interval
+        self.schema = archive_schema()
+        self._columns = self._empty_columns()
+        self._buffer_started = 0.0  # When the oldest buffered row arrived
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.files_written = 0
+        self.files_opened = 0
+        # One writer thread, so row groups land in order and writers are never shared
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-archive")
+        # date -> (writer, temporary path, final path, opened at)
+        self._writers: Dict[str, Tuple[Any, str, str, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending_writes: Set[asyncio.Future] = set()
+        self.timers = timers if timers is not None else TimerWheel()
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, List[Any]]:
+        return {name: [] for name in COLUMNS}
+
+    def __len__(self):
+        return len(self._columns["timestamp"])
+
+    def add(self, record):
+        """Buffer a GiftRecord or CommentRecord (cheap; called from the TikTok handlers)"""
+        columns = self._columns
+        if len(columns["timestamp"]) >= MAX_BUFFERED_ROWS:
+            self.rows_dropped += 1
+            return
+        if not columns["timestamp"]:
+            self._buffer_started = time.time()
+        nanos = to_unix_nanos(record.timestamp) or time.time_ns()
+        columns["timestamp"].append(nanos // 1000000)
+        columns["event"].append(record.event)
+        columns["user"].append(record.username)
+        if record.event == "gift_received":
+            columns["gift_name"].append(record.gift_name)
+            columns["gift_id"].append(_int_or_none(record.gift_id))
+            columns["diamond_count"].append(_int_or_none(record.diamond_count))
+            columns["repeat_count"].append(_int_or_none(record.repeat_count))
+            columns["is_streaking"].append(bool(record.is_streaking))
+            columns["tier"].append(record.tier)
+        else:
+            for name in ("gift_name", "gift_id", "diamond_count", "repeat_count", "is_streaking", "tier"):
+                columns[name].append(None)
+        if self._task is not None and len(columns["timestamp"]) >= self.row_group_size:
+            # A full row group is written right away rather than at rotation time
+            self._start_write(self._take(), False)
+
+    def _partition_path(self, date: str) -> str:
+        return os.path.join(self.root_dir, f"stream={self.stream}", f"date={date}")
+
+    def _open_writer(self, date: str):
+        directory = self._partition_path(date)
+        os.makedirs(directory, exist_ok=True)
+        opened = time.time()
+        self.files_opened += 1
+        final_path = os.path.join(directory, f"part-{int(opened)}-{os.getpid()}-{self.files_opened}.parquet")
+        temp_path = final_path + ".tmp"
+        writer = pq.ParquetWriter(
+            temp_path, self.schema,
+            compression="zstd",
+            use_dictionary=DICTIONARY_COLUMNS,
+            write_statistics=True
+        )
+        self._writers[date] = (writer, temp_path, final_path, opened)
+        return writer
+
+    def _close_writer(self, date: str):
+        writer, temp_path, final_path, _ = self._writers.pop(date)
+        writer.close()
+        os.replace(temp_path, final_path)
+        self.files_written += 1
+
+    def _write(self, columns: Dict[str, List[Any]], finish: bool = False):
+        """Write buffered rows as row groups, split by day, and finish due parts (runs on the writer thread)"""
+        if not columns["timestamp"]:
+            if finish:
+                self._close_all()
+            return
+        table = pa.table({name: columns[name] for name in COLUMNS}, schema=self.schema)
+        days = [ts // MS_PER_DAY for ts in columns["timestamp"]]
+        first_day = days[0]
+        if all(day == first_day for day in days):
+            parts = {first_day: table}
+        else:
+            # Rows straddling midnight (or late events) go to their own day's partition
+            rows_by_day: Dict[int, List[int]] = {}
+            for index, day in enumerate(days):
+                rows_by_day.setdefault(day, []).append(index)
+            parts = {day: table.take(pa.array(rows)) for day, rows in rows_by_day.items()}
+
+        for day, part in sorted(parts.items()):
+            date = time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+            writer = self._writers.get(date)
+            if writer is None:
+                writer = self._open_writer(date)
+            else:
+                writer = writer[0]
+            writer.write_table(part, row_group_size=self.row_group_size)
+        self.rows_written += table.num_rows
+
+        # Finish files so readers can see them: older days, and files open long enough
+        latest = time.strftime("%Y-%m-%d", time.gmtime(max(parts) * 86400))
+        now = time.time()
+        for date, (_, _, _, opened) in list(self._writers.items()):
+            if finish or date < latest or now - opened >= FILE_ROTATE_SECONDS:
+                self._close_writer(date)
+
+    def _close_all(self):
+        for date in list(self._writers):
+            self._close_writer(date)
+
+    def _take(self) -> Dict[str, List[Any]]:
+        columns, self._columns = self._columns, self._empty_columns()
+        return columns
+
+    def _start_write(self, columns: Dict[str, List[Any]], finish: bool) -> asyncio.Future:
+        # Submitted now, so writes reach the (single) writer thread in buffer order
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._write, columns, finish)
+        self._pending_writes.add(future)
+        future.add_done_callback(lambda done: self._write_done(done, len(columns["timestamp"])))
+        return future
+
+    def _write_done(self, future: asyncio.Future, rows: int):
+        self._pending_writes.discard(future)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, (OSError, pa.ArrowException)):
+            logger.error(f"Could not write {rows} archived events: {error}")
+        elif error is not None:
+            logger.error(f"Archive write failed: {error}", exc_info=error)
+
+    async def flush(self, finish: bool = False):
+        """
+        Write everything buffered so far off the event loop
+
+        Args:
+            finish: Also finish every open part, so readers can see it
+        """
+        if not len(self) and not (finish and self._writers):
+            return
+        await asyncio.wait([self._start_write(self._take(), finish)])
+
+    def _rotation_due(self) -> bool:
+        """True once the oldest unfinished row (buffered, or in an open part) is FILE_ROTATE_SECONDS old"""
+        started = [opened for _, _, _, opened in list(self._writers.values())]
+        if len(self):
+            started.append(self._buffer_started)
+        return bool(started) and time.time() - min(started) >= FILE_ROTATE_SECONDS
+
+    async def _run(self):
+        # Full row groups are written from add(); this only finishes parts on time
+        while True:
+            await self.timers.sleep(self.flush_interval)
+            if self._rotation_due():
+                await self.flush(finish=True)
+
+    def _remove_orphans(self):
+        """Delete unfinished part files left by engines that died (runs on the writer thread)"""
+        stream_dir = os.path.join(self.root_dir, f"stream={self.stream}")
+        if not os.path.isdir(stream_dir):
+            return
+        for date_dir in os.listdir(stream_dir):
+            directory = os.path.join(stream_dir, date_dir)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.endswith(".parquet.tmp"):
+                    continue
+                # part-<opened>-<pid>-<n>.parquet.tmp; a live pid may be an engine handing off to us
+                pid = _int_or_none(name.split("-")[2]) if name.count("-") >= 3 else None
+                if pid is not None and (pid == os.getpid() or _pid_alive(pid)):
+                    continue
+                path = os.path.join(directory, name)
+                logger.warning(f"Removing unfinished archive file {path} ({os.path.getsize(path)} bytes) "
+                               f"left by a crashed engine")
+                os.remove(path)
+
+    def start(self):
+        if self._task is None:
+            self._executor.submit(self._remove_orphans).add_done_callback(_log_orphan_errors)
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Archiving events to {self._partition_path('*')}")
+
+    async def stop(self):
+        """Write remaining rows and finish all open files"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending_writes:
+            await asyncio.wait(self._pending_writes)
+        await self.flush(finish=True)
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root_dir": self.root_dir,
+            "stream": self.stream,
+            "buffered": len(self),
+            "written": self.rows_written,
+            "dropped": self.rows_dropped,
+            "files_written": self.files_written,
+            "open_files": len(self._writers)
+        }
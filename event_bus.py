@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Cross-node event bus for the Hyperfocus Gift Engine
+
+The engine publishes every encoded event to a bus, and its own fan-out
+(WebSocket, SSE, shared memory) is just one subscriber. With a broker between
+nodes, one ingest node connects to TikTok and encodes each event once per frame
+group. Any number of edge nodes subscribe and send those frames to their own
+clients without re-encoding, so a big stream's viewers can be spread over many
+engines.
+
+Events carry the ingest node's sequence number and the user profiles that
+"+refs" frames point at, so event ids and user ids are the same on every node.
+
+- InProcessBus: publish() calls the local subscribers directly (single node)
+- BrokerBus: talks to an EventBroker over a Unix or TCP socket. The broker
+  keeps a replay buffer, so a subscriber that reconnects resumes after the last
+  sequence number it saw, without gaps or duplicates.
+
+Sequence numbers are only comparable within one publisher epoch. Every
+publishing BrokerBus picks a new epoch id, so an ingest node that restarts
+from #1 (no checkpoint, no handoff) is a new epoch: the broker clears its
+replay buffer and tells subscribers, which start counting again instead of
+dropping everything up to the old high-water mark.
+
+Wire format (one line per event): b"<seq> " + JSON {"gift", "frames", "users"} + b"\\n"
+Broker to subscriber, whenever the epoch changes: b"E <epoch>\\n"
+
+Example usage:
+    python event_bus.py unix:/tmp/hyperfocus-bus.sock      # run a broker
+    python event_bus.py tcp:0.0.0.0:8790
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from timer_wheel import TimerWheel
+from user_registry import UserEntry
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_BUFFER_SIZE = 10000
+MAX_WRITE_BUFFER = 4 << 20  # Drop subscribers (or pause a publisher) this far behind
+MAX_PUBLISH_BACKLOG = 10000
+MAX_LINE = 1 << 20
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+
+class BusEvent:
+    __slots__ = ("seq", "frames", "users", "is_gift", "trace")
+
+    def __init__(self, seq: int, frames: Dict[str, str], users: Tuple[UserEntry, ...] = (),
+                 is_gift: bool = False, trace=None):
+        self.seq = seq
+        self.frames = frames
+        self.users = users
+        self.is_gift = is_gift
+        self.trace = trace  # Local EventTrace; never sent over the wire
+
+    def to_line(self) -> bytes:
+        body = json.dumps({
+            "gift": self.is_gift,
+            "frames": self.frames,
+            "users": [[user.user_id, user.username, user.nickname] for user in self.users]
+        })
+        return b"%d %s\n" % (self.seq, body.encode('utf-8'))
+
+    @classmethod
+    def from_line(cls, line: bytes) -> "BusEvent":
+        seq, _, body = line.partition(b" ")
+        data = json.loads(body)
+        users = tuple(UserEntry(user_id, username, nickname) for user_id, username, nickname in data["users"])
+        return cls(int(seq), data["frames"], users, data["gift"])
+
+
+Subscriber = Callable[[BusEvent], Awaitable[None]]
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """Split "unix:/path", "tcp:host:port" or "host:port" into (kind, target)"""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if address.startswith("tcp:"):
+        address = address[len("tcp:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+async def _open_connection(address: str):
+    kind, target = parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target, limit=MAX_LINE)
+    return await asyncio.open_connection(*target, limit=MAX_LINE)
+
+
+class EventBus:
+    """Delivers published events to subscribers; subclasses add transport"""
+
+    # Remote buses need every frame group encoded, since other nodes' clients may use any of them
+    remote = False
+
+    def __init__(self):
+        self.subscribers: List[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber):
+        self.subscribers.append(callback)
+
+    async def _dispatch(self, event: BusEvent):
+        for callback in self.subscribers:
+            await callback(event)
+
+    async def publish(self, event: BusEvent):
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": type(self).__name__}
+
+
+class InProcessBus(EventBus):
+    async def publish(self, event: BusEvent):
+        await self._dispatch(event)
+
+
+class BrokerBus(EventBus):
+    remote = True
+
+    def __init__(self, address: str, role: str, timers: Optional[TimerWheel] = None):
+        """
+        Connect to an EventBroker
+
+        Args:
+            address: Broker address ("unix:/path" or "tcp:host:port")
+            role: "publish" on the ingest node, "subscribe" on edge nodes
+            timers: Timer wheel for reconnect backoff (the engine's shared wheel)
+        """
+        super().__init__()
+        if role not in ("publish", "subscribe"):
+            raise ValueError(f"Unknown bus role {role!r}")
+        self.address = address
+        self.role = role
+        self.last_seq = 0
+        # Publishers start a new epoch per process; subscribers learn theirs from the broker
+        self.epoch: Optional[str] = uuid.uuid4().hex if role == "publish" else None
+        self.epoch_changes = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.connected = False
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._backlog: Deque[bytes] = collections.deque(maxlen=MAX_PUBLISH_BACKLOG)
+        self._runner: Optional[asyncio.Task] = None
+        self.timers = timers if timers is not None else TimerWheel()
+
+    async def publish(self, event: BusEvent):
+        """Send an event to the broker, then to local subscribers"""
+        line = event.to_line()
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            # Kept until the broker is back; older events fall off the front
+            if len(self._backlog) == self._backlog.maxlen:
+                self.dropped += 1
+            self._backlog.append(line)
+        else:
+            writer.write(line)
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                await writer.drain()
+        self.last_seq = event.seq
+        await self._dispatch(event)
+
+    async def _run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                reader, writer = await _open_connection(self.address)
+            except OSError as e:
+                logger.warning(f"Event broker {self.address} unavailable ({e}); retrying in {delay:.0f}s")
+                await self.timers.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            delay = RECONNECT_DELAY
+            self.connected = True
+            logger.info(f"Connected to event broker {self.address} ({self.role})")
+            try:
+                hello = {"role": self.role, "after": self.last_seq, "epoch": self.epoch}
+                writer.write(json.dumps(hello).encode('utf-8') + b"\n")
+                if self.role == "publish":
+                    await self._publish_session(reader, writer)
+                else:
+                    await self._subscribe_session(reader)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                logger.warning(f"Event broker connection lost: {e}")
+            finally:
+                self.connected = False
+                self._writer = None
+                writer.close()
+
+    async def _publish_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while self._backlog:
+            writer.write(self._backlog.popleft())
+        self._writer = writer  # No await since the backlog check, so nothing slips in between
+        await writer.drain()
+        # The broker never writes to publishers; EOF means it went away
+        await reader.read()
+
+    async def _subscribe_session(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Broker closed the connection")
+            if line.startswith(b"E "):
+                self._set_epoch(line[2:].strip().decode('utf-8'))
+                continue
+            seq = int(line[:line.index(b" ")])
+            if seq <= self.last_seq:
+                self.duplicates += 1
+                continue
+            if seq != self.last_seq + 1 and self.last_seq:
+                self.gaps += 1
+                logger.warning(f"Event bus gap: expected #{self.last_seq + 1}, got #{seq}")
+            self.last_seq = seq
+            # Inline, so events stay in order and a full fan-out queue stops reading
+            # the socket (the broker drops this subscriber if it falls too far behind)
+            await self._dispatch(BusEvent.from_line(line))
+
+    def _set_epoch(self, epoch: str):
+        if epoch == self.epoch:
+            return
+        if self.epoch is not None:
+            self.epoch_changes += 1
+            logger.info(f"Event bus publisher restarted after event #{self.last_seq}; following the new sequence")
+        self.epoch = epoch
+        self.last_seq = 0
+
+    async def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "type": type(self).__name__,
+            "role": self.role,
+            "connected": self.connected,
+            "last_seq": self.last_seq,
+            "epoch": self.epoch,
+            "epoch_changes": self.epoch_changes,
+            "gaps": self.gaps,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped
+        }
+
+
+class EventBroker:
+    def __init__(self, address: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        """
+        Minimal fan-out broker between one ingest node and many edge nodes
+
+        Args:
+            address: Where to listen ("unix:/path" or "tcp:host:port")
+            buffer_size: Recent events kept for subscribers that reconnect
+        """
+        self.address = address
+        self.recent: Deque[Tuple[int, bytes]] = collections.deque(maxlen=buffer_size)
+        self.epoch: Optional[str] = None
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.publisher: Optional[asyncio.StreamWriter] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def _send(self, writer: asyncio.StreamWriter, line: bytes):
+        if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            logger.warning("Dropping slow or closed bus subscriber")
+            self.subscribers.discard(writer)
+            writer.close()
+            return
+        writer.write(line)
+
+    def _set_epoch(self, epoch: Optional[str]):
+        """Start over when a different publisher process takes over the sequence"""
+        if epoch == self.epoch:
+            return
+        if self.epoch is not None:
+            logger.info(f"Publisher epoch changed after event #{self.recent[-1][0] if self.recent else 0}; "
+                        f"clearing the replay buffer")
+        self.epoch = epoch
+        self.recent.clear()
+        if epoch is not None:
+            line = b"E %s\n" % epoch.encode('utf-8')
+            for writer in list(self.subscribers):
+                self._send(writer, line)
+
+    def _forward(self, seq: int, line: bytes):
+        if self.recent and seq <= self.recent[-1][0]:
+            return  # Replayed from a publisher's reconnect backlog
+        self.recent.append((seq, line))
+        for writer in list(self.subscribers):
+            self._send(writer, line)
+
+    async def _serve_publisher(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               epoch: Optional[str]):
+        if self.publisher is not None:
+            # A newer ingest node (e.g. after a handoff) replaces the old one
+            logger.info("New publisher connected; replacing the previous one")
+            self.publisher.close()
+        self.publisher = writer
+        self._set_epoch(epoch)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            self._forward(int(line[:line.index(b" ")]), line)
+
+    async def _serve_subscriber(self, writer: asyncio.StreamWriter, after: int, epoch: Optional[str]):
+        if self.epoch is not None:
+            writer.write(b"E %s\n" % self.epoch.encode('utf-8'))
+            if after and epoch != self.epoch:
+                after = -1  # Its position is from an earlier epoch; replay everything kept
+        if after:
+            for seq, line in self.recent:
+                if seq > after:
+                    writer.write(line)
+        self.subscribers.add(writer)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), timeout=10.0))
+            role = hello.get("role")
+            if role == "publish":
+                await self._serve_publisher(reader, writer, hello.get("epoch"))
+            elif role == "subscribe":
+                await self._serve_subscriber(writer, int(hello.get("after") or 0), hello.get("epoch"))
+                logger.info(f"Bus subscriber connected. Total: {len(self.subscribers)}")
+                await reader.read()  # Subscribers never send after the hello
+            else:
+                raise ValueError(f"Unknown role {role!r}")
+        except Exception as e:
+            logger.warning(f"Bus connection ended: {e}")
+        finally:
+            self.subscribers.discard(writer)
+            if self.publisher is writer:
+                self.publisher = None
+            writer.close()
+
+    async def start(self):
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            self.server = await asyncio.start_unix_server(self.handle_connection, target, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, *target, limit=MAX_LINE)
+        logger.info(f"Event broker listening on {self.address}")
+
+    async def stop(self):
+        for writer in list(self.subscribers):
+            writer.close()
+        self.subscribers.clear()
+        if self.publisher is not None:
+            self.publisher.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+
+def main():
+    """Run a standalone event broker"""
+    parser = argparse.ArgumentParser(description='Hyperfocus cross-node event broker')
+    parser.add_argument('address', help='Listen address: unix:/path or tcp:host:port')
+    parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE,
+                        help=f'Events kept for reconnecting subscribers (default: {DEFAULT_BUFFER_SIZE})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    async def serve():
+        broker = EventBroker(args.address, buffer_size=args.buffer_size)
+        await broker.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await broker.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Per-event tracing for the Hyperfocus Gift Engine
+
+A sampled fraction of gifts and comments carry an EventTrace from the TikTok
+handler to the last client write. Each trace becomes a small tree of spans:
+
+    gift_received            TikTok emit -> last client write
+    ├── tiktok.delivery      TikTok's event timestamp -> handler entry
+    ├── ingest               handler entry -> handed to the scheduler
+    ├── queue                scheduler wait (rate budget, higher tiers first)
+    ├── encode               per-profile encoding
+    ├── batch.wait           held for the batch tick (with --batch-interval-ms)
+    └── fanout               first write queued -> last write done
+        └── client.write     one per client (slowest MAX_CLIENT_SPANS kept)
+
+Every sampled event ends in a span, including ones that never reach a client:
+the root span's "outcome" attribute is delivered, no_clients, merged (its gift
+went out inside the event traced as merged_into), duplicate or dropped.
+
+Spans are written as OTLP/JSON lines (one ExportTraceServiceRequest per line),
+the format the OpenTelemetry Collector's file exporter writes and its
+otlpjsonfile receiver reads, so traces can be loaded into Jaeger, Tempo etc.
+File writes happen on a worker thread, batched about once a second.
+
+TikTok's timestamp comes from TikTok's clock, so tiktok.delivery includes any
+clock skew between their servers and this host.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_SAMPLE_RATE = 0.01
+FLUSH_INTERVAL = 1.0
+MAX_CLIENT_SPANS = 50
+MAX_PENDING_TRACES = 10000
+SERVICE_NAME = "hyperfocus-gift-engine"
+SPAN_KIND_INTERNAL = 1
+STATUS_ERROR = 2
+
+
+def to_unix_nanos(timestamp: Any) -> Optional[int]:
+    """Normalize an upstream timestamp (s, ms, us or ns since the epoch) to ns"""
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)) or timestamp <= 0:
+        return None
+    if timestamp > 1e17:
+        return int(timestamp)
+    if timestamp > 1e14:
+        return int(timestamp * 1e3)
+    if timestamp > 1e11:
+        return int(timestamp * 1e6)
+    return int(timestamp * 1e9)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class EventTrace:
+    __slots__ = ("trace_id", "event", "upstream_ns", "marks", "attributes", "client_writes")
+
+    def __init__(self, event: str, upstream_timestamp: Any):
+        self.trace_id = os.urandom(16).hex()
+        self.event = event
+        self.upstream_ns = to_unix_nanos(upstream_timestamp)
+        self.marks: Dict[str, int] = {"handler": time.time_ns()}
+        self.attributes: Dict[str, Any] = {}
+        # (client label, write start ns, write end ns, error or None)
+        self.client_writes: List[Tuple[str, int, int, Optional[str]]] = []
+
+    def mark(self, name: str):
+        """Record when a stage was reached (first time wins)"""
+        if name not in self.marks:
+            self.marks[name] = time.time_ns()
+
+    def client_write(self, client: str, start: int, end: int, error: Optional[str] = None):
+        self.client_writes.append((client, start, end, error))
+
+
+class EventTracer:
+    def __init__(self, path: str, sample_rate: float = DEFAULT_SAMPLE_RATE,
+                 timers: Optional[TimerWheel] = None):
+        """
+        Initialize tracing
+
+        Args:
+            path: OTLP/JSON lines file spans are appended to
+            sample_rate: Fraction of events traced (0-1)
+            timers: Timer wheel for the flush interval (the engine's shared wheel)
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.pending: List[EventTrace] = []
+        self.traced_count = 0
+        self.dropped_count = 0
+        self._flusher: Optional[asyncio.Task] = None
+        self.timers = timers if timers is not None else TimerWheel()
+
+    def start(self, event: str, upstream_timestamp: Any = None) -> Optional[EventTrace]:
+        """Begin a trace for this event, or None if it isn't sampled"""
+        if random.random() >= self.sample_rate:
+            return None
+        return EventTrace(event, upstream_timestamp)
+
+    def finish(self, trace: EventTrace):
+        """Queue a completed trace for writing"""
+        if len(self.pending) >= MAX_PENDING_TRACES:
+            self.dropped_count += 1
+            return
+        trace.mark("done")
+        self.pending.append(trace)
+        self.traced_count += 1
+
+    def _spans(self, trace: EventTrace) -> List[Dict[str, Any]]:
+        marks = trace.marks
+        root_id = os.urandom(8).hex()
+        handler = marks["handler"]
+        done = marks["done"]
+        root_start = min(trace.upstream_ns or handler, handler)
+        spans = [self._span(trace, root_id, None, trace.event, root_start, done, trace.attributes)]
+
+        def child(name, start, end, attributes=None, parent=root_id, error=None):
+            if start is None or end is None:
+                return None
+            span_id = os.urandom(8).hex()
+            spans.append(self._span(trace, span_id, parent, name, start, max(start, end), attributes or {}, error))
+            return span_id
+
+        if trace.upstream_ns is not None:
+            child("tiktok.delivery", trace.upstream_ns, handler)
+        child("ingest", handler, marks.get("enqueue"))
+        child("queue", marks.get("enqueue"), marks.get("dequeue"))
+        child("encode", marks.get("encode"), marks.get("encoded"))
+        if trace.client_writes:
+            writes = trace.client_writes
+            child("batch.wait", marks.get("batched"), min(w[1] for w in writes))
+            fanout = child("fanout", min(w[1] for w in writes), max(w[2] for w in writes),
+                           {"clients": len(writes), "errors": sum(1 for w in writes if w[3])})
+            slowest = sorted(writes, key=lambda w: w[2] - w[1], reverse=True)[:MAX_CLIENT_SPANS]
+            for client, start, end, error in slowest:
+                child("client.write", start, end, {"client": client}, parent=fanout, error=error)
+        return spans
+
+    @staticmethod
+    def _span(trace: EventTrace, span_id: str, parent: Optional[str], name: str, start: int, end: int,
+              attributes: Dict[str, Any], error: Optional[str] = None) -> Dict[str, Any]:
+        span = {
+            "traceId": trace.trace_id,
+            "spanId": span_id,
+            "name": name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(end),
+            "attributes": [_attribute(key, value) for key, value in attributes.items()],
+        }
+        if parent is not None:
+            span["parentSpanId"] = parent
+        if error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": error}
+        return span
+
+    def _export(self, traces: List[EventTrace]) -> str:
+        spans = []
+        for trace in traces:
+            spans.extend(self._spans(trace))
+        return json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": "hyperfocus.events"}, "spans": spans}]
+            }]
+        }) + "\n"
+
+    def _write(self, traces: List[EventTrace]):
+        line = self._export(traces)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def flush(self):
+        """Encode and write queued traces off the event loop"""
+        if not self.pending:
+            return
+        traces, self.pending = self.pending, []
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, traces)
+        except OSError as e:
+            logger.error(f"Could not write traces to {self.path}: {e}")
+
+    async def _run(self):
+        while True:
+            await self.timers.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    def start_flusher(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+            logger.info(f"Tracing {self.sample_rate:.1%} of events to {self.path}")
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "traced": self.traced_count,
+            "dropped": self.dropped_count,
+            "pending": len(self.pending)
+        }
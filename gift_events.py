@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Compact internal event model for the Hyperfocus Gift Engine
+
+Gifts and comments are carried from the TikTok handlers through scheduling
+and merging to the encoder as slotted records instead of nested dicts.
+Gift names and user ids are interned, and effect configs are shared references
+to the engine's effect table. Each record is encoded straight to JSON text:
+shared parts (effect configs, gift names) are encoded once and cached, so no
+intermediate dicts are built per event.
+
+Records encode to exactly the payloads the engine has always sent, e.g.
+{"event": "gift_received", "gift": {...}, "user": {...}, "effect": {...}, ...},
+or with "user" replaced by the sender's registry id for clients that opted in.
+"""
+
+import json
+import sys
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, Optional, Tuple
+
+# Effect used for gifts without an entry in the engine's effect table
+DEFAULT_EFFECT = {
+    "type": "default_sparkle",
+    "intensity": 1,
+    "color": "#FFFFFF",
+    "particles": 100,
+    "sound": "gentle_ping"
+}
+
+# Strings that repeat across events (gift names, tiers) encode once
+MAX_STRING_CACHE = 4096
+
+
+class GiftRecord:
+    __slots__ = (
+        "gift_name", "gift_id", "repeat_count", "is_streaking",
+        "username", "nickname", "effect", "tier", "timestamp", "burst", "user_ref", "trace",
+        "diamond_count"
+    )
+
+    event = "gift_received"
+
+    # (payload key, attribute) or (payload key, ((sub-key, attribute), ...));
+    # "effect" holds a shared dict and "burst" is only sent when present
+    LAYOUT = (
+        ("event", None),
+        ("gift", (("name", "gift_name"), ("id", "gift_id"),
+                  ("repeat_count", "repeat_count"), ("is_streaking", "is_streaking"))),
+        ("user", (("username", "username"), ("nickname", "nickname"))),
+        ("effect", "effect"),
+        ("tier", "tier"),
+        ("timestamp", "timestamp"),
+        ("burst", "burst"),
+    )
+
+    def __init__(self, gift_name: str, gift_id: Any, repeat_count: int, is_streaking: bool,
+                 username: str, nickname: str, effect: Dict[str, Any], tier: str, timestamp: Any,
+                 diamond_count: Optional[int] = None):
+        self.gift_name = sys.intern(gift_name)
+        self.gift_id = gift_id
+        self.repeat_count = repeat_count
+        self.is_streaking = is_streaking
+        self.username = sys.intern(username)
+        self.nickname = nickname
+        self.effect = effect
+        self.tier = tier
+        self.timestamp = timestamp
+        self.burst: Optional[Dict[str, Any]] = None
+        self.user_ref = None  # UserEntry, for clients that take user ids
+        self.trace = None  # EventTrace, when this event is sampled for tracing
+        self.diamond_count = diamond_count  # Coins per gift; archived, not sent to clients
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Full payload as a dict (for code that still wants one)"""
+        data = {
+            "event": self.event,
+            "gift": {
+                "name": self.gift_name,
+                "id": self.gift_id,
+                "repeat_count": self.repeat_count,
+                "is_streaking": self.is_streaking
+            },
+            "user": {
+                "username": self.username,
+                "nickname": self.nickname
+            },
+            "effect": self.effect,
+            "tier": self.tier,
+            "timestamp": self.timestamp
+        }
+        if self.burst is not None:
+            data["burst"] = self.burst
+        return data
+
+    def fields(self) -> Tuple[Any, ...]:
+        """Constructor arguments plus burst as a flat tuple (for the checkpoint WAL)"""
+        return (self.gift_name, self.gift_id, self.repeat_count, self.is_streaking, self.username,
+                self.nickname, self.effect, self.tier, self.timestamp, self.diamond_count, self.burst)
+
+    @classmethod
+    def from_fields(cls, fields) -> "GiftRecord":
+        """Rebuild a record from fields()"""
+        record = cls(*fields[:-1])
+        record.burst = fields[-1]
+        return record
+
+
+class CommentRecord:
+    __slots__ = ("username", "message", "timestamp", "user_ref", "trace")
+
+    event = "comment"
+
+    LAYOUT = (
+        ("event", None),
+        ("user", "username"),
+        ("message", "message"),
+        ("timestamp", "timestamp"),
+    )
+
+    def __init__(self, username: str, message: str, timestamp: Any):
+        self.username = sys.intern(username)
+        self.message = message
+        self.timestamp = timestamp
+        self.user_ref = None
+        self.trace = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "event": self.event,
+            "user": self.username,
+            "message": self.message,
+            "timestamp": self.timestamp
+        }
+
+    def fields(self) -> Tuple[Any, ...]:
+        return (self.username, self.message, self.timestamp)
+
+    @classmethod
+    def from_fields(cls, fields) -> "CommentRecord":
+        return cls(*fields)
+
+
+EVENT_RECORDS = (GiftRecord, CommentRecord)
+RECORD_TYPES = {record_type.event: record_type for record_type in EVENT_RECORDS}
+
+_string_cache: Dict[str, str] = {}
+
+
+def _encode_value(value: Any) -> str:
+    """JSON-encode a scalar the same way json.dumps(default=str) would"""
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return "null"
+    if value.__class__ is int:
+        return int.__repr__(value)
+    return json.dumps(value, default=str)
+
+
+def _encode_cached_string(value: str) -> str:
+    encoded = _string_cache.get(value)
+    if encoded is None:
+        encoded = encode_basestring_ascii(value)
+        if len(_string_cache) < MAX_STRING_CACHE:
+            _string_cache[value] = encoded
+    return encoded
+
+
+class RecordEncoder:
+    # Attributes whose values repeat across events (interned or shared)
+    CACHED_STRINGS = frozenset({"gift_name", "tier"})
+
+    def __init__(self, record_cls, spec: Optional[Dict[str, Optional[tuple]]] = None,
+                 user_refs: bool = False):
+        """
+        Compile an encoder for one record type and payload profile
+
+        Args:
+            record_cls: GiftRecord or CommentRecord
+            spec: Profile projection ({key: sub-keys or None}); None sends everything
+            user_refs: Send the user as its registry id instead of the full profile
+        """
+        self.event_prefix = '{"event": ' + encode_basestring_ascii(record_cls.event)
+        self.fields = []
+        layout = record_cls.LAYOUT
+        if spec is not None:
+            # Projected payloads keep the profile's key order, as the dict projection did
+            order = {key: index for index, key in enumerate(spec)}
+            layout = sorted((entry for entry in layout if entry[0] in order), key=lambda entry: order[entry[0]])
+        for key, source in layout:
+            if key == "event":
+                continue
+            keep = spec.get(key) if spec is not None else None
+            if key == "user" and user_refs:
+                self.fields.append((", " + encode_basestring_ascii(key) + ": ", "user_ref", None))
+            elif isinstance(source, tuple):
+                subfields = tuple(
+                    (encode_basestring_ascii(sub) + ": ", attr)
+                    for sub, attr in source if keep is None or sub in keep
+                )
+                self.fields.append((", " + encode_basestring_ascii(key) + ": ", "nested", subfields))
+            elif key in ("effect", "burst"):
+                self.fields.append((", " + encode_basestring_ascii(key) + ": ", "shared", (source, keep)))
+            else:
+                self.fields.append((", " + encode_basestring_ascii(key) + ": ", "scalar", source))
+        # Encoded shared dicts keyed by id(); the dict is kept alive alongside so ids can't be reused
+        self._shared_cache: Dict[int, Tuple[Dict[str, Any], str]] = {}
+
+    def _encode_shared(self, value: Dict[str, Any], keep: Optional[tuple]) -> str:
+        cached = self._shared_cache.get(id(value))
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        if keep is not None:
+            encoded = json.dumps({k: value[k] for k in keep if k in value}, default=str)
+        else:
+            encoded = json.dumps(value, default=str)
+        self._shared_cache[id(value)] = (value, encoded)
+        return encoded
+
+    def encode(self, record) -> str:
+        parts = [self.event_prefix]
+        append = parts.append
+        cached_strings = self.CACHED_STRINGS
+        for prefix, kind, source in self.fields:
+            if kind == "nested":
+                inner = []
+                for sub_prefix, attr in source:
+                    value = getattr(record, attr)
+                    if attr in cached_strings:
+                        inner.append(sub_prefix + _encode_cached_string(value))
+                    else:
+                        inner.append(sub_prefix + _encode_value(value))
+                append(prefix + "{" + ", ".join(inner) + "}")
+            elif kind == "user_ref":
+                append(prefix + int.__repr__(record.user_ref.user_id))
+            elif kind == "shared":
+                attr, keep = source
+                value = getattr(record, attr)
+                if value is None:
+                    continue
+                if attr == "burst":
+                    # Bursts are per-record and mutable, so never cached
+                    if keep is not None:
+                        value = {k: value[k] for k in keep if k in value}
+                    append(prefix + json.dumps(value, default=str))
+                else:
+                    append(prefix + self._encode_shared(value, keep))
+            else:
+                value = getattr(record, source)
+                if source in cached_strings:
+                    append(prefix + _encode_cached_string(value))
+                else:
+                    append(prefix + _encode_value(value))
+        append("}")
+        return "".join(parts)
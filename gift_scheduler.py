@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Tier-prioritized gift scheduler for the Hyperfocus Gift Engine
+
+Sits between gift ingestion (`on_gift`) and fan-out (`broadcast_to_clients`).
+Gifts are released highest price tier first, so a flood of Roses can never
+delay a Universe or Lion moment. Output is shaped by a per-stream token
+bucket; when the budget is exceeded, queued low-tier gifts of the same kind
+are merged into a single aggregated burst instead of piling up.
+
+TikTok streak updates carry the streak's running count, so a merged burst
+counts each user's streak once, at its latest count; only separate sends
+(completed streaks, single gifts) are added up. The burst is still streaking
+while any of its streaks hasn't ended.
+
+Tiers follow high_engagement_gift_configs.js, with its "frequent" and
+"classic" tiers folded into "volume".
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from gift_events import GiftRecord
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+# Highest priority first
+TIER_ORDER = ("ultimate", "premium", "regular", "volume")
+
+# Known gifts, as in high_engagement_gift_configs.js
+GIFT_TIERS = {
+    "TikTok Universe": "ultimate",
+    "Universe": "ultimate",
+    "Lion": "premium",
+    "Diamond Flight": "premium",
+    "Planet": "premium",
+    "Airplane": "regular",
+    "Mermaid": "regular",
+    "Disco Ball": "regular",
+    "Money Rain": "regular",
+    "Galaxy": "regular",
+    "Confetti": "volume",
+    "I Love You": "volume",
+    "Rose": "volume",
+    "Heart": "volume",
+    "Coins": "volume",
+}
+
+# Fallback for unknown gifts: minimum coin value per tier
+TIER_COIN_THRESHOLDS = (
+    ("ultimate", 30000),
+    ("premium", 10000),
+    ("regular", 500),
+)
+
+# Tiers that are released as soon as they arrive, regardless of the rate budget
+UNTHROTTLED_TIERS = frozenset({"ultimate", "premium"})
+
+# Tiers whose queued gifts may be merged into aggregated bursts
+MERGEABLE_TIERS = frozenset({"regular", "volume"})
+
+# Usernames kept on a merged burst (for "+N others" style overlays)
+MAX_BURST_USERS = 5
+
+
+def classify_gift(gift_name: str, diamond_count: Optional[int] = None) -> str:
+    """Return the price tier for a gift"""
+    tier = GIFT_TIERS.get(gift_name)
+    if tier is not None:
+        return tier
+    if diamond_count:
+        for tier, threshold in TIER_COIN_THRESHOLDS:
+            if diamond_count >= threshold:
+                return tier
+    return "volume"
+
+
+def load_gift_tiers(path: str) -> int:
+    """
+    Override GIFT_TIERS from a tier file written by engagement_analysis.py
+
+    Returns the number of gifts loaded
+    """
+    with open(path, encoding="utf-8") as f:
+        tiers = json.load(f).get("tiers", {})
+    unknown = set(tiers.values()) - set(TIER_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown tier(s) in {path}: {', '.join(sorted(unknown))}")
+    GIFT_TIERS.update(tiers)
+    return len(tiers)
+
+
+class GiftScheduler:
+    def __init__(
+        self,
+        sink: Callable[[GiftRecord], Awaitable[None]],
+        max_events_per_second: float = 30.0,
+        burst: int = 10,
+        timers: Optional[TimerWheel] = None,
+        finish_trace: Optional[Callable[[Any], None]] = None
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            sink: Coroutine function that fans an event out to clients
+            max_events_per_second: Sustained output rate for throttled tiers
+            burst: Token bucket capacity (events that may go out back-to-back)
+            timers: Timer wheel for rate waits (the engine's shared wheel)
+            finish_trace: Called with the sampled trace of a gift merged into an event that
+                already carries one (the engine's EventTracer.finish)
+        """
+        if max_events_per_second <= 0:
+            raise ValueError("max_events_per_second must be positive")
+        self.sink = sink
+        self.rate = max_events_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.timers = timers if timers is not None else TimerWheel()
+        self.finish_trace = finish_trace
+        self.queues: Dict[str, Deque[GiftRecord]] = {
+            tier: collections.deque() for tier in TIER_ORDER
+        }
+        # Pending event per gift name for mergeable tiers, so bursts merge in O(1)
+        self.pending_by_gift: Dict[str, Dict[str, GiftRecord]] = {
+            tier: {} for tier in MERGEABLE_TIERS
+        }
+        # Per merged burst: streaks still open in it (user -> latest count) and completed gifts
+        self.burst_counts: Dict[GiftRecord, Tuple[Dict[str, int], int]] = {}
+        self.merged_count = 0
+        self.emitted_count = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def submit(self, event: GiftRecord, tier: str):
+        """Queue an event for fan-out without waiting for clients"""
+        if tier not in self.queues:
+            tier = "volume"
+        if tier in MERGEABLE_TIERS:
+            self._refill()
+            pending = self.pending_by_gift[tier]
+            gift_name = event.gift_name
+            queued = pending.get(gift_name)
+            backlog = sum(len(self.queues[name]) for name in MERGEABLE_TIERS)
+            if queued is not None and backlog >= self.tokens:
+                # Over budget - fold into the gift already waiting in the queue
+                self._merge(queued, event)
+                self.merged_count += 1
+                return
+            pending[gift_name] = event
+        self.queues[tier].append(event)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _merge(self, queued: GiftRecord, event: GiftRecord):
+        """Merge a gift into an already queued gift of the same kind"""
+        burst = queued.burst
+        if burst is None:
+            burst = queued.burst = {
+                "merged": 1,
+                "users": [queued.username]
+            }
+        burst["merged"] += 1
+        username = event.username
+        if len(burst["users"]) < MAX_BURST_USERS and username not in burst["users"]:
+            burst["users"].append(username)
+
+        counts = self.burst_counts.get(queued)
+        if counts is None:
+            if queued.is_streaking:
+                counts = ({queued.username: queued.repeat_count}, 0)
+            else:
+                counts = ({}, queued.repeat_count)
+        streaks, completed = counts
+        # Streak counts are cumulative: a user's open streak contributes its latest count
+        count = max(streaks.pop(username, 0), event.repeat_count)
+        if event.is_streaking:
+            streaks[username] = count
+        else:
+            completed += count
+        self.burst_counts[queued] = (streaks, completed)
+        queued.repeat_count = completed + sum(streaks.values())
+        queued.is_streaking = bool(streaks)
+        queued.timestamp = event.timestamp
+        if queued.trace is None:
+            queued.trace = event.trace  # Keep a sampled trace alive through the merge
+        elif event.trace is not None and self.finish_trace is not None:
+            # Only one trace rides the merged event; end this one here instead of losing it
+            event.trace.mark("dequeue")
+            event.trace.attributes.update(outcome="merged", merged_into=queued.trace.trace_id)
+            self.finish_trace(event.trace)
+
+    def _next_tier(self) -> Optional[str]:
+        for tier in TIER_ORDER:
+            if self.queues[tier]:
+                return tier
+        return None
+
+    def _pop(self, tier: str) -> GiftRecord:
+        event = self.queues[tier].popleft()
+        if tier in MERGEABLE_TIERS:
+            pending = self.pending_by_gift[tier]
+            gift_name = event.gift_name
+            if pending.get(gift_name) is event:
+                del pending[gift_name]
+            self.burst_counts.pop(event, None)
+        return event
+
+    def _emit(self, event: GiftRecord):
+        # Fan-out runs as its own task so a slow client never holds up the queue
+        task = asyncio.create_task(self.sink(event))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        self.emitted_count += 1
+
+    async def _run(self):
+        while True:
+            tier = self._next_tier()
+            if tier is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if tier not in UNTHROTTLED_TIERS:
+                self._refill()
+                if self.tokens < 1:
+                    # Sleep until a token is due, but wake early for new arrivals
+                    # so a high-tier gift never waits behind the rate budget
+                    self._wakeup.clear()
+                    delay = (1 - self.tokens) / self.rate
+                    timer = self.timers.call_later(delay, self._wakeup.set)
+                    try:
+                        await self._wakeup.wait()
+                    finally:
+                        timer.cancel()
+                    continue
+                self.tokens -= 1
+            else:
+                self._refill()
+                self.tokens = max(self.tokens - 1, 0.0)
+
+            self._emit(self._pop(tier))
+
+    def start(self):
+        """Start releasing queued events"""
+        if self._runner is None:
+            self._wakeup = asyncio.Event()
+            if len(self):
+                self._wakeup.set()
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the scheduler and wait for in-flight fan-outs"""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        if self._in_flight:
+            await asyncio.wait(self._in_flight, timeout=5.0)
+
+    async def drain(self):
+        """Release everything still queued at once, ignoring the rate budget"""
+        while True:
+            tier = self._next_tier()
+            if tier is None:
+                break
+            self._emit(self._pop(tier))
+        if self._in_flight:
+            await asyncio.wait(self._in_flight, timeout=5.0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depths and counters for diagnostics"""
+        return {
+            "queued": {tier: len(queue) for tier, queue in self.queues.items()},
+            "emitted": self.emitted_count,
+            "merged": self.merged_count,
+            "tokens": round(self.tokens, 2)
+        }
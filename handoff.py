@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Zero-downtime restart support for the Hyperfocus Gift Engine
+
+A running engine started with --handoff-socket listens on a Unix socket for its
+successor. A new engine started with --takeover connects to it, and:
+
+1. successor -> running:  {"op": "takeover"}
+2. running -> successor:  header line + listening socket fds (SCM_RIGHTS),
+                           followed by a JSON state snapshot
+3. successor:             restores state, serves on the inherited sockets,
+                           reconnects to TikTok
+4. successor -> running:  {"op": "ready"}
+5. running:               stops accepting and drains its clients, which
+                           reconnect to the same port and land on the successor
+
+The listening sockets never close, so clients are not refused at any point.
+"""
+
+import array
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('TikTokLive')
+
+MAX_HANDOFF_FDS = 16
+HANDOFF_TIMEOUT = 30.0
+
+# Clients of the old engine are closed gradually over this window, so their
+# reconnects reach the successor spread out instead of all at once
+HANDOFF_DRAIN_SECONDS = 5.0
+CLOSE_SERVICE_RESTART = 1012
+
+
+def _send_line(conn: socket.socket, payload: Dict[str, Any]):
+    conn.sendall(json.dumps(payload).encode('utf-8') + b"\n")
+
+
+def _recv_line(conn: socket.socket, buffered: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+    """Blocking read of one JSON line; returns it and any bytes read past it"""
+    while b"\n" not in buffered:
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionError("Handoff peer closed the connection")
+        buffered += chunk
+    line, _, rest = buffered.partition(b"\n")
+    return json.loads(line), rest
+
+
+def send_handoff(conn: socket.socket, sockets: Dict[str, socket.socket], state: Dict[str, Any]):
+    """Pass listening sockets and a state snapshot to the successor"""
+    names = list(sockets)
+    body = json.dumps(state, default=str).encode('utf-8')
+    header = json.dumps({"sockets": names, "state_bytes": len(body)}).encode('utf-8') + b"\n"
+    fds = array.array("i", [sockets[name].fileno() for name in names])
+    conn.setblocking(True)
+    conn.sendmsg([header], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+    conn.sendall(body)
+
+
+def request_takeover(path: str, timeout: float = HANDOFF_TIMEOUT
+                     ) -> Tuple[socket.socket, Dict[str, socket.socket], Dict[str, Any]]:
+    """
+    Ask the running engine at `path` to hand over its sockets and state
+
+    Returns the control connection (used later to signal readiness), the
+    inherited listening sockets by name and the state snapshot.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    conn.connect(path)
+    _send_line(conn, {"op": "takeover", "pid": os.getpid()})
+
+    fds: List[int] = []
+    buffered = b""
+    while b"\n" not in buffered:
+        data, ancdata, _, _ = conn.recvmsg(4096, socket.CMSG_LEN(MAX_HANDOFF_FDS * array.array("i").itemsize))
+        if not data:
+            raise ConnectionError("Running engine closed the handoff connection")
+        for level, kind, cmsg_data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                received = array.array("i")
+                received.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % received.itemsize)])
+                fds.extend(received)
+        buffered += data
+    line, _, body = buffered.partition(b"\n")
+    header = json.loads(line)
+
+    while len(body) < header["state_bytes"]:
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise ConnectionError("Handoff state was cut short")
+        body += chunk
+
+    sockets = {
+        name: socket.socket(fileno=fd)
+        for name, fd in zip(header["sockets"], fds)
+    }
+    return conn, sockets, json.loads(body)
+
+
+def confirm_ready(conn: socket.socket):
+    """Tell the previous engine we are serving, so it can drain and exit"""
+    try:
+        _send_line(conn, {"op": "ready"})
+    finally:
+        conn.close()
+
+
+class HandoffListener:
+    def __init__(
+        self,
+        path: str,
+        on_takeover: Callable[[], Awaitable[Tuple[Dict[str, socket.socket], Dict[str, Any]]]],
+        on_ready: Callable[[], Awaitable[None]],
+        on_abort: Callable[[], Awaitable[None]]
+    ):
+        """
+        Listen for a successor engine
+
+        Args:
+            path: Unix socket path successors connect to
+            on_takeover: Pauses ingestion and returns (listening sockets, state)
+            on_ready: Called once the successor is serving; drains this engine
+            on_abort: Called if the handoff fails after on_takeover; resumes ingestion
+        """
+        self.path = path
+        self.on_takeover = on_takeover
+        self.on_ready = on_ready
+        self.on_abort = on_abort
+        self._listener: Optional[socket.socket] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a crashed engine
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen(1)
+        self._listener.setblocking(False)
+        self._task = asyncio.create_task(self._serve())
+        logger.info(f"Accepting zero-downtime handoff on {self.path}")
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        conn, _ = await loop.sock_accept(self._listener)
+        # Free the path at once so the successor can listen on it for the next restart
+        self._close_listener()
+        paused = False
+        try:
+            conn.setblocking(True)
+            conn.settimeout(HANDOFF_TIMEOUT)
+            request, _ = await loop.run_in_executor(None, _recv_line, conn)
+            if request.get("op") != "takeover":
+                raise ValueError(f"Unexpected handoff request {request!r}")
+            logger.info(f"Handing off to successor (pid {request.get('pid')})...")
+            paused = True
+            sockets, state = await self.on_takeover()
+            await loop.run_in_executor(None, send_handoff, conn, sockets, state)
+            reply, _ = await loop.run_in_executor(None, _recv_line, conn)
+            if reply.get("op") != "ready":
+                raise ValueError(f"Unexpected handoff reply {reply!r}")
+        except Exception as e:
+            logger.error(f"Handoff failed, staying up: {e}")
+            conn.close()
+            if paused:
+                await self.on_abort()
+            return
+        conn.close()
+        logger.info("Successor is serving; draining clients")
+        await self.on_ready()
+
+    def _close_listener(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    async def stop(self):
+        if self._task is not None and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._close_listener()
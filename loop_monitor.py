@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag monitor for the Hyperfocus Gift Engine
+
+Everything runs on one asyncio loop, so any callback that blocks it (sync
+logging, a big json.dumps, a traceback being formatted) delays every viewer.
+
+- Loop lag: a sampler task sleeps for a fixed interval and records how late it
+  wakes up.
+- Slow callbacks: every loop callback is timed and any that overrun the
+  threshold are attributed to the coroutine or function that ran.
+
+Both are kept as histograms, plus a rolling "top offenders" window that the
+admin channel reports on.
+"""
+
+import asyncio
+import bisect
+import collections
+import logging
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('TikTokLive')
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open-ended)
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+DEFAULT_SAMPLE_INTERVAL = 0.1
+DEFAULT_SLOW_CALLBACK = 0.05
+DEFAULT_OFFENDER_WINDOW = 300.0
+MAX_OFFENDER_EVENTS = 10000
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, value_ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(BUCKETS_MS, self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(float(bound), round(self.max_ms, 3))
+        return self.max_ms
+
+    def report(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+def describe_callback(handle: asyncio.Handle) -> str:
+    """Name the coroutine or function a loop callback belongs to"""
+    callback = getattr(handle, '_callback', None)
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return getattr(coro, '__qualname__', None) or repr(coro)
+    if isinstance(owner, asyncio.Future):
+        return f"{type(owner).__name__} callback"
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        slow_callback: float = DEFAULT_SLOW_CALLBACK,
+        offender_window: float = DEFAULT_OFFENDER_WINDOW
+    ):
+        """
+        Initialize the monitor
+
+        Args:
+            sample_interval: Seconds between loop-lag samples
+            slow_callback: Callbacks running at least this many seconds are
+                recorded as offenders (0 disables callback timing)
+            offender_window: Seconds of history in the top offenders report
+        """
+        self.sample_interval = sample_interval
+        self.slow_callback = slow_callback
+        self.offender_window = offender_window
+        self.lag = Histogram()
+        self.slow_callbacks = Histogram()
+        self.offenders: Deque[Tuple[float, str, float]] = collections.deque(maxlen=MAX_OFFENDER_EVENTS)
+        self._sampler: Optional[asyncio.Task] = None
+        self._original_run = None
+
+    def _install_callback_timer(self):
+        """Time every Handle._run on this process' event loops"""
+        if self._original_run is not None or not self.slow_callback:
+            return
+        original_run = asyncio.events.Handle._run
+        monitor = self
+        threshold = self.slow_callback
+
+        def _timed_run(handle):
+            start = time.perf_counter()
+            try:
+                return original_run(handle)
+            finally:
+                elapsed = time.perf_counter() - start
+                if elapsed >= threshold:
+                    monitor.record_slow_callback(describe_callback(handle), elapsed)
+
+        self._original_run = original_run
+        asyncio.events.Handle._run = _timed_run
+
+    def _remove_callback_timer(self):
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    def record_slow_callback(self, name: str, elapsed: float):
+        self.slow_callbacks.record(elapsed * 1000)
+        self.offenders.append((time.monotonic(), name, elapsed))
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.sample_interval
+            await asyncio.sleep(self.sample_interval)
+            lag = max(loop.time() - expected, 0.0)
+            self.lag.record(lag * 1000)
+
+    def start(self):
+        """Start sampling lag and timing callbacks on the running loop"""
+        if self._sampler is None:
+            self._install_callback_timer()
+            self._sampler = asyncio.create_task(self._sample_lag())
+
+    async def stop(self):
+        """Stop sampling and restore the untimed callback path"""
+        self._remove_callback_timer()
+        if self._sampler is not None:
+            self._sampler.cancel()
+            try:
+                await self._sampler
+            except asyncio.CancelledError:
+                pass
+            self._sampler = None
+
+    def reset(self):
+        self.lag = Histogram()
+        self.slow_callbacks = Histogram()
+        self.offenders.clear()
+
+    def top_offenders(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Callbacks that overran most within the rolling window, worst first"""
+        cutoff = time.monotonic() - self.offender_window
+        totals: Dict[str, List[float]] = {}
+        for recorded_at, name, elapsed in self.offenders:
+            if recorded_at < cutoff:
+                continue
+            entry = totals.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {
+                "callback": name,
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "max_ms": round(worst * 1000, 3)
+            }
+            for name, (count, total, worst) in ranked[:limit]
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "loop_lag": self.lag.report(),
+            "slow_callbacks": self.slow_callbacks.report(),
+            "slow_callback_threshold_ms": self.slow_callback * 1000,
+            "window_s": self.offender_window,
+            "top_offenders": self.top_offenders()
+        }
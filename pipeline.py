@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Staged event pipeline for the Hyperfocus Gift Engine
+
+TikTok events travel through a chain of stages, each running as its own task
+and connected by bounded queues:
+
+    ingest -> dedup -> enrich -> aggregate -> encode -> fanout
+
+The TikTok handlers only submit() into a queue and return, so a slow
+stage (or a slow client) can never hold up the TikTok client's event
+dispatch. Inside the pipeline a full queue makes the stage in front of it wait
+(backpressure); only submit() drops events when the queue is full, and counts
+them.
+
+A stage handler takes one item and returns the item for the next stage, or
+None when it consumed the item (dropped it, or handed it elsewhere, e.g. to
+the gift scheduler, which feeds the encode stage itself). Handlers may be
+plain functions or coroutines. Extra stages (filters, moderation, metrics)
+can be plugged in with add_stage() before start().
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_QUEUE_SIZE = 4096
+DEFAULT_DEDUP_WINDOW = 4096  # Recent event ids remembered by the dedup stage
+
+
+class PipelineStage:
+    __slots__ = ("name", "handler", "queue", "processed", "consumed", "errors",
+                 "busy_seconds", "max_seconds", "high_water", "task")
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.consumed = 0  # Items the handler did not pass on
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_seconds = 0.0
+        self.high_water = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "high_water": self.high_water,
+            "processed": self.processed,
+            "consumed": self.consumed,
+            "errors": self.errors,
+            "avg_us": round(self.busy_seconds / self.processed * 1e6, 1) if self.processed else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3)
+        }
+
+
+class Pipeline:
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initialize an empty pipeline
+
+        Args:
+            queue_size: Capacity of each stage's input queue
+        """
+        self.queue_size = queue_size
+        self.stages: List[PipelineStage] = []
+        self.dropped = 0
+        self.running = False
+
+    def add_stage(self, name: str, handler: Callable[[Any], Any],
+                  before: Optional[str] = None, after: Optional[str] = None):
+        """Add a stage at the end, or before/after a named stage (only before start())"""
+        if self.running:
+            raise RuntimeError("Stages can only be added before the pipeline starts")
+        if any(stage.name == name for stage in self.stages):
+            raise ValueError(f"Pipeline already has a stage named {name!r}")
+        stage = PipelineStage(name, handler, self.queue_size)
+        if before is not None:
+            self.stages.insert(self._index(before), stage)
+        elif after is not None:
+            self.stages.insert(self._index(after) + 1, stage)
+        else:
+            self.stages.append(stage)
+
+    def _index(self, name: str) -> int:
+        for index, stage in enumerate(self.stages):
+            if stage.name == name:
+                return index
+        raise KeyError(f"No pipeline stage named {name!r}")
+
+    def submit(self, item: Any, name: Optional[str] = None) -> bool:
+        """Queue an item at the first (or a named) stage without waiting; False if it was dropped"""
+        stage = self.stages[0] if name is None else self.stages[self._index(name)]
+        try:
+            stage.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped & 1023 == 1:
+                logger.warning(f"Pipeline {stage.name} queue full; {self.dropped} events dropped so far")
+            return False
+        size = stage.queue.qsize()
+        if size > stage.high_water:
+            stage.high_water = size
+        return True
+
+    async def feed(self, name: str, item: Any):
+        """Queue an item at a named stage, waiting while its queue is full"""
+        stage = self.stages[self._index(name)]
+        await stage.queue.put(item)
+        size = stage.queue.qsize()
+        if size > stage.high_water:
+            stage.high_water = size
+
+    async def _run(self, stage: PipelineStage, next_stage: Optional[PipelineStage]):
+        queue = stage.queue
+        handler = stage.handler
+        while True:
+            item = await queue.get()
+            started = time.perf_counter()
+            try:
+                result = handler(item)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if result is None:
+                    stage.consumed += 1
+                elif next_stage is not None:
+                    await next_stage.queue.put(result)
+                    size = next_stage.queue.qsize()
+                    if size > next_stage.high_water:
+                        next_stage.high_water = size
+            except Exception as e:
+                stage.errors += 1
+                logger.error(f"Pipeline stage {stage.name} failed: {e}", exc_info=True)
+            finally:
+                elapsed = time.perf_counter() - started
+                stage.processed += 1
+                stage.busy_seconds += elapsed
+                if elapsed > stage.max_seconds:
+                    stage.max_seconds = elapsed
+                queue.task_done()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            stage.task = asyncio.create_task(self._run(stage, next_stage))
+
+    async def join(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued item has passed through; False on timeout"""
+        if not self.running:
+            return not any(stage.queue.qsize() for stage in self.stages)
+
+        async def _join_all():
+            # Items only move forward, so joining the stages in order drains everything
+            for stage in self.stages:
+                await stage.queue.join()
+
+        try:
+            await asyncio.wait_for(_join_all(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, timeout: float = 5.0):
+        """Let queued items through (up to `timeout`), then stop every stage"""
+        if not self.running:
+            return
+        if not await self.join(timeout):
+            logger.warning(f"Pipeline stopped with {sum(s.queue.qsize() for s in self.stages)} events still queued")
+        for stage in self.stages:
+            stage.task.cancel()
+        await asyncio.gather(*(stage.task for stage in self.stages), return_exceptions=True)
+        for stage in self.stages:
+            stage.task = None
+        self.running = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dropped": self.dropped,
+            "stages": {stage.name: stage.stats() for stage in self.stages}
+        }
+
+
+class RecentKeys:
+    """Bounded set of recently seen keys, for dropping redelivered events"""
+
+    def __init__(self, capacity: int = DEFAULT_DEDUP_WINDOW):
+        self.capacity = capacity
+        self.keys: "collections.OrderedDict[Any, None]" = collections.OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def seen(self, key: Any) -> bool:
+        """True if `key` was seen recently; otherwise remember it"""
+        keys = self.keys
+        if key in keys:
+            self.hits += 1
+            return True
+        keys[key] = None
+        if len(keys) > self.capacity:
+            keys.popitem(last=False)
+        return False
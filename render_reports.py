@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Render the Hyperfocus report charts from recorded telemetry
+
+Every figure is built first, then all images are exported in one batch, so the
+image export engine (Kaleido) starts once per run instead of once per
+write_image call. Each output is keyed by a hash of the figure's data and
+layout plus the export settings; outputs whose hash matches the cache
+manifest (<out-dir>/.chart_cache.json) and still exist are skipped.
+
+Figures and their telemetry:
+
+- gift_engagement:     archived gifts (--archive-dir, see engagement_analysis.py)
+- event_latency:       per-stage latency from a trace file (--trace-file, see event_tracing.py)
+- hot_path_benchmarks: saved microbenchmark baseline (--baseline, see microbench.py)
+
+Figures whose telemetry isn't available are skipped. The hand-drawn
+chart_script*.py figures go through the same renderer with --static.
+
+Example usage:
+    python render_reports.py --archive-dir archive/ --trace-file traces.jsonl
+    python render_reports.py --figures event_latency --formats png --force
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import plotly
+    import plotly.graph_objects as go
+    import plotly.io as pio
+except ImportError:  # Optional dependency
+    plotly = None
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_OUT_DIR = "reports"
+DEFAULT_FORMATS = ("png", "svg")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+CACHE_MANIFEST = ".chart_cache.json"
+EXPORT_WIDTH = 1000
+EXPORT_HEIGHT = 600
+EXPORT_SCALE = 1
+TOP_GIFTS = 15
+BRAND_COLORS = ["#8A2BE2", "#00CED1", "#FFD700", "#F59E0B", "#0EA5E9"]
+
+# Pipeline stages in the order an event passes through them (see event_tracing.py)
+LATENCY_STAGES = ("tiktok.delivery", "ingest", "queue", "encode", "batch.wait", "fanout", "client.write")
+
+
+def figure_hash(fig, fmt: str, width: int = EXPORT_WIDTH, height: int = EXPORT_HEIGHT,
+                scale: float = EXPORT_SCALE) -> str:
+    """Content hash of a figure's data and layout plus everything that affects the image"""
+    spec = json.dumps(fig.to_plotly_json(), sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder)
+    digest = hashlib.sha256(spec.encode('utf-8'))
+    digest.update(f"|{fmt}|{width}|{height}|{scale}|{plotly.__version__}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ChartCache:
+    def __init__(self, out_dir: str):
+        """Manifest of rendered outputs and the figure hash each was rendered from"""
+        self.path = os.path.join(out_dir, CACHE_MANIFEST)
+        self.entries: Dict[str, str] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable chart cache {self.path}: {e}")
+
+    def is_fresh(self, path: str, digest: str) -> bool:
+        return self.entries.get(os.path.basename(path)) == digest and os.path.exists(path)
+
+    def record(self, path: str, digest: str):
+        self.entries[os.path.basename(path)] = digest
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+
+
+def _export(jobs: List[Tuple[Any, str, str]]):
+    """Write (figure, path, format) jobs in one export session"""
+    if hasattr(pio, "write_images"):
+        # plotly >= 6.1 batches everything through a single Kaleido browser session
+        pio.write_images(
+            fig=[fig for fig, _, _ in jobs], file=[path for _, path, _ in jobs],
+            format=[fmt for _, _, fmt in jobs], width=EXPORT_WIDTH, height=EXPORT_HEIGHT, scale=EXPORT_SCALE
+        )
+    else:
+        # Older plotly/Kaleido keep one export process alive across calls
+        for fig, path, fmt in jobs:
+            pio.write_image(fig, path, format=fmt, width=EXPORT_WIDTH, height=EXPORT_HEIGHT, scale=EXPORT_SCALE)
+
+
+def render(figures: Dict[str, Any], out_dir: str, formats: Tuple[str, ...] = DEFAULT_FORMATS,
+           force: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    Export figures as <out_dir>/<name>.<format>, skipping unchanged ones
+
+    Returns (rendered paths, skipped paths)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    cache = ChartCache(out_dir)
+    jobs = []
+    digests = []
+    skipped = []
+    for name, fig in figures.items():
+        for fmt in formats:
+            path = os.path.join(out_dir, f"{name}.{fmt}")
+            digest = figure_hash(fig, fmt)
+            if not force and cache.is_fresh(path, digest):
+                skipped.append(path)
+                continue
+            jobs.append((fig, path, fmt))
+            digests.append(digest)
+    if jobs:
+        _export(jobs)
+        for (_, path, _), digest in zip(jobs, digests):
+            cache.record(path, digest)
+        cache.save()
+    return [path for _, path, _ in jobs], skipped
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def gift_engagement_figure(args) -> Optional[Any]:
+    if not args.archive_dir:
+        return None
+    import engagement_analysis
+    if engagement_analysis.np is None:
+        logger.warning("Skipping gift_engagement: the analysis needs numpy and pyarrow")
+        return None
+    stats = engagement_analysis.analyze(args.archive_dir, window_seconds=args.window)
+    rows = sorted(engagement_analysis.gift_table(stats), key=lambda row: -row["coins"])[:TOP_GIFTS]
+    if not rows:
+        return None
+    gifts = [row["gift"] for row in rows]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=gifts, y=[row["coins"] for row in rows], name="Coins",
+                         marker_color=BRAND_COLORS[0]))
+    fig.add_trace(go.Scatter(x=gifts, y=[row["follow_on_rate"] * 100 for row in rows], name="Follow-on %",
+                             yaxis="y2", mode="lines+markers", line_color=BRAND_COLORS[2]))
+    fig.add_trace(go.Scatter(x=gifts, y=[row["comment_uplift"] for row in rows], name="Comment uplift",
+                             yaxis="y3", mode="markers", marker=dict(size=10, color=BRAND_COLORS[1])))
+    fig.update_layout(
+        title=f"Top Gifts by Coins ({stats.streams} streams)",
+        yaxis=dict(title="Coins"),
+        yaxis2=dict(title="Follow-on %", overlaying="y", side="right", range=[0, 100]),
+        yaxis3=dict(overlaying="y", side="right", visible=False),
+        legend=dict(orientation='h', yanchor='bottom', y=1.05, xanchor='center', x=0.5)
+    )
+    return fig
+
+
+def event_latency_figure(args) -> Optional[Any]:
+    if not args.trace_file or not os.path.exists(args.trace_file):
+        return None
+    durations: Dict[str, List[float]] = {}
+    with open(args.trace_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                export = json.loads(line)
+            except ValueError:
+                continue
+            for resource in export.get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for span in scope.get("spans", []):
+                        name = span["name"] if "parentSpanId" in span else "end-to-end"
+                        elapsed = int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])
+                        durations.setdefault(name, []).append(elapsed / 1e6)
+    stages = [name for name in LATENCY_STAGES + ("end-to-end",) if durations.get(name)]
+    if not stages:
+        return None
+    fig = go.Figure()
+    for label, fraction, color in (("p50", 0.5, BRAND_COLORS[1]), ("p95", 0.95, BRAND_COLORS[0])):
+        fig.add_trace(go.Bar(x=stages, y=[_percentile(durations[name], fraction) for name in stages],
+                             name=label, marker_color=color))
+    samples = len(durations.get("end-to-end", []))
+    fig.update_layout(
+        title=f"Event Latency by Stage ({samples} traced events)",
+        yaxis=dict(title="Milliseconds", type="log"),
+        barmode="group",
+        legend=dict(orientation='h', yanchor='bottom', y=1.05, xanchor='center', x=0.5)
+    )
+    return fig
+
+
+def hot_path_figure(args) -> Optional[Any]:
+    if not os.path.exists(args.baseline):
+        return None
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    stages = baseline.get("stages", {})
+    if not stages:
+        return None
+    names = sorted(stages, key=lambda name: stages[name]["median_ns"])
+    fig = go.Figure(go.Bar(
+        y=names,
+        x=[stages[name]["median_ns"] for name in names],
+        orientation='h',
+        marker_color=BRAND_COLORS[4],
+        error_x=dict(type="data", array=[stages[name].get("stdev_ns", 0) for name in names]),
+        text=[f"{stages[name]['median_ns']:,.0f} ns" for name in names],
+        textposition="auto"
+    ))
+    fig.update_layout(
+        title=f"Hot-Path Microbenchmarks (Python {baseline.get('python', '?')}, {baseline.get('saved_at', '?')})",
+        xaxis=dict(title="Median ns per operation", type="log"),
+        yaxis=dict(title="")
+    )
+    return fig
+
+
+def _static_figure(module: str) -> Callable[[Any], Optional[Any]]:
+    def build(args):
+        return __import__(module).build_figure()
+    return build
+
+
+TELEMETRY_FIGURES: Dict[str, Callable[[Any], Optional[Any]]] = {
+    "gift_engagement": gift_engagement_figure,
+    "event_latency": event_latency_figure,
+    "hot_path_benchmarks": hot_path_figure,
+}
+
+# Hand-maintained figures from chart_script*.py, only rendered with --static
+STATIC_FIGURES: Dict[str, Callable[[Any], Optional[Any]]] = {
+    "mobile_approaches_radar": _static_figure("chart_script"),
+    "hyperfocus_ecosystem": _static_figure("chart_script_1"),
+}
+
+
+def main():
+    """Build the report figures and render the ones that changed"""
+    parser = argparse.ArgumentParser(description='Render Hyperfocus report charts')
+    parser.add_argument('--archive-dir', default=None, help='Event archive for gift_engagement')
+    parser.add_argument('--trace-file', default=None, help='OTLP/JSON trace file for event_latency')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help=f'Microbenchmark baseline for hot_path_benchmarks (default: {DEFAULT_BASELINE})')
+    parser.add_argument('--window', type=float, default=30.0,
+                        help='Follow-on window in seconds for gift_engagement (default: 30)')
+    parser.add_argument('--figures', nargs='*', default=None, help='Render only these figures')
+    parser.add_argument('--static', action='store_true', help='Also render the chart_script*.py figures')
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR, help=f'Output directory (default: {DEFAULT_OUT_DIR})')
+    parser.add_argument('--formats', nargs='+', default=list(DEFAULT_FORMATS),
+                        help=f'Image formats (default: {" ".join(DEFAULT_FORMATS)})')
+    parser.add_argument('--force', action='store_true', help='Render even if the cached output is current')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if plotly is None:
+        print("Error: rendering needs plotly and kaleido (pip install plotly kaleido)")
+        sys.exit(1)
+
+    builders = dict(TELEMETRY_FIGURES)
+    if args.static or args.figures:
+        builders.update(STATIC_FIGURES)
+    if args.figures:
+        unknown = [name for name in args.figures if name not in builders]
+        if unknown:
+            print(f"Error: unknown figure(s) {', '.join(unknown)}; choose from {', '.join(builders)}")
+            sys.exit(2)
+        builders = {name: builders[name] for name in args.figures}
+
+    figures = {}
+    for name, build in builders.items():
+        fig = build(args)
+        if fig is None:
+            logger.info(f"Skipping {name}: no telemetry")
+            continue
+        figures[name] = fig
+    if not figures:
+        print("Nothing to render: pass --archive-dir, --trace-file or --baseline with recorded data")
+        sys.exit(1)
+
+    rendered, skipped = render(figures, args.out_dir, tuple(args.formats), force=args.force)
+    for path in rendered:
+        print(f"Rendered {path}")
+    print(f"{len(rendered)} rendered, {len(skipped)} unchanged (cached)")
+
+
+if __name__ == "__main__":
+    main()
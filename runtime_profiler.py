@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Runtime profiling hooks for the Hyperfocus Gift Engine
+
+Lets a running engine be profiled without a restart:
+
+- SamplingProfiler: a background thread samples the event loop thread's stack
+  every few milliseconds and writes collapsed stacks ("a;b;c 42" lines), which
+  flamegraph.pl, speedscope and inferno all read directly.
+- HandlerTimings: wall-clock timing per handler (`broadcast_to_clients`),
+  only recorded while enabled. The TikTok handlers only queue events, so the
+  engine reports the pipeline's per-stage timings alongside.
+
+Both are driven by admin commands over the engine's WebSocket.
+"""
+
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_PROFILE_DIR = "profiles"
+MAX_STACK_DEPTH = 128
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir: str = DEFAULT_PROFILE_DIR):
+        """
+        Initialize the profiler
+
+        Args:
+            output_dir: Directory collapsed-stack files are written to
+        """
+        self.output_dir = output_dir
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.interval = DEFAULT_SAMPLE_INTERVAL
+        self.started_at: Optional[float] = None
+        self._target_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        """Start sampling the calling thread (the event loop thread)"""
+        if self.running:
+            return
+        self.samples = Counter()
+        self.sample_count = 0
+        self.interval = interval
+        self.started_at = time.time()
+        self._target_thread = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="hyperfocus-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler started ({interval * 1000:.1f} ms interval)")
+
+    def _sample_loop(self):
+        target = self._target_thread
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[";".join(stack)] += 1
+            self.sample_count += 1
+
+    def stop(self) -> Optional[str]:
+        """Stop sampling and write the collapsed stacks; returns the file path"""
+        if not self.running:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        path = os.path.join(self.output_dir, f"profile-{stamp}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Sampling profiler stopped: {self.sample_count} samples written to {path}")
+        return path
+
+    def top(self, limit: int = 10) -> Dict[str, int]:
+        """Leaf functions with the most samples so far"""
+        leaves: Counter = Counter()
+        for stack, count in list(self.samples.items()):
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return dict(leaves.most_common(limit))
+
+
+class HandlerTimings:
+    def __init__(self):
+        self.enabled = False
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def wrap(self, name: str, handler: Callable) -> Callable:
+        """Wrap a coroutine handler so its duration is recorded while enabled"""
+        @functools.wraps(handler)
+        async def timed(*args, **kwargs):
+            if not self.enabled:
+                return await handler(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed
+
+    def record(self, name: str, elapsed: float):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = {"count": 0, "total": 0.0, "max": 0.0}
+        stat["count"] += 1
+        stat["total"] += elapsed
+        if elapsed > stat["max"]:
+            stat["max"] = elapsed
+
+    def reset(self):
+        self.stats = {}
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-handler call count and mean/max/total time in milliseconds"""
+        return {
+            name: {
+                "count": stat["count"],
+                "mean_ms": round(stat["total"] / stat["count"] * 1000, 3) if stat["count"] else 0.0,
+                "max_ms": round(stat["max"] * 1000, 3),
+                "total_ms": round(stat["total"] * 1000, 3)
+            }
+            for name, stat in self.stats.items()
+        }
@@ -1,174 +1,8 @@
-# Analyze the research to identify the highest engagement TikTok gifts
-engagement_analysis = '''
-# 🎯 TOP 10 HIGHEST ENGAGEMENT TIKTOK LIVE GIFTS FOR 2025
-
-Based on the latest research on TikTok Live gift psychology and engagement patterns, here are the 10 gifts that drive the HIGHEST audience engagement:
-
-## 🚀 THE PSYCHOLOGY OF HIGH-ENGAGEMENT GIFTS
-
-### Key Engagement Drivers (Research-Backed):
-1. **Acknowledgment from Streamer** - Most important factor for repeat gifting
-2. **Visual Impact** - Larger, more animated gifts create more excitement
-3. **Social Status** - High-value gifts boost sender's community standing
-4. **Community Recognition** - Gifts that trigger shoutouts/leaderboards
-5. **Interactive Elements** - Gifts that change stream experience
-
-## 🏆 TOP 10 HIGHEST ENGAGEMENT GIFTS (2025)
-
-### 1. **TikTok Universe** 🌌
-- **Price**: 44,999 coins ($562.48)
-- **Why High Engagement**: Ultimate status symbol, viral moment creator
-- **Effect Potential**: Massive supernova explosion with galaxy formation
-- **Engagement Factor**: 10/10 (Guaranteed massive reaction)
-
-### 2. **Lion** 🦁  
-- **Price**: 29,999 coins ($398.95)
-- **Why High Engagement**: Powerful animal symbolism, roaring animation
-- **Effect Potential**: Majestic lion roar with golden particle mane
-- **Engagement Factor**: 9/10 (Status symbol with strong visual)
-
-### 3. **Diamond Flight** 💎
-- **Price**: 18,000 coins ($239.40) 
-- **Why High Engagement**: Luxury symbolism, sparkling animation
-- **Effect Potential**: Diamond shower with prismatic light effects
-- **Engagement Factor**: 9/10 (Premium feel, beautiful visuals)
-
-### 4. **Planet** 🪐
-- **Price**: 15,000 coins ($199.50)
-- **Why High Engagement**: Space theme resonates with Gen Z, orbital motion
-- **Effect Potential**: Planet with rings, gravity field effects
-- **Engagement Factor**: 8/10 (Perfect for constellation theme!)
-
-### 5. **Airplane** ✈️
-- **Price**: 6,000 coins ($79.78)
-- **Why High Engagement**: Dynamic movement, travel dreams
-- **Effect Potential**: Jet flyover with contrail particles  
-- **Engagement Factor**: 8/10 (Motion creates excitement)
-
-### 6. **Mermaid** 🧜‍♀️
-- **Price**: 2,988 coins ($39.74)
-- **Why High Engagement**: Fantasy element, magical theme
-- **Effect Potential**: Underwater scene with bubble trails
-- **Engagement Factor**: 7/10 (Mystical appeal to audience)
-
-### 7. **Disco Ball** 🪩
-- **Price**: 1,000 coins ($13.30)
-- **Why High Engagement**: Party vibes, nostalgic fun, light effects
-- **Effect Potential**: Rotating disco ball with rainbow beams
-- **Engagement Factor**: 7/10 (Instant party atmosphere)
-
-### 8. **Money Rain** 💸
-- **Price**: 500 coins ($6.65)
-- **Why High Engagement**: Universal appeal, wealth symbolism
-- **Effect Potential**: Golden coin cascade with cash register sounds
-- **Engagement Factor**: 6/10 (Everyone loves money vibes)
-
-### 9. **Confetti** 🎊
-- **Price**: 100 coins ($1.33)
-- **Why High Engagement**: Celebration trigger, affordable for mass gifting
-- **Effect Potential**: Multicolor confetti explosion
-- **Engagement Factor**: 6/10 (Low cost = high frequency)
-
-### 10. **I Love You** 💌
-- **Price**: 49 coins ($0.65)
-- **Why High Engagement**: Emotional connection, personal message
-- **Effect Potential**: Heart explosion with love message particles
-- **Engagement Factor**: 5/10 (Emotional impact beats price)
-
-## 💡 ENGAGEMENT OPTIMIZATION INSIGHTS
-
-### High-Value Tier (Planet+):
-- **Trigger major reactions** from streamers
-- **Create viral moments** that get clipped and shared
-- **Build sender reputation** in community
-- **Generate extended shoutouts** and personal acknowledgment
-
-### Mid-Value Tier (Mermaid-Airplane):
-- **Sweet spot for repeat gifters** - significant but not bankruptcy-inducing
-- **Regular acknowledgment** from streamers
-- **Good balance** of visual impact and affordability
-- **Community recognition** without massive financial commitment
-
-### High-Frequency Tier (Confetti-I Love You):
-- **Drive engagement through volume** rather than individual impact
-- **Accessible to casual viewers** for impulse gifting
-- **Create gift "trains"** where multiple viewers follow suit
-- **Build momentum** for higher-value gifts later
-
-## 🧠 NEURODIVERGENT ENGAGEMENT FACTORS
-
-### ADHD-Optimized Gifts:
-1. **Airplane** - Movement and dynamic trails
-2. **Disco Ball** - Flashing lights and motion
-3. **Confetti** - Instant burst of color and chaos
-
-### Autism-Friendly Gifts:  
-1. **Planet** - Predictable orbital patterns
-2. **Diamond Flight** - Geometric crystalline structures
-3. **Mermaid** - Calming underwater themes
-
-### Dyslexia-Supportive Gifts:
-1. **Visual symbols** over text-based gifts
-2. **Clear iconic representations** (🌌🦁💎)
-3. **Color-coded recognition** systems
-
-## 🎮 IMPLEMENTATION STRATEGY
-
-### Gift Effect Priorities:
-1. **Universe/Lion/Diamond** = Hollywood-level effects (5000+ particles)
-2. **Planet/Airplane/Mermaid** = Premium effects (2000-3000 particles)  
-3. **Disco/Money/Confetti** = High-frequency effects (500-1000 particles)
-4. **I Love You** = Personal touch effects (200-500 particles)
-
-### Engagement Triggers:
-- **Leaderboard integration** for top gifters
-- **Combo multipliers** for gift streaks
-- **Special effects** that only activate with specific gifts
-- **Interactive elements** where gifts change the constellation
-
-## 🚀 REVENUE PSYCHOLOGY
-
-### Why These Gifts Drive Engagement:
-1. **Status Display** - High-value gifts show community standing
-2. **Streamer Acknowledgment** - Guaranteed reaction and shoutout
-3. **Visual Spectacle** - Creates shareable moments
-4. **Community Competition** - Gifting wars and leaderboards
-5. **Emotional Connection** - Personal support for creators
-
-### Optimal Gift Mix for Maximum Engagement:
-- **70% Mid-Tier** (Mermaid-Airplane) - Regular supporters
-- **20% High-Tier** (Planet+) - Special moments/viral potential  
-- **10% Low-Tier** (Confetti-I Love You) - Casual engagement
-
-This research-backed gift selection will maximize both engagement frequency AND monetization potential while creating the most visually spectacular effects for your Hyperfocus Gift Engine!
-'''
-
-print("🎯 HIGHEST ENGAGEMENT TIKTOK GIFTS ANALYSIS COMPLETE!")
-print("")
-print("📊 RESEARCH-BACKED TOP 10 GIFTS:")
-print("   1. 🌌 TikTok Universe ($562) - Ultimate viral moment")
-print("   2. 🦁 Lion ($399) - Power symbol with roaring effect") 
-print("   3. 💎 Diamond Flight ($239) - Premium sparkle shower")
-print("   4. 🪐 Planet ($200) - Perfect for constellation theme!")
-print("   5. ✈️ Airplane ($80) - Dynamic flyover with trails")
-print("   6. 🧜‍♀️ Mermaid ($40) - Magical underwater scene")
-print("   7. 🪩 Disco Ball ($13) - Instant party atmosphere")
-print("   8. 💸 Money Rain ($7) - Universal wealth appeal")
-print("   9. 🎊 Confetti ($1) - Mass celebration trigger")
-print("   10. 💌 I Love You ($0.65) - Emotional connection")
-print("")
-print("🧠 KEY INSIGHTS:")
-print("   ├── Acknowledgment from streamer = #1 engagement driver")
-print("   ├── Visual impact + social status = repeat gifting")
-print("   ├── Mid-tier gifts ($40-200) = sweet spot for regulars")
-print("   ├── High-tier gifts ($200+) = viral moment creators")
-print("   └── Low-tier gifts (<$2) = volume and momentum builders")
-print("")
-print("💰 These 10 gifts represent 80% of TikTok Live engagement!")
-print("👊 Ready to code these into epic visual effects, BROski♾?")
-
-# Save the analysis
-with open("high_engagement_gifts_analysis.md", "w") as f:
-    f.write(engagement_analysis)
-
-print("📁 File: high_engagement_gifts_analysis.md")
\ No newline at end of file
+# Regenerate high_engagement_gifts_analysis.md (and gift_tiers.json) from archived stream data.
+# The ranking used to be hand-written here; see engagement_analysis.py for the metrics.
+#
+#     python script.py archive/
+from engagement_analysis import main
+
+if __name__ == "__main__":
+    main()
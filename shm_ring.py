@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Shared-memory event feed for same-host consumers
+
+The engine writes each encoded event once into a `multiprocessing.shared_memory`
+ring buffer; OBS helpers and local bots on the same machine read it directly,
+skipping WebSocket framing, masking and a per-consumer send on the engine side.
+
+Layout (little-endian):
+    header: magic (4s) | version (H) | reserved (H) | slot_count (I) | slot_size (I) | write_seq (Q)
+    slots:  seq (Q) | length (I) | payload (slot_size - 12 bytes)
+
+A slot's seq is zeroed while it is being rewritten, and readers check it before
+and after copying, so a torn read is detected and skipped rather than returned.
+
+Example usage:
+    python shm_ring.py hyperfocus_events           # tail the feed
+"""
+
+import argparse
+import json
+import logging
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('TikTokLive')
+
+MAGIC = b"HFRB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIQ")
+SLOT_HEADER = struct.Struct("<QI")
+WRITE_SEQ_OFFSET = HEADER.size - 8
+SEQ = struct.Struct("<Q")
+
+DEFAULT_SLOT_COUNT = 4096
+DEFAULT_SLOT_SIZE = 4096
+
+
+class SharedRingWriter:
+    def __init__(self, name: str, slot_count: int = DEFAULT_SLOT_COUNT, slot_size: int = DEFAULT_SLOT_SIZE,
+                 resume: bool = False):
+        """
+        Create the shared-memory ring (replacing a stale one with the same name)
+
+        Args:
+            name: Shared memory block name consumers attach to
+            slot_count: Number of events kept before the oldest is overwritten
+            slot_size: Bytes per slot, including the 12-byte slot header
+            resume: Keep writing into an existing ring of the same shape (after a
+                handoff), so attached readers carry on without a gap in sequence numbers
+        """
+        self.name = name
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.max_payload = slot_size - SLOT_HEADER.size
+        self.oversized_count = 0
+        size = HEADER.size + slot_count * slot_size
+        if resume and self._resume(name):
+            return
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buf = self.shm.buf
+        self.write_seq = 0
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, 0, slot_count, slot_size, 0)
+
+    def _resume(self, name: str) -> bool:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return False
+        magic, version, _, slot_count, slot_size, write_seq = HEADER.unpack_from(shm.buf, 0)
+        if (magic, version, slot_count, slot_size) != (MAGIC, VERSION, self.slot_count, self.slot_size):
+            shm.close()
+            return False
+        self.shm = shm
+        self.buf = shm.buf
+        self.write_seq = write_seq
+        return True
+
+    def write(self, payload: bytes) -> Optional[int]:
+        """Append an encoded event; returns its sequence number"""
+        length = len(payload)
+        if length > self.max_payload:
+            self.oversized_count += 1
+            logger.warning(f"Event of {length} bytes does not fit shared ring slot ({self.max_payload} bytes); skipped")
+            return None
+        seq = self.write_seq + 1
+        offset = HEADER.size + (seq % self.slot_count) * self.slot_size
+        buf = self.buf
+        SEQ.pack_into(buf, offset, 0)  # Mark the slot as being rewritten
+        start = offset + SLOT_HEADER.size
+        buf[start:start + length] = payload
+        SLOT_HEADER.pack_into(buf, offset, seq, length)
+        SEQ.pack_into(buf, WRITE_SEQ_OFFSET, seq)
+        self.write_seq = seq
+        return seq
+
+    def close(self, unlink: bool = True):
+        """Release (and by default remove) the shared memory block"""
+        self.buf = None
+        self.shm.close()
+        if not unlink:
+            # A successor engine keeps writing to it; stop our resource tracker removing it at exit
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            except Exception:
+                pass
+            return
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedRingReader:
+    def __init__(self, name: str, from_start: bool = False):
+        """
+        Attach to an engine's shared-memory ring
+
+        Args:
+            name: Shared memory block name the engine was started with
+            from_start: Replay everything still in the ring instead of only new events
+        """
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the block when they exit (Python < 3.13 tracks attaches too)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        self.buf = self.shm.buf
+        magic, version, _, self.slot_count, self.slot_size, write_seq = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"Shared memory block {name!r} is not a Hyperfocus event ring")
+        self.dropped = 0
+        if from_start:
+            self.last_seq = max(write_seq - self.slot_count + 1, 1) - 1
+        else:
+            self.last_seq = write_seq
+
+    def write_seq(self) -> int:
+        """Sequence number of the newest event in the ring"""
+        return SEQ.unpack_from(self.buf, WRITE_SEQ_OFFSET)[0]
+
+    def poll(self) -> List[Tuple[int, bytes]]:
+        """Return (seq, payload) for every event written since the last poll"""
+        buf = self.buf
+        head = SEQ.unpack_from(buf, WRITE_SEQ_OFFSET)[0]
+        if head <= self.last_seq:
+            return []
+        oldest = head - self.slot_count + 1
+        if self.last_seq + 1 < oldest:
+            # The writer lapped us; skip to the oldest event still in the ring
+            self.dropped += oldest - self.last_seq - 1
+            self.last_seq = oldest - 1
+
+        events = []
+        for seq in range(self.last_seq + 1, head + 1):
+            offset = HEADER.size + (seq % self.slot_count) * self.slot_size
+            slot_seq, length = SLOT_HEADER.unpack_from(buf, offset)
+            start = offset + SLOT_HEADER.size
+            payload = bytes(buf[start:start + length])
+            if slot_seq != seq or SEQ.unpack_from(buf, offset)[0] != seq:
+                # Overwritten while copying
+                self.dropped += 1
+                continue
+            events.append((seq, payload))
+        self.last_seq = head
+        return events
+
+    def follow(self, interval: float = 0.0005) -> Iterator[Tuple[int, bytes]]:
+        """Yield events forever, polling every `interval` seconds when idle"""
+        while True:
+            events = self.poll()
+            if not events:
+                time.sleep(interval)
+                continue
+            yield from events
+
+    def close(self):
+        """Detach from the ring (the engine owns and removes it)"""
+        self.buf = None
+        self.shm.close()
+
+
+def main():
+    """Print events from a running engine's shared-memory feed"""
+    parser = argparse.ArgumentParser(description='Tail the Hyperfocus shared-memory event feed')
+    parser.add_argument('name', help='Shared memory block name (the engine\'s --shm-name)')
+    parser.add_argument('--from-start', action='store_true', help='Replay events still in the ring')
+    args = parser.parse_args()
+
+    try:
+        reader = SharedRingReader(args.name, from_start=args.from_start)
+    except FileNotFoundError:
+        print(f"Error: no shared memory feed named {args.name!r}")
+        sys.exit(1)
+
+    try:
+        for seq, payload in reader.follow():
+            event = json.loads(payload)
+            print(f"{seq}: {event.get('event')} {payload.decode('utf-8')}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
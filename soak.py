@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Soak harness for the Hyperfocus Gift Engine
+
+Runs a real engine (WebSocket server, scheduler, fan-out) against hours of
+synthetic TikTok events replayed at accelerated speed, while clients
+connect and disconnect in storms. The TikTok connection is the only fake.
+
+During the run, traced Python memory (tracemalloc), RSS, live asyncio tasks and
+the engine's per-client tables are sampled. At the end the harness fails if:
+
+- traced memory or RSS keeps growing after warm-up (a least-squares trend
+  over the run, with each third of it higher than the one before), or
+- anything per-client is left behind once every client has gone: connected
+  clients, profile and known-user tables, admission slots, send tasks,
+  log handlers, or
+- clients mostly failed to connect, or no events reached them at all.
+
+The report lists the allocation sites that grew the most since warm-up.
+
+Example usage:
+    python soak.py                              # 6 simulated hours at 60x (6 minutes)
+    python soak.py --hours 10 --speedup 120 --storm-size 200
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+import types
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+
+import tiktok_gift_listener as listener
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_HOURS = 6.0
+DEFAULT_SPEEDUP = 60.0
+STREAM_EVENT_RATE = 15.0  # Events per second on a busy stream
+DEFAULT_STEADY_CLIENTS = 20
+DEFAULT_STORM_SIZE = 100
+DEFAULT_STORM_INTERVAL = 10.0
+DEFAULT_SAMPLE_INTERVAL = 2.0
+WARMUP_FRACTION = 0.2
+DEFAULT_MAX_GROWTH_MB = 5.0
+# RSS also moves with allocator high-water marks after storms, so it gets more slack
+DEFAULT_MAX_RSS_GROWTH_MB = 25.0
+TOP_ALLOCATIONS = 15
+
+GIFTS = [("Rose", 1), ("Heart", 5), ("Coins", 10), ("TikTok", 1), ("Finger Heart", 5),
+         ("Galaxy", 1000), ("Universe", 34999)]
+PROFILE_REQUESTS = [{}, {"profile": "mobile"}, {"profile": "overlay"},
+                    {"clientType": "mobile", "capabilities": ["user_refs"]},
+                    {"capabilities": ["minimal", "user_refs"]}]
+
+
+class SoakTikTokClient:
+    """Stands in for TikTokLiveClient; events are injected by the harness"""
+
+    def add_listener(self, name: str, handler):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+def synthetic_gift(index: int, users: int):
+    name, diamonds = GIFTS[index % 97 % len(GIFTS)]
+    user = index * 7919 % users
+    return types.SimpleNamespace(
+        gift=types.SimpleNamespace(name=name, id=index % 50, diamond_count=diamonds),
+        user=types.SimpleNamespace(unique_id=f"viewer{user}", nickname=f"Viewer {user}"),
+        repeat_count=1 + index % 3,
+        streaking=False,
+        timestamp=int(time.time() * 1000)
+    )
+
+
+def synthetic_comment(index: int, users: int):
+    user = index * 104729 % users
+    return types.SimpleNamespace(
+        user=types.SimpleNamespace(unique_id=f"viewer{user}", nickname=f"Viewer {user}"),
+        comment=f"message {index}",
+        timestamp=int(time.time() * 1000)
+    )
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def growth_trend(samples: List[Tuple[float, float]]) -> Tuple[float, bool]:
+    """Growth over the window by least squares, and whether each third rose on the last"""
+    if len(samples) < 6:
+        return 0.0, False
+    times = [t for t, _ in samples]
+    values = [v for _, v in samples]
+    mean_t = sum(times) / len(times)
+    mean_v = sum(values) / len(values)
+    variance = sum((t - mean_t) ** 2 for t in times)
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / variance if variance else 0.0
+    growth = slope * (times[-1] - times[0])
+    third = len(values) // 3
+    means = [sum(part) / len(part) for part in (values[:third], values[third:-third], values[-third:])]
+    return growth, means[0] < means[1] < means[2]
+
+
+class SoakRun:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.duration = args.hours * 3600 / args.speedup
+        self.event_rate = STREAM_EVENT_RATE * args.speedup
+        self.engine = listener.HyperfocusGiftEngine(
+            "soak",
+            websocket_port=args.port,
+            max_events_per_second=args.max_events_per_second,
+            batch_interval_ms=args.batch_interval_ms,
+            max_clients=args.steady_clients + args.storm_size * 2,
+            max_clients_per_ip=args.steady_clients + args.storm_size * 2
+        )
+        self.engine.client = SoakTikTokClient()
+        self.engine._register_event_handlers(self.engine.client)
+        self.stopping: Optional[asyncio.Event] = None
+        self.events_sent = 0
+        self.messages_received = 0
+        self.connections = 0
+        self.connect_errors = 0
+        self.samples: List[Dict[str, Any]] = []
+        self.warmup_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    async def feed_events(self):
+        """Inject gifts and comments at the accelerated stream rate"""
+        tick = 0.01
+        carry = 0.0
+        index = 0
+        while not self.stopping.is_set():
+            carry += self.event_rate * tick
+            while carry >= 1:
+                carry -= 1
+                index += 1
+                if index % 3:
+                    await self.engine.on_gift(synthetic_gift(index, self.args.users))
+                else:
+                    await self.engine.on_comment(synthetic_comment(index, self.args.users))
+                self.events_sent += 1
+            await asyncio.sleep(tick)
+
+    async def client_session(self, hold: float, abort: bool = False):
+        """One viewer: connect, maybe pick a profile, read for a while, leave"""
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{self.args.port}", close_timeout=1) as ws:
+                self.connections += 1
+                request = random.choice(PROFILE_REQUESTS)
+                if request:
+                    await ws.send(json.dumps({"type": "connection:init", "payload": request}))
+                deadline = time.monotonic() + hold
+                while not self.stopping.is_set() and time.monotonic() < deadline:
+                    try:
+                        await asyncio.wait_for(ws.recv(), timeout=max(deadline - time.monotonic(), 0.01))
+                        self.messages_received += 1
+                    except asyncio.TimeoutError:
+                        break
+                if abort:
+                    ws.transport.abort()  # Vanish without a close handshake
+        except (OSError, websockets.exceptions.WebSocketException):
+            self.connect_errors += 1
+
+    async def steady_clients(self):
+        async def viewer():
+            while not self.stopping.is_set():
+                await self.client_session(hold=self.duration)
+        await asyncio.gather(*(viewer() for _ in range(self.args.steady_clients)))
+
+    async def storms(self):
+        """Connect/disconnect storms: many short-lived clients at once"""
+        while not self.stopping.is_set():
+            await asyncio.sleep(self.args.storm_interval)
+            if self.stopping.is_set():
+                break
+            await asyncio.gather(*(
+                self.client_session(hold=random.uniform(0, 2), abort=random.random() < 0.3)
+                for _ in range(self.args.storm_size)
+            ))
+
+    def sample(self, started: float):
+        # Only count what is actually reachable; cyclic garbage (closed connections
+        # caught in exception tracebacks) is freed by the next GC pass anyway
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        engine = self.engine
+        self.samples.append({
+            "t": time.monotonic() - started,
+            "traced": traced,
+            "rss": rss_bytes(),
+            "tasks": len(asyncio.all_tasks()),
+            "clients": len(engine.connected_clients),
+            "known_users": len(engine.client_known_users),
+            "registry": len(engine.user_registry),
+            "scheduler_queued": len(engine.scheduler)
+        })
+
+    async def sampler(self, started: float):
+        while not self.stopping.is_set():
+            self.sample(started)
+            if self.warmup_snapshot is None and time.monotonic() - started >= self.duration * WARMUP_FRACTION:
+                self.warmup_snapshot = tracemalloc.take_snapshot()
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=self.args.sample_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def leaks_after_drain(self, handlers_before: int) -> List[str]:
+        """Per-client state that should be empty once every client has left"""
+        engine = self.engine
+        problems = []
+        checks = {
+            "connected_clients": len(engine.connected_clients),
+            "client_profiles": len(engine.client_profiles),
+            "client_known_users": len(engine.client_known_users),
+            "profile_clients": sum(len(clients) for clients in engine.profile_clients.values()),
+            "admission slots": engine.admission.total,
+            "admission per-IP entries": len(engine.admission.clients_per_ip),
+            "scheduler in-flight sends": len(engine.scheduler._in_flight),
+            "pipeline queued events": sum(stage.queue.qsize() for stage in engine.pipeline.stages),
+            "fan-out tasks": len(engine._fanout_tasks),
+            "batch flush tasks": len(engine._flush_tasks),
+        }
+        for name, count in checks.items():
+            if count:
+                problems.append(f"{name}: {count} left after all clients disconnected")
+        handlers = len(logging.getLogger().handlers) + len(logger.handlers)
+        if handlers != handlers_before:
+            problems.append(f"log handlers: {handlers_before} -> {handlers}")
+        return problems
+
+    async def run(self) -> bool:
+        args = self.args
+        handlers_before = len(logging.getLogger().handlers) + len(logger.handlers)
+        self.stopping = asyncio.Event()
+        tracemalloc.start(args.trace_depth)
+        server = asyncio.create_task(self.engine.start())
+        await asyncio.sleep(0.5)  # Let the server come up
+        started = time.monotonic()
+        print(f"Soaking {args.hours:g} simulated hours at {args.speedup:g}x: "
+              f"{self.duration:.0f}s, {self.event_rate:.0f} events/s, "
+              f"{args.steady_clients} steady clients, storms of {args.storm_size} every {args.storm_interval:g}s")
+
+        workers = [
+            asyncio.create_task(self.feed_events()),
+            asyncio.create_task(self.steady_clients()),
+            asyncio.create_task(self.storms()),
+            asyncio.create_task(self.sampler(started)),
+        ]
+        try:
+            await asyncio.wait_for(self.stopping.wait(), timeout=self.duration)
+        except asyncio.TimeoutError:
+            pass
+        self.stopping.set()
+        await asyncio.wait(workers, timeout=10.0)
+
+        # Give disconnects time to be noticed before checking for leftovers
+        for _ in range(50):
+            if not self.engine.connected_clients and not self.engine.scheduler._in_flight \
+                    and not self.engine._fanout_tasks:
+                break
+            await asyncio.sleep(0.1)
+        self.sample(started)
+        final_snapshot = tracemalloc.take_snapshot()
+        problems = self.leaks_after_drain(handlers_before)
+
+        self.engine.should_reconnect = False
+        await asyncio.wait([server], timeout=15.0)
+        tracemalloc.stop()
+        return self.report(problems, final_snapshot)
+
+    def report(self, problems: List[str], final_snapshot: tracemalloc.Snapshot) -> bool:
+        args = self.args
+        window = [s for s in self.samples if s["t"] >= self.duration * WARMUP_FRACTION]
+        print(f"\nEvents: {self.events_sent}, messages received: {self.messages_received}, "
+              f"connections: {self.connections}, connect errors: {self.connect_errors}")
+        print(f"Scheduler: {self.engine.scheduler.stats()}")
+        print(f"Pipeline: {self.engine.pipeline.stats()}")
+
+        for key, label, limit_mb in (("traced", "Traced memory", args.max_growth_mb),
+                                     ("rss", "RSS", args.max_rss_growth_mb)):
+            series = [(s["t"], s[key]) for s in window if s[key] is not None]
+            if not series:
+                continue
+            growth, sustained = growth_trend(series)
+            print(f"{label}: {series[0][1] / 1048576:.1f} MB -> {series[-1][1] / 1048576:.1f} MB "
+                  f"(trend {growth / 1048576:+.2f} MB after warm-up)")
+            if growth > limit_mb * 1048576 and sustained:
+                problems.append(f"{label} grew {growth / 1048576:.1f} MB after warm-up and kept growing")
+
+        tasks = [(s["t"], s["tasks"]) for s in window]
+        growth, sustained = growth_trend(tasks)
+        print(f"Asyncio tasks: {window[0]['tasks'] if window else '-'} -> {tasks[-1][1] if tasks else '-'}")
+        if growth > args.storm_size and sustained:
+            problems.append(f"Asyncio task count grew by {growth:.0f} after warm-up")
+
+        if self.warmup_snapshot is not None:
+            print("\nTop allocation growth since warm-up:")
+            grown = [stat for stat in final_snapshot.compare_to(self.warmup_snapshot, "lineno")
+                     if stat.size_diff > 0]
+            for stat in grown[:TOP_ALLOCATIONS]:
+                print(f"  {stat}")
+
+        # A run where clients never got through proves nothing about the engine
+        if self.connect_errors > self.connections:
+            problems.append(f"{self.connect_errors} connect errors against {self.connections} connections")
+        if not self.messages_received:
+            problems.append("No messages were delivered to clients")
+
+        if problems:
+            print("\nFAIL")
+            for problem in problems:
+                print(f"  - {problem}")
+            return False
+        print("\nPASS")
+        return True
+
+
+def main():
+    """Run the soak test; exits non-zero on detected growth or leftovers"""
+    parser = argparse.ArgumentParser(description='Hyperfocus Gift Engine soak test')
+    parser.add_argument('--hours', type=float, default=DEFAULT_HOURS,
+                        help=f'Simulated stream length in hours (default: {DEFAULT_HOURS:g})')
+    parser.add_argument('--speedup', type=float, default=DEFAULT_SPEEDUP,
+                        help=f'Replay speed; events arrive this many times faster (default: {DEFAULT_SPEEDUP:g})')
+    parser.add_argument('--port', type=int, default=18765, help='WebSocket port for the engine under test')
+    parser.add_argument('--users', type=int, default=20000, help='Distinct synthetic viewers sending events')
+    parser.add_argument('--steady-clients', type=int, default=DEFAULT_STEADY_CLIENTS,
+                        help=f'Clients connected for the whole run (default: {DEFAULT_STEADY_CLIENTS})')
+    parser.add_argument('--storm-size', type=int, default=DEFAULT_STORM_SIZE,
+                        help=f'Clients per connect/disconnect storm (default: {DEFAULT_STORM_SIZE})')
+    parser.add_argument('--storm-interval', type=float, default=DEFAULT_STORM_INTERVAL,
+                        help=f'Seconds between storms (default: {DEFAULT_STORM_INTERVAL:g})')
+    parser.add_argument('--sample-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL,
+                        help=f'Seconds between memory samples (default: {DEFAULT_SAMPLE_INTERVAL:g})')
+    parser.add_argument('--max-growth-mb', type=float, default=DEFAULT_MAX_GROWTH_MB,
+                        help=f'Sustained traced-memory growth after warm-up that fails the run '
+                             f'(default: {DEFAULT_MAX_GROWTH_MB:g})')
+    parser.add_argument('--max-rss-growth-mb', type=float, default=DEFAULT_MAX_RSS_GROWTH_MB,
+                        help=f'Sustained RSS growth after warm-up that fails the run '
+                             f'(default: {DEFAULT_MAX_RSS_GROWTH_MB:g})')
+    parser.add_argument('--trace-depth', type=int, default=10, help='Frames kept per tracemalloc allocation')
+    parser.add_argument('--max-events-per-second', type=float, default=30.0,
+                        help='Engine gift rate budget (default: 30)')
+    parser.add_argument('--batch-interval-ms', type=float, default=0, help='Engine batching interval')
+    args = parser.parse_args()
+
+    # Per-event info logs would dominate both the run time and the allocation report
+    logger.setLevel(logging.WARNING)
+    logging.getLogger('websockets').setLevel(logging.ERROR)
+
+    ok = asyncio.run(SoakRun(args).run())
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Like, follow, share and viewer-count aggregation for the Hyperfocus Gift Engine
+
+Likes can arrive hundreds of times a second on a busy stream, so these events
+are never broadcast one by one. Each handler only bumps a counter; a summary
+frame goes out once per interval (on the engine's timer wheel, and only when
+something changed):
+
+    {"event": "social_summary", "data": {
+        "likes": 120, "follows": 2, "shares": 1,         # this interval
+        "new_followers": ["amy", "bob"],                 # up to MAX_RECENT_USERS
+        "last_minute": {"likes": 5400, "follows": 9, "shares": 3},
+        "total_likes": 250000, "total_follows": 40, "total_shares": 12,
+        "viewers": 1830, "peak_viewers": 2100,
+        "like_goal": {"target": 300000, "progress": 0.83}   # with --like-goal
+    }, "timestamp": 1700000000.0}
+
+TikTok reports the stream's running like total on like events; when it does,
+total_likes follows TikTok's number, otherwise likes counted since start.
+"""
+
+import collections
+import logging
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_INTERVAL_MS = 1000.0
+ROLLING_WINDOW_SECONDS = 60.0
+MAX_RECENT_USERS = 5
+
+
+class SocialAggregator:
+    def __init__(self, send: Callable[[Dict[str, Any]], None], interval_ms: float = DEFAULT_INTERVAL_MS,
+                 like_goal: int = 0, timers: Optional[TimerWheel] = None):
+        """
+        Initialize the aggregator
+
+        Args:
+            send: Called with each summary dict to broadcast it
+            interval_ms: How often summaries are sent
+            like_goal: Like total to report progress towards (0 disables)
+            timers: Timer wheel for the summary tick (the engine's shared wheel)
+        """
+        self.send = send
+        self.interval = interval_ms / 1000.0
+        self.like_goal = like_goal
+        self.timers = timers if timers is not None else TimerWheel()
+        # Current interval
+        self.likes = 0
+        self.follows = 0
+        self.shares = 0
+        self.new_followers: List[str] = []
+        self.viewers_changed = False
+        # Running state
+        self.total_likes = 0
+        self.total_follows = 0
+        self.total_shares = 0
+        self.viewers = 0
+        self.peak_viewers = 0
+        # Rolling window of (time, likes, follows, shares), one entry per sent interval
+        self.window: Deque[Tuple[float, int, int, int]] = collections.deque()
+        self.window_sums = [0, 0, 0]
+        self.events_seen = 0
+        self.summaries_sent = 0
+        self._handle = None
+
+    def _arm(self):
+        if self._handle is None:
+            self._handle = self.timers.call_later(self.interval, self._on_tick)
+
+    def add_likes(self, count: int, total: Optional[int] = None):
+        self.events_seen += 1
+        self.likes += count
+        if total:
+            self.total_likes = max(self.total_likes, total)
+        else:
+            self.total_likes += count
+        self._arm()
+
+    def add_follow(self, username: str):
+        self.events_seen += 1
+        self.follows += 1
+        self.total_follows += 1
+        if len(self.new_followers) < MAX_RECENT_USERS:
+            self.new_followers.append(username)
+        self._arm()
+
+    def add_share(self):
+        self.events_seen += 1
+        self.shares += 1
+        self.total_shares += 1
+        self._arm()
+
+    def set_viewers(self, viewers: int):
+        self.events_seen += 1
+        if viewers == self.viewers:
+            return
+        self.viewers = viewers
+        self.peak_viewers = max(self.peak_viewers, viewers)
+        self.viewers_changed = True
+        self._arm()
+
+    def _roll(self, now: float):
+        """Add this interval to the rolling window and drop what fell out of it"""
+        window, sums = self.window, self.window_sums
+        window.append((now, self.likes, self.follows, self.shares))
+        sums[0] += self.likes
+        sums[1] += self.follows
+        sums[2] += self.shares
+        while window and now - window[0][0] >= ROLLING_WINDOW_SECONDS:
+            _, likes, follows, shares = window.popleft()
+            sums[0] -= likes
+            sums[1] -= follows
+            sums[2] -= shares
+
+    def summary(self) -> Dict[str, Any]:
+        data = {
+            "likes": self.likes,
+            "follows": self.follows,
+            "shares": self.shares,
+            "new_followers": self.new_followers,
+            "last_minute": {
+                "likes": self.window_sums[0],
+                "follows": self.window_sums[1],
+                "shares": self.window_sums[2]
+            },
+            "total_likes": self.total_likes,
+            "total_follows": self.total_follows,
+            "total_shares": self.total_shares,
+            "viewers": self.viewers,
+            "peak_viewers": self.peak_viewers
+        }
+        if self.like_goal:
+            data["like_goal"] = {
+                "target": self.like_goal,
+                "progress": round(min(self.total_likes / self.like_goal, 1.0), 4)
+            }
+        return {"event": "social_summary", "data": data, "timestamp": time.time()}
+
+    def _on_tick(self):
+        self._handle = None
+        if not (self.likes or self.follows or self.shares or self.viewers_changed):
+            return  # Quiet; the next event re-arms the tick
+        self._roll(time.monotonic())
+        summary = self.summary()
+        self.likes = self.follows = self.shares = 0
+        self.new_followers = []
+        self.viewers_changed = False
+        self.summaries_sent += 1
+        try:
+            self.send(summary)
+        except Exception as e:
+            logger.error(f"Error sending social summary: {e}")
+        self._arm()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "total_likes": self.total_likes,
+            "total_follows": self.total_follows,
+            "total_shares": self.total_shares,
+            "peak_viewers": self.peak_viewers
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        self.total_likes = max(self.total_likes, state.get("total_likes", 0))
+        self.total_follows = max(self.total_follows, state.get("total_follows", 0))
+        self.total_shares = max(self.total_shares, state.get("total_shares", 0))
+        self.peak_viewers = max(self.peak_viewers, state.get("peak_viewers", 0))
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.summary()["data"],
+            events_seen=self.events_seen,
+            summaries_sent=self.summaries_sent,
+            interval_ms=self.interval * 1000
+        )
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events endpoint for the Hyperfocus Gift Engine
+
+Serves the same events as `broadcast_to_clients` over plain HTTP for overlay
+hosts that only support EventSource. Each event's SSE frame is built once from
+the bytes the engine already encoded and written to every subscriber as-is, so
+extra subscribers add no serialization work. Recent events are kept in a short
+buffer so reconnecting clients can resume with `Last-Event-ID`.
+
+Endpoint:
+    GET /events?profile=overlay
+"""
+
+import asyncio
+import collections
+import logging
+from typing import Deque, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_BUFFER_SIZE = 1000
+KEEPALIVE_INTERVAL = 15.0
+MAX_WRITE_BUFFER = 1 << 20  # Drop subscribers that fall 1 MB behind
+MAX_REQUEST_HEADER = 8192
+
+RESPONSE_HEADERS = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: keep-alive\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    b"\r\n"
+    b"retry: 2000\n\n"
+)
+
+
+class SSEBroadcaster:
+    def __init__(self, profiles: Tuple[str, ...], default_profile: str,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE, timers: Optional[TimerWheel] = None):
+        """
+        Initialize the SSE endpoint
+
+        Args:
+            profiles: Payload profile names subscribers may ask for
+            default_profile: Profile used when a subscriber doesn't ask, and
+                the fallback frame kept for every buffered event
+            buffer_size: Number of recent events kept for Last-Event-ID resume
+            timers: Timer wheel for keepalives (the engine's shared wheel)
+        """
+        self.profiles = profiles
+        self.default_profile = default_profile
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {
+            name: set() for name in profiles
+        }
+        self.recent: Deque[Tuple[int, Dict[str, bytes]]] = collections.deque(maxlen=buffer_size)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._keepalive: Optional[asyncio.Task] = None
+        self.timers = timers if timers is not None else TimerWheel()
+
+    def active_profiles(self) -> Tuple[str, ...]:
+        """Profiles the engine must encode for the next event"""
+        return (self.default_profile,) + tuple(
+            name for name, writers in self.subscribers.items()
+            if writers and name != self.default_profile
+        )
+
+    def __len__(self):
+        return sum(len(writers) for writers in self.subscribers.values())
+
+    def publish(self, event_id: int, frames: Dict[str, str]):
+        """Send an encoded event to every subscriber of each profile"""
+        sse_frames: Dict[str, bytes] = {}
+        for profile, message in frames.items():
+            if profile not in self.subscribers:
+                continue  # Frame groups SSE doesn't serve
+            # SSE data lines can't contain raw newlines; json.dumps output has none
+            sse_frames[profile] = b"id: %d\ndata: %s\n\n" % (event_id, message.encode('utf-8'))
+        self.recent.append((event_id, sse_frames))
+
+        fallback = sse_frames[self.default_profile]
+        for profile, writers in self.subscribers.items():
+            if not writers:
+                continue
+            frame = sse_frames.get(profile, fallback)
+            for writer in list(writers):
+                self._write(profile, writer, frame)
+
+    def _write(self, profile: str, writer: asyncio.StreamWriter, frame: bytes):
+        if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            logger.warning("Dropping slow or closed SSE subscriber")
+            self.subscribers[profile].discard(writer)
+            writer.close()
+            return
+        writer.write(frame)
+
+    def _replay(self, writer: asyncio.StreamWriter, profile: str, last_event_id: int):
+        """Resend buffered events newer than last_event_id"""
+        for event_id, sse_frames in self.recent:
+            if event_id > last_event_id:
+                writer.write(sse_frames.get(profile, sse_frames[self.default_profile]))
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str]]:
+        head = await reader.readuntil(b"\r\n\r\n")
+        if len(head) > MAX_REQUEST_HEADER:
+            raise ValueError("Request header too large")
+        lines = head.decode('latin-1').split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP request; event streams stay open until the client leaves"""
+        try:
+            method, target, headers = await asyncio.wait_for(self._read_request(reader), timeout=10.0)
+        except Exception:
+            writer.close()
+            return
+
+        url = urlsplit(target)
+        if method != "GET" or url.path not in ("/events", "/sse"):
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            writer.close()
+            return
+
+        query = parse_qs(url.query)
+        profile = query.get("profile", [self.default_profile])[0]
+        if profile not in self.subscribers:
+            profile = self.default_profile
+        last_event_id = headers.get("last-event-id") or query.get("lastEventId", [None])[0]
+
+        writer.write(RESPONSE_HEADERS)
+        if last_event_id is not None:
+            try:
+                self._replay(writer, profile, int(last_event_id))
+            except ValueError:
+                pass
+
+        self.subscribers[profile].add(writer)
+        peer = writer.get_extra_info('peername')
+        logger.info(f"New SSE subscriber from {peer[0] if peer else 'unknown'} ({profile}). Total: {len(self)}")
+        try:
+            # EventSource never sends anything after the request; wait for EOF
+            while await reader.read(1024):
+                pass
+        except Exception:
+            pass
+        finally:
+            self.subscribers[profile].discard(writer)
+            writer.close()
+            logger.info(f"SSE subscriber disconnected. Remaining: {len(self)}")
+
+    def snapshot(self) -> list:
+        """Recent-events buffer, for handoff to a successor engine"""
+        return [
+            [event_id, {profile: frame.decode('utf-8') for profile, frame in sse_frames.items()}]
+            for event_id, sse_frames in self.recent
+        ]
+
+    def restore(self, recent: list):
+        """Load a buffer taken by snapshot(), so Last-Event-ID resume spans the restart"""
+        self.recent.clear()
+        for event_id, sse_frames in recent:
+            self.recent.append((event_id, {profile: frame.encode('utf-8') for profile, frame in sse_frames.items()}))
+
+    async def _send_keepalives(self):
+        while True:
+            await self.timers.sleep(KEEPALIVE_INTERVAL)
+            for profile, writers in self.subscribers.items():
+                for writer in list(writers):
+                    self._write(profile, writer, b": keepalive\n\n")
+
+    async def start(self, host: str, port: int, sock=None):
+        """Start listening for EventSource clients (on `sock` if given, e.g. after a handoff)"""
+        if sock is not None:
+            self.server = await asyncio.start_server(self.handle_connection, sock=sock)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self._keepalive = asyncio.create_task(self._send_keepalives())
+        logger.info(f"SSE endpoint started on http://{host}:{port}/events")
+
+    async def stop(self):
+        """Close the endpoint and all event streams"""
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        for writers in self.subscribers.values():
+            for writer in writers:
+                writer.close()
+            writers.clear()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Server-side TapBattle for the Hyperfocus Gift Engine
+
+Viewers tap for a team; the engine keeps one counter per team and sends the
+score changes to every client on a fixed tick instead of once per tap, so a
+crowd tapping tens of thousands of times a second costs one small frame per
+tick.
+
+Taps skip the JSON command path entirely. A tap is a tiny text frame:
+
+    t<team>            one tap for team index <team>, e.g. "t0"
+    t<team>*<count>    <count> taps the client coalesced, e.g. "t1*12"
+
+Each connection has its own token bucket (TAP_RATE taps per second, TAP_BURST
+at once); taps over budget are dropped silently rather than counted as
+protocol violations, since fast tapping is the point of the game. Malformed
+tap frames (bad team or count) are violations, like malformed JSON.
+
+Every tick with activity, clients receive:
+
+    {"event": "tap_battle", "data": {"round": 1, "teams": ["red", "blue"],
+     "delta": [40, 12], "totals": [1520, 980]}}
+
+Totals are included so late joiners catch up on the next tick. With
+--bus-subscribe edge nodes, each node counts the taps of its own clients.
+"""
+
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from admission import TokenBucket
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_TEAMS = ("red", "blue")
+DEFAULT_TICK_MS = 100.0
+
+# Per-connection tap budget: sustained taps per second, burst
+TAP_RATE = 20.0
+TAP_BURST = 40
+
+# Largest <count> accepted in one coalesced tap frame
+MAX_TAPS_PER_MESSAGE = 50
+
+# Tap frames are never longer than this ("t" + team + "*" + count)
+MAX_TAP_MESSAGE = 16
+
+# TapBattle.tap() result for a frame with a bad team or count
+MALFORMED_TAP = -1
+
+
+def is_tap_message(message) -> bool:
+    """True for a compact tap frame (checked before any JSON parsing)"""
+    return isinstance(message, str) and len(message) <= MAX_TAP_MESSAGE and message[:1] == "t"
+
+
+def team_names(teams: Any) -> List[str]:
+    """Validate a list of team names (e.g. from an admin command); raises ValueError"""
+    # A bare string is a sequence too, but would make one team per character
+    if not isinstance(teams, (list, tuple)) or not all(isinstance(team, str) and team for team in teams):
+        raise ValueError("Teams must be a list of team names")
+    if len(teams) < 2:
+        raise ValueError("A tap battle needs at least two teams")
+    return list(teams)
+
+
+def new_tap_bucket() -> TokenBucket:
+    return TokenBucket(TAP_RATE, TAP_BURST)
+
+
+class TapBattle:
+    def __init__(self, send: Callable[[str], None], teams: Sequence[str] = DEFAULT_TEAMS,
+                 tick_ms: float = DEFAULT_TICK_MS, timers: Optional[TimerWheel] = None):
+        """
+        Initialize the battle
+
+        Args:
+            send: Called with each encoded tick frame to fan it out to clients
+            teams: Team names; taps address teams by index
+            tick_ms: How often score changes are sent
+            timers: Timer wheel for the tick (the engine's shared wheel)
+        """
+        self.send = send
+        self.tick = tick_ms / 1000.0
+        self.timers = timers if timers is not None else TimerWheel()
+        self.teams: List[str] = team_names(teams)
+        self.round = 1
+        self.totals = [0] * len(self.teams)
+        self.deltas = [0] * len(self.teams)
+        self.dirty = False
+        self.accepted_count = 0
+        self.dropped_count = 0
+        self.ticks_sent = 0
+        self.started_at = time.time()
+        self._handle = None
+
+    def tap(self, bucket: TokenBucket, message: str) -> int:
+        """
+        Count a tap frame from one connection
+
+        Returns the number of taps accepted (0 when over budget), or MALFORMED_TAP
+        """
+        team, _, count = message[1:].partition("*")
+        try:
+            team = int(team)
+            count = int(count) if count else 1
+        except ValueError:
+            return MALFORMED_TAP
+        if not 0 <= team < len(self.teams) or count < 1:
+            return MALFORMED_TAP
+        count = min(count, MAX_TAPS_PER_MESSAGE)
+
+        # Refill the bucket, then take whatever part of the taps it allows
+        bucket.consume(0)
+        accepted = min(count, int(bucket.tokens))
+        bucket.tokens -= accepted
+        self.dropped_count += count - accepted
+        if not accepted:
+            return 0
+
+        self.deltas[team] += accepted
+        self.accepted_count += accepted
+        if not self.dirty:
+            self.dirty = True
+            if self._handle is None:
+                self._handle = self.timers.call_later(self.tick, self._on_tick)
+        return accepted
+
+    def _frame(self, delta: List[int]) -> str:
+        return json.dumps({
+            "event": "tap_battle",
+            "data": {
+                "round": self.round,
+                "teams": self.teams,
+                "delta": delta,
+                "totals": self.totals
+            }
+        }, separators=(",", ":"))
+
+    def _on_tick(self):
+        """Fold this tick's taps into the totals and send one frame"""
+        self._handle = None
+        if not self.dirty:
+            return  # Nobody tapped; the next tap re-arms the tick
+        delta = self.deltas
+        self.totals = [total + d for total, d in zip(self.totals, delta)]
+        self.deltas = [0] * len(self.teams)
+        self.dirty = False
+        self.ticks_sent += 1
+        try:
+            self.send(self._frame(delta))
+        except Exception as e:
+            logger.error(f"Error sending tap battle scores: {e}")
+        self._handle = self.timers.call_later(self.tick, self._on_tick)
+
+    def reset(self, teams: Optional[Sequence[str]] = None):
+        """Start a new round, optionally with different teams"""
+        if teams is not None:
+            self.teams = team_names(teams)
+        self.round += 1
+        self.totals = [0] * len(self.teams)
+        self.deltas = [0] * len(self.teams)
+        self.dirty = False
+        self.started_at = time.time()
+        self.send(self._frame([0] * len(self.teams)))
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Scores including taps not yet sent, for handoff"""
+        return {
+            "round": self.round,
+            "teams": self.teams,
+            "totals": [total + d for total, d in zip(self.totals, self.deltas)]
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        teams = state.get("teams")
+        totals = state.get("totals")
+        if not teams or not totals or len(teams) != len(totals):
+            return
+        self.teams = list(teams)
+        self.round = state.get("round", 1)
+        self.totals = [int(total) for total in totals]
+        self.deltas = [0] * len(self.teams)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "round": self.round,
+            "teams": self.teams,
+            "totals": [total + d for total, d in zip(self.totals, self.deltas)],
+            "accepted": self.accepted_count,
+            "dropped": self.dropped_count,
+            "ticks_sent": self.ticks_sent,
+            "tick_ms": self.tick * 1000
+        }
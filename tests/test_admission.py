@@ -0,0 +1,54 @@
+from admission import (
+    AdmissionController, ConnectionLimits, INBOUND_RATE_LIMITS, DEFAULT_INBOUND_RATE_LIMIT,
+    MAX_INBOUND_MESSAGE, MAX_RATE_VIOLATIONS
+)
+
+
+def test_every_frame_is_charged_before_parsing():
+    limits = ConnectionLimits()
+    _, burst = DEFAULT_INBOUND_RATE_LIMIT
+    assert all(limits.allow_frame(10) for _ in range(burst))
+    assert not limits.allow_frame(10)
+    assert limits.violations == 1
+
+
+def test_oversized_frames_are_violations():
+    limits = ConnectionLimits()
+    assert not limits.allow_frame(MAX_INBOUND_MESSAGE + 1)
+    assert limits.violations == 1
+    assert "*" not in limits.buckets
+
+
+def test_typed_commands_use_their_own_bucket():
+    limits = ConnectionLimits()
+    _, burst = INBOUND_RATE_LIMITS["ping"]
+    assert all(limits.allow("ping") for _ in range(burst))
+    assert not limits.allow("ping")
+    # Untyped messages were already charged to "*" by allow_frame()
+    assert limits.allow(None)
+    assert limits.allow("unknown")
+
+
+def test_malformed_frames_close_the_connection_eventually():
+    limits = ConnectionLimits()
+    for _ in range(MAX_RATE_VIOLATIONS):
+        limits.malformed()
+    assert not limits.exceeded
+    limits.malformed()
+    assert limits.exceeded
+
+
+def test_admission_caps_per_ip_and_total():
+    admission = AdmissionController(max_clients=3, max_clients_per_ip=2)
+    assert admission.admit("a")[0]
+    assert admission.admit("a")[0]
+    admitted, reason = admission.admit("a")
+    assert not admitted and "address" in reason
+    assert admission.admit("b")[0]
+    admitted, reason = admission.admit("c")
+    assert not admitted and reason == "server full"
+    admission.release("a")
+    admission.release("a")
+    assert "a" not in admission.clients_per_ip
+    assert admission.total == 1
+    assert admission.rejected == 2
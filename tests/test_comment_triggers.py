@@ -0,0 +1,97 @@
+import json
+import random
+
+import pytest
+
+from comment_triggers import CommentTriggers, compile_rules
+
+
+def automaton(*rules, case_sensitive=False):
+    return compile_rules({"case_sensitive": case_sensitive, "rules": list(rules)})
+
+
+def names(matched):
+    return [rule.name for rule in matched]
+
+
+def brute_force(rules, text):
+    """Rule names matched in text, checked one rule at a time"""
+    start = len(text) - len(text.lstrip())
+    matched = set()
+    for rule in rules:
+        begin = text.find(rule.pattern)
+        while begin != -1:
+            end = begin + len(rule.pattern)
+            if rule.kind == "command":
+                ok = begin == start
+            elif rule.kind == "keyword":
+                ok = not (begin > 0 and text[begin - 1].isalnum()) and not (end < len(text) and text[end].isalnum())
+            else:
+                ok = True
+            if ok:
+                matched.add(rule.name)
+                break
+            begin = text.find(rule.pattern, begin + 1)
+    return matched
+
+
+def test_rule_kinds():
+    matcher = automaton(
+        {"match": "hype", "counter": "hype"},
+        {"match": "🔥", "counter": "fire"},
+        {"match": "!vote", "kind": "command", "counter": "vote"},
+    )
+    assert names(matcher.match("so much hype 🔥🔥")) == ["hype", "🔥"]
+    assert names(matcher.match("hyped")) == []  # Keywords match whole words only
+    assert names(matcher.match("  !vote red")) == ["!vote"]
+    assert names(matcher.match("please !vote")) == []  # Commands only at the start
+    assert names(matcher.match("HYPE")) == ["hype"]
+
+
+def test_case_sensitive():
+    matcher = automaton({"match": "GG", "counter": "gg"}, case_sensitive=True)
+    assert names(matcher.match("GG wp")) == ["GG"]
+    assert names(matcher.match("gg wp")) == []
+
+
+def test_each_rule_fires_once_in_order_of_first_match():
+    matcher = automaton({"match": "b", "kind": "substring", "counter": "b"},
+                        {"match": "a", "kind": "substring", "counter": "a"})
+    assert names(matcher.match("abab")) == ["a", "b"]
+
+
+def test_matches_brute_force():
+    random.seed(7)
+    alphabet = "ab c!"
+    for _ in range(50):
+        rules = []
+        for number in range(random.randint(1, 8)):
+            pattern = "".join(random.choice(alphabet) for _ in range(random.randint(1, 4)))
+            kind = random.choice(("keyword", "substring", "command"))
+            rules.append({"name": f"{number}:{pattern}", "match": pattern, "kind": kind, "counter": "c"})
+        matcher = automaton(*rules)
+        for _ in range(20):
+            text = "".join(random.choice(alphabet) for _ in range(random.randint(0, 20)))
+            assert set(names(matcher.match(text))) == brute_force(matcher.rules, text), (rules, text)
+
+
+@pytest.mark.parametrize("rule", [{"match": ""}, {"match": "x", "kind": "regex", "counter": "c"}, {"match": "x"}])
+def test_bad_rules(rule):
+    with pytest.raises(ValueError):
+        compile_rules({"rules": [rule]})
+
+
+def test_counters_and_cooldown(tmp_path):
+    path = tmp_path / "triggers.json"
+    path.write_text(json.dumps({"rules": [
+        {"match": "hype", "effect": {"type": "hype_wave"}, "counter": "hype", "cooldown": 60},
+    ]}))
+    triggers = CommentTriggers(str(path))
+    assert triggers.load() == 1
+    fired = triggers.match("hype!")
+    assert fired == [{"trigger": "hype", "effect": {"type": "hype_wave"}, "counter": "hype", "count": 1}]
+    # Inside the cooldown the effect is held back, but the counter still counts
+    assert triggers.match("more hype") == []
+    assert triggers.counters == {"hype": 2}
+    assert triggers.comments_matched == 2
+    assert triggers.effects_fired == 1
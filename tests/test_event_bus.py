@@ -0,0 +1,111 @@
+import asyncio
+
+from event_bus import BrokerBus, BusEvent, EventBroker
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def event(seq):
+    return BusEvent(seq, {"desktop": f'{{"n":{seq}}}'})
+
+
+def run_bus(tmp_path, scenario):
+    async def run():
+        address = f"unix:{tmp_path / 'bus.sock'}"
+        broker = EventBroker(address)
+        await broker.start()
+        received = []
+
+        async def collect(bus_event):
+            received.append(bus_event.frames["desktop"])
+
+        subscriber = BrokerBus(address, role="subscribe")
+        subscriber.subscribe(collect)
+        await subscriber.start()
+        await wait_for(lambda: broker.subscribers)
+        buses = [subscriber]
+        try:
+            await scenario(address, broker, subscriber, received, buses)
+        finally:
+            for bus in buses:
+                await bus.stop()
+            await broker.stop()
+
+    asyncio.run(run())
+
+
+async def connect_publisher(address, broker, buses):
+    publisher = BrokerBus(address, role="publish")
+    buses.append(publisher)
+    await publisher.start()
+    await wait_for(lambda: publisher._writer is not None and broker.epoch == publisher.epoch)
+    return publisher
+
+
+def test_events_arrive_in_order(tmp_path):
+    async def scenario(address, broker, subscriber, received, buses):
+        publisher = await connect_publisher(address, broker, buses)
+        for seq in range(1, 201):
+            await publisher.publish(event(seq))
+        await wait_for(lambda: len(received) == 200)
+        assert received == [f'{{"n":{seq}}}' for seq in range(1, 201)]
+        assert subscriber.gaps == 0
+
+    run_bus(tmp_path, scenario)
+
+
+def test_replayed_events_are_dropped_within_an_epoch(tmp_path):
+    async def scenario(address, broker, subscriber, received, buses):
+        publisher = await connect_publisher(address, broker, buses)
+        for seq in (1, 2, 3):
+            await publisher.publish(event(seq))
+        await wait_for(lambda: len(received) == 3)
+        broker._forward(2, event(2).to_line())  # A reconnect backlog overlapping what was sent
+        await publisher.publish(event(4))
+        await wait_for(lambda: len(received) == 4)
+        assert [r[-2] for r in received] == ["1", "2", "3", "4"]
+
+    run_bus(tmp_path, scenario)
+
+
+def test_restarted_publisher_starts_a_new_sequence(tmp_path):
+    async def scenario(address, broker, subscriber, received, buses):
+        first = await connect_publisher(address, broker, buses)
+        for seq in (1, 2, 3):
+            await first.publish(event(seq))
+        await wait_for(lambda: len(received) == 3)
+        await first.stop()
+
+        # Restarted without a checkpoint: numbering starts again at #1
+        second = await connect_publisher(address, broker, buses)
+        assert second.epoch != first.epoch
+        for seq in (1, 2):
+            await second.publish(event(seq))
+        await wait_for(lambda: len(received) == 5)
+        assert subscriber.epoch == second.epoch
+        assert subscriber.epoch_changes == 1
+        assert subscriber.duplicates == 0
+        assert [seq for seq, _ in broker.recent] == [1, 2]
+
+    run_bus(tmp_path, scenario)
+
+
+def test_subscriber_from_an_old_epoch_gets_the_whole_buffer(tmp_path):
+    async def scenario(address, broker, subscriber, received, buses):
+        await subscriber.stop()
+        subscriber.epoch = "old"
+        subscriber.last_seq = 50
+        publisher = await connect_publisher(address, broker, buses)
+        for seq in (1, 2):
+            await publisher.publish(event(seq))
+        await subscriber.start()
+        await wait_for(lambda: len(received) == 2)
+        assert subscriber.epoch == publisher.epoch
+        assert subscriber.last_seq == 2
+
+    run_bus(tmp_path, scenario)
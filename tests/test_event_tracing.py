@@ -0,0 +1,100 @@
+import asyncio
+import json
+import random
+
+from event_tracing import EventTrace, EventTracer, to_unix_nanos
+
+UPSTREAM_MS = 1700000000000
+BASE_NS = UPSTREAM_MS * 1000000
+
+
+def test_to_unix_nanos():
+    assert to_unix_nanos(1700000000) == BASE_NS
+    assert to_unix_nanos(UPSTREAM_MS) == BASE_NS
+    assert to_unix_nanos(UPSTREAM_MS * 1000) == BASE_NS
+    assert to_unix_nanos(BASE_NS) == BASE_NS
+    assert to_unix_nanos(None) is None
+    assert to_unix_nanos(True) is None
+
+
+def export_one(tmp_path, trace):
+    path = tmp_path / "spans.jsonl"
+    tracer = EventTracer(str(path), sample_rate=1.0)
+    tracer.finish(trace)
+    asyncio.run(tracer.flush())
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1
+    return json.loads(lines[0])
+
+
+def test_trace_round_trips_to_otlp_json(tmp_path):
+    trace = EventTrace("gift_received", UPSTREAM_MS)
+    ms = 1000000
+    trace.marks.update({
+        "handler": BASE_NS + 40 * ms,
+        "enqueue": BASE_NS + 41 * ms,
+        "dequeue": BASE_NS + 45 * ms,
+        "encode": BASE_NS + 46 * ms,
+        "encoded": BASE_NS + 47 * ms,
+        "done": BASE_NS + 60 * ms,  # finish() keeps an existing mark
+    })
+    trace.attributes.update(gift="Rose", seq=7, outcome="delivered")
+    trace.client_write("desktop 10.0.0.1:5000", BASE_NS + 48 * ms, BASE_NS + 50 * ms)
+    trace.client_write("overlay 10.0.0.2:5000", BASE_NS + 49 * ms, BASE_NS + 59 * ms, "ConnectionClosed")
+
+    request = export_one(tmp_path, trace)
+    resource = request["resourceSpans"][0]
+    assert resource["resource"]["attributes"][0]["value"]["stringValue"] == "hyperfocus-gift-engine"
+    spans = resource["scopeSpans"][0]["spans"]
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+        assert span["traceId"] == trace.trace_id
+        # OTLP/JSON carries 64-bit times as strings
+        assert int(span["startTimeUnixNano"]) <= int(span["endTimeUnixNano"])
+
+    def times(name):
+        span = by_name[name][0]
+        return (int(span["startTimeUnixNano"]) - BASE_NS) // ms, (int(span["endTimeUnixNano"]) - BASE_NS) // ms
+
+    root = by_name["gift_received"][0]
+    assert "parentSpanId" not in root
+    assert {a["key"]: a["value"] for a in root["attributes"]} == {
+        "gift": {"stringValue": "Rose"}, "seq": {"intValue": "7"}, "outcome": {"stringValue": "delivered"}
+    }
+    assert times("gift_received") == (0, 60)
+    assert times("tiktok.delivery") == (0, 40)
+    assert times("ingest") == (40, 41)
+    assert times("queue") == (41, 45)
+    assert times("encode") == (46, 47)
+    assert times("fanout") == (48, 59)
+    assert "batch.wait" not in by_name  # Never batched
+
+    fanout = by_name["fanout"][0]
+    writes = by_name["client.write"]
+    assert [w["parentSpanId"] for w in writes] == [fanout["spanId"]] * 2
+    # Slowest write first, with its error as the span status
+    assert writes[0]["status"]["message"] == "ConnectionClosed"
+    assert "status" not in writes[1]
+    for span in spans:
+        if span is not root and span not in writes:
+            assert span["parentSpanId"] == root["spanId"]
+
+
+def test_trace_that_never_reached_a_client(tmp_path):
+    trace = EventTrace("comment", None)
+    trace.attributes["outcome"] = "duplicate"
+    spans = export_one(tmp_path, trace)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    # Just the root span, from handler entry to finish()
+    assert [span["name"] for span in spans] == ["comment"]
+    assert int(spans[0]["startTimeUnixNano"]) == trace.marks["handler"]
+    assert int(spans[0]["endTimeUnixNano"]) == trace.marks["done"]
+
+
+def test_sample_rate():
+    assert all(EventTracer("unused", sample_rate=1.0).start("comment") for _ in range(100))
+    assert not any(EventTracer("unused", sample_rate=0.0).start("comment") for _ in range(100))
+    random.seed(11)
+    tracer = EventTracer("unused", sample_rate=0.1)
+    sampled = sum(tracer.start("comment") is not None for _ in range(10000))
+    assert 800 < sampled < 1200
@@ -0,0 +1,111 @@
+import datetime
+import json
+
+import pytest
+
+from gift_events import DEFAULT_EFFECT, CommentRecord, GiftRecord, RecordEncoder
+
+# Same shapes as the engine's PAYLOAD_PROFILES (tiktok_gift_listener imports TikTokLive, so isn't used here)
+MOBILE_GIFT = {
+    "event": None,
+    "gift": ("name", "id", "repeat_count", "is_streaking"),
+    "user": ("username", "nickname"),
+    "effect": ("type", "intensity", "color", "particles"),
+    "tier": None,
+    "burst": None,
+    "timestamp": None,
+}
+OVERLAY_GIFT = {
+    "event": None,
+    "gift": ("name", "repeat_count"),
+    "user": ("username",),
+    "effect": ("type", "intensity", "color"),
+    "tier": None,
+    "burst": ("merged",),
+    "timestamp": None,
+}
+OVERLAY_COMMENT = {"event": None, "user": None, "message": None}
+
+GALAXY = {"type": "cosmic_spiral", "intensity": 9, "color": "#4B0082", "particles": 5000, "sound": "galaxy_hum"}
+
+
+class UserRef:
+    user_id = 42
+
+
+def project(data, spec):
+    """The dict projection the engine applied before records existed"""
+    projected = {}
+    for key, fields in spec.items():
+        if key not in data:
+            continue
+        value = data[key]
+        if fields is not None and isinstance(value, dict):
+            value = {field: value[field] for field in fields if field in value}
+        projected[key] = value
+    return projected
+
+
+def old_frame(record, spec=None, user_refs=False):
+    payload = record.to_dict()
+    if user_refs:
+        payload["user"] = record.user_ref.user_id
+    if spec is not None:
+        payload = project(payload, spec)
+    return json.dumps(payload, default=str)
+
+
+def gift(effect=GALAXY, burst=None, timestamp=1700000000000, nickname="Amy ✨"):
+    record = GiftRecord("Galaxy", 5655, 3, True, "amy", nickname, effect, "premium", timestamp, 1000)
+    record.burst = burst
+    record.user_ref = UserRef()
+    return record
+
+
+@pytest.mark.parametrize("spec", [None, MOBILE_GIFT, OVERLAY_GIFT], ids=["desktop", "mobile", "overlay"])
+@pytest.mark.parametrize("user_refs", [False, True], ids=["", "+refs"])
+@pytest.mark.parametrize("record", [
+    gift(),
+    gift(effect=DEFAULT_EFFECT),
+    gift(burst={"merged": 3, "users": ["amy", "bob"]}),
+    gift(timestamp=datetime.datetime(2025, 1, 2, 3, 4, 5), nickname='Quote "Q" \\ back'),
+], ids=["shared_effect", "default_effect", "burst", "odd_values"])
+def test_gift_frames_match_dict_payloads(record, spec, user_refs):
+    encoder = RecordEncoder(GiftRecord, spec, user_refs=user_refs)
+    # Twice: the second encode comes from the shared-effect and string caches
+    assert encoder.encode(record) == old_frame(record, spec, user_refs)
+    assert encoder.encode(record) == old_frame(record, spec, user_refs)
+
+
+@pytest.mark.parametrize("spec", [None, OVERLAY_COMMENT], ids=["desktop", "overlay"])
+@pytest.mark.parametrize("user_refs", [False, True], ids=["", "+refs"])
+def test_comment_frames_match_dict_payloads(spec, user_refs):
+    record = CommentRecord("amy", "héllo 🔥", 1700000000000)
+    record.user_ref = UserRef()
+    assert RecordEncoder(CommentRecord, spec, user_refs=user_refs).encode(record) == \
+        old_frame(record, spec, user_refs)
+
+
+def test_shared_effect_edits_are_not_served_stale():
+    effect = dict(GALAXY)
+    encoder = RecordEncoder(GiftRecord)
+    encoder.encode(gift(effect=effect))
+    other = dict(GALAXY, color="#000000")
+    assert encoder.encode(gift(effect=other)) == old_frame(gift(effect=other))
+
+
+def test_records_intern_names():
+    first = GiftRecord("".join(["Ro", "se"]), 1, 1, False, "".join(["am", "y"]), "Amy", DEFAULT_EFFECT, "volume", 1)
+    second = GiftRecord("".join(["Ro", "se"]), 1, 1, False, "".join(["am", "y"]), "Amy", DEFAULT_EFFECT, "volume", 1)
+    assert first.gift_name is second.gift_name
+    assert first.username is second.username
+    assert first.effect is second.effect is DEFAULT_EFFECT
+
+
+def test_fields_round_trip():
+    record = gift(burst={"merged": 2, "users": ["amy"]})
+    copy = GiftRecord.from_fields(record.fields())
+    assert copy.to_dict() == record.to_dict()
+    assert copy.diamond_count == 1000
+    comment = CommentRecord("amy", "hi", 1)
+    assert CommentRecord.from_fields(comment.fields()).to_dict() == comment.to_dict()
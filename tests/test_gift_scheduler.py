@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from event_tracing import EventTrace
+from gift_events import GiftRecord, DEFAULT_EFFECT
+from gift_scheduler import GiftScheduler, classify_gift
+
+
+def gift(username, count, streaking=False, name="Rose"):
+    return GiftRecord(
+        gift_name=name, gift_id=1, repeat_count=count, is_streaking=streaking, username=username,
+        nickname=username, effect=DEFAULT_EFFECT, tier=classify_gift(name), timestamp=0
+    )
+
+
+async def discard(event):
+    pass
+
+
+def over_budget_scheduler():
+    # No tokens, and next to none refilled while a test runs
+    return GiftScheduler(discard, max_events_per_second=0.001, burst=0)
+
+
+def test_streak_merges_to_latest_count_and_ends():
+    scheduler = over_budget_scheduler()
+    for count in (1, 2, 3, 4, 5):
+        scheduler.submit(gift("amy", count, streaking=True), "volume")
+    scheduler.submit(gift("amy", 5), "volume")
+
+    assert len(scheduler.queues["volume"]) == 1
+    burst = scheduler.queues["volume"][0]
+    assert burst.repeat_count == 5
+    assert burst.is_streaking is False
+    assert burst.burst["merged"] == 6
+
+
+def test_separate_sends_are_summed():
+    scheduler = over_budget_scheduler()
+    scheduler.submit(gift("amy", 1), "volume")
+    scheduler.submit(gift("bob", 1), "volume")
+    scheduler.submit(gift("amy", 3, streaking=True), "volume")
+    scheduler.submit(gift("amy", 4), "volume")  # Ends amy's streak
+
+    burst = scheduler.queues["volume"][0]
+    assert burst.repeat_count == 1 + 1 + 4
+    assert burst.is_streaking is False
+    assert burst.burst["users"] == ["amy", "bob"]
+
+
+def test_burst_streaks_while_any_streak_is_open():
+    scheduler = over_budget_scheduler()
+    scheduler.submit(gift("amy", 2, streaking=True), "volume")
+    scheduler.submit(gift("bob", 3, streaking=True), "volume")
+    scheduler.submit(gift("amy", 2), "volume")
+
+    burst = scheduler.queues["volume"][0]
+    assert burst.repeat_count == 2 + 3
+    assert burst.is_streaking is True
+
+
+def test_merge_state_is_dropped_on_release():
+    async def run():
+        released = []
+
+        async def sink(event):
+            released.append(event)
+
+        scheduler = GiftScheduler(sink, max_events_per_second=0.001, burst=0)
+        scheduler.submit(gift("amy", 1, streaking=True), "volume")
+        scheduler.submit(gift("amy", 2, streaking=True), "volume")
+        assert scheduler.burst_counts
+        await scheduler.drain()
+        return scheduler, released
+
+    scheduler, released = asyncio.run(run())
+    assert [event.repeat_count for event in released] == [2]
+    assert not scheduler.burst_counts
+
+
+def test_high_tiers_are_never_merged():
+    scheduler = over_budget_scheduler()
+    scheduler.submit(gift("amy", 1, name="Lion"), "premium")
+    scheduler.submit(gift("bob", 1, name="Lion"), "premium")
+    assert len(scheduler.queues["premium"]) == 2
+    assert scheduler.merged_count == 0
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        GiftScheduler(discard, max_events_per_second=0)
+
+
+def test_merged_gift_trace_is_finished():
+    finished = []
+    scheduler = GiftScheduler(discard, max_events_per_second=0.001, burst=0, finish_trace=finished.append)
+    first, second, third = gift("amy", 1), gift("bob", 1), gift("cat", 1)
+    first.trace = EventTrace("gift_received", None)
+    third.trace = EventTrace("gift_received", None)
+    for record in (first, second, third):
+        scheduler.submit(record, "volume")
+
+    # The queued event keeps the first trace; the third gift's trace ends at the merge
+    assert scheduler.queues["volume"][0].trace is first.trace
+    assert finished == [third.trace]
+    assert third.trace.attributes == {"outcome": "merged", "merged_into": first.trace.trace_id}
@@ -0,0 +1,37 @@
+import asyncio
+
+from pipeline import Pipeline
+
+
+def test_submit_to_named_stage_drops_when_full():
+    async def run():
+        pipeline = Pipeline(queue_size=2)
+        pipeline.add_stage("ingest", lambda item: item)
+        pipeline.add_stage("encode", lambda item: None)
+        # Not started, so nothing drains the queues
+        assert pipeline.submit("a", "encode")
+        assert pipeline.submit("b", "encode")
+        assert not pipeline.submit("c", "encode")
+        assert pipeline.dropped == 1
+        assert pipeline.stages[0].queue.empty()
+
+    asyncio.run(run())
+
+
+def test_items_flow_through_stages():
+    async def run():
+        seen = []
+        pipeline = Pipeline()
+        pipeline.add_stage("ingest", lambda item: item * 2)
+        pipeline.add_stage("dedup", lambda item: None if item == 4 else item)
+        pipeline.add_stage("encode", seen.append)
+        pipeline.start()
+        for item in (1, 2, 3):
+            pipeline.submit(item)
+        pipeline.submit(10, "encode")
+        assert await pipeline.join()
+        await pipeline.stop()
+        assert sorted(seen) == [2, 6, 10]  # 10 skipped the stages before encode
+        assert pipeline.stats()["stages"]["dedup"]["consumed"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+from tap_battle import MALFORMED_TAP, TapBattle, new_tap_bucket
+
+
+def battle(frames):
+    return TapBattle(frames.append, ("red", "blue"))
+
+
+def test_reset_with_new_teams():
+    frames = []
+    tap_battle = battle(frames)
+    tap_battle.reset(["cats", "dogs", "birds"])
+    data = json.loads(frames[-1])["data"]
+    assert data["round"] == 2
+    assert data["teams"] == ["cats", "dogs", "birds"]
+    assert data["totals"] == [0, 0, 0]
+
+
+@pytest.mark.parametrize("teams", ["red", ["red"], ["red", 3], ["red", ""], {"red": 1, "blue": 2}])
+def test_reset_rejects_bad_teams(teams):
+    frames = []
+    tap_battle = battle(frames)
+    with pytest.raises(ValueError):
+        tap_battle.reset(teams)
+    assert tap_battle.teams == ["red", "blue"]
+    assert tap_battle.round == 1
+    assert not frames
+
+
+def test_taps_are_limited_per_connection():
+    async def run():
+        tap_battle = battle([])
+        bucket = new_tap_bucket()
+        assert tap_battle.tap(bucket, "t0*50") == 40  # The burst allowance
+        assert tap_battle.tap(bucket, "t1") == 0
+        assert tap_battle.deltas == [40, 0]
+        tap_battle.stop()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("message", ["t", "tx", "t9", "t-1", "t0*0", "t0*-3", "t0*abc"])
+def test_malformed_taps(message):
+    tap_battle = battle([])
+    bucket = new_tap_bucket()
+    assert tap_battle.tap(bucket, message) == MALFORMED_TAP
+    assert tap_battle.deltas == [0, 0]
+    # Malformed frames don't spend the tap budget
+    assert bucket.tokens == 40
+
+
+def test_over_budget_taps_are_not_malformed():
+    async def run():
+        tap_battle = battle([])
+        bucket = new_tap_bucket()
+        tap_battle.tap(bucket, "t1*50")
+        assert tap_battle.tap(bucket, "t1") == 0
+        assert tap_battle.dropped_count == 11
+        tap_battle.stop()
+
+    asyncio.run(run())
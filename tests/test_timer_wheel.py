@@ -0,0 +1,115 @@
+import asyncio
+import random
+
+from timer_wheel import SLOTS, TimerWheel
+
+
+class FakeLoop:
+    """Just enough of an event loop to drive a wheel on a virtual clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.scheduled = None
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback):
+        self.scheduled = (when, callback)
+        return self
+
+    def cancel(self):
+        self.scheduled = None
+
+
+def fake_wheel(tick=0.01):
+    wheel = TimerWheel(tick)
+    loop = wheel._loop = FakeLoop()
+    wheel._origin = 0.0
+    return wheel, loop
+
+
+def run_until_idle(wheel, loop, fired):
+    """Advance the clock to each scheduled tick and run it"""
+    while loop.scheduled is not None:
+        when, callback = loop.scheduled
+        loop.scheduled = None
+        loop.now = when + 1e-9  # Real loops run callbacks just after their time
+        callback()
+    return fired
+
+
+def test_timers_fire_in_order_across_levels():
+    wheel, loop = fake_wheel()
+    random.seed(3)
+    fired = []
+    # Up to ~3 * SLOTS**2 ticks out, so timers cascade down from level 2
+    delays = [random.uniform(0, 3 * SLOTS * SLOTS * wheel.tick) for _ in range(300)]
+    for delay in delays:
+        wheel.call_later(delay, lambda d=delay: fired.append((loop.now, d)))
+    run_until_idle(wheel, loop, fired)
+    assert [d for _, d in fired] == sorted(delays)
+    for fired_at, delay in fired:
+        # Never early, and at most one tick late
+        assert delay - 1e-9 <= fired_at <= delay + wheel.tick + 1e-9
+    assert wheel.pending == 0 and len(wheel) == 0
+    assert wheel.fired_count == len(delays)
+
+
+def test_cancel():
+    wheel, loop = fake_wheel()
+    fired = []
+    keep = wheel.call_later(0.05, fired.append, "keep")
+    drop = wheel.call_later(0.05, fired.append, "drop")
+    far = wheel.call_later(SLOTS * 0.5, fired.append, "far")
+    drop.cancel()
+    drop.cancel()  # Safe twice
+    far.cancel()
+    assert wheel.pending == 1
+    run_until_idle(wheel, loop, fired)
+    assert fired == ["keep"]
+    keep.cancel()  # Already fired: a no-op
+    assert wheel.pending == 0
+
+
+def test_callback_can_cancel_timer_in_same_slot():
+    wheel, loop = fake_wheel()
+    fired = []
+    handles = []
+    handles.append(wheel.call_later(0.05, lambda: (fired.append("first"), handles[1].cancel())))
+    handles.append(wheel.call_later(0.05, fired.append, "second"))
+    run_until_idle(wheel, loop, fired)
+    assert fired == ["first"]
+    assert wheel.pending == 0
+
+
+def test_callbacks_can_reschedule():
+    wheel, loop = fake_wheel()
+    fired = []
+
+    def again():
+        fired.append(loop.now)
+        if len(fired) < 3:
+            wheel.call_later(0.1, again)
+
+    wheel.call_later(0.1, again)
+    run_until_idle(wheel, loop, fired)
+    assert len(fired) == 3
+    assert fired[-1] >= 0.3 - 1e-9
+
+
+def test_sleep_and_stop():
+    async def run():
+        wheel = TimerWheel()
+        started = asyncio.get_running_loop().time()
+        await wheel.sleep(0.03)
+        assert asyncio.get_running_loop().time() - started >= 0.03 - 1e-6
+
+        # stop() wakes sleepers rather than leaving them waiting forever
+        sleeper = asyncio.ensure_future(wheel.sleep(3600))
+        await asyncio.sleep(0)
+        wheel.stop()
+        await asyncio.wait_for(sleeper, timeout=1.0)
+        assert wheel.pending == 0
+
+    asyncio.run(run())
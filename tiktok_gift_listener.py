@@ -13,16 +13,51 @@ Example usage:
 """
 
 import asyncio
+import hmac
 import json
 import logging
 import argparse
+import collections
+import os
 import signal
 import sys
+import time
 import websockets
-from typing import Set, Optional, Dict, Any
+from typing import Set, Optional, Dict, Any, List, Deque
 
 from TikTokLive import TikTokLiveClient
-from TikTokLive.events import CommentEvent, ConnectEvent, DisconnectEvent, GiftEvent
+from TikTokLive.events import (
+    CommentEvent, ConnectEvent, DisconnectEvent, FollowEvent, GiftEvent, LikeEvent, ShareEvent
+)
+
+from gift_events import GiftRecord, CommentRecord, RecordEncoder, EVENT_RECORDS, RECORD_TYPES, DEFAULT_EFFECT
+from gift_scheduler import GiftScheduler, classify_gift, load_gift_tiers
+from user_registry import UserRegistry, DEFAULT_CAPACITY as DEFAULT_USER_CACHE
+from admission import (
+    AdmissionController, ConnectionLimits, inbound_size_limit,
+    DEFAULT_MAX_CLIENTS, DEFAULT_MAX_CLIENTS_PER_IP, MAX_INBOUND_MESSAGE, MAX_INBOUND_QUEUE,
+    CLOSE_TRY_AGAIN_LATER, CLOSE_POLICY_VIOLATION
+)
+from shm_ring import SharedRingWriter, DEFAULT_SLOT_COUNT
+from sse_server import SSEBroadcaster
+from runtime_profiler import SamplingProfiler, HandlerTimings, DEFAULT_SAMPLE_INTERVAL
+from loop_monitor import LoopMonitor, DEFAULT_SLOW_CALLBACK
+from event_bus import EventBus, InProcessBus, BrokerBus, BusEvent
+from event_tracing import EventTracer, DEFAULT_SAMPLE_RATE as DEFAULT_TRACE_SAMPLE_RATE
+from event_archive import EventArchive, archive_available, DEFAULT_ROW_GROUP_SIZE as DEFAULT_ARCHIVE_ROW_GROUP
+from timer_wheel import TimerWheel
+from comment_triggers import CommentTriggers
+from offload import SnapshotEncoder, DEFAULT_INLINE_THRESHOLD as DEFAULT_OFFLOAD_THRESHOLD, POOL_KINDS
+from pipeline import Pipeline, RecentKeys, DEFAULT_QUEUE_SIZE as DEFAULT_PIPELINE_QUEUE_SIZE
+from social_events import SocialAggregator, DEFAULT_INTERVAL_MS as DEFAULT_SOCIAL_INTERVAL_MS
+from tap_battle import (
+    TapBattle, is_tap_message, new_tap_bucket, MALFORMED_TAP, DEFAULT_TEAMS as DEFAULT_TAP_TEAMS,
+    DEFAULT_TICK_MS as DEFAULT_TAP_TICK_MS
+)
+from checkpoint import StateCheckpointer, DEFAULT_INTERVAL as DEFAULT_CHECKPOINT_INTERVAL
+from handoff import (
+    HandoffListener, request_takeover, confirm_ready, HANDOFF_DRAIN_SECONDS, CLOSE_SERVICE_RESTART
+)
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +70,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger('TikTokLive')
 
+# Payload profiles - which fields each kind of client actually renders.
+# Each entry maps an event name to {top-level key: sub-keys to keep}; a value
+# of None keeps the key as-is and unlisted keys are dropped. Events without
+# an entry are sent unchanged, so they share one encoded frame across profiles.
+PAYLOAD_PROFILES: Dict[str, Dict[str, Dict[str, Optional[tuple]]]] = {
+    "desktop": {},
+    "mobile": {
+        "gift_received": {
+            "event": None,
+            "gift": ("name", "id", "repeat_count", "is_streaking"),
+            "user": ("username", "nickname"),
+            "effect": ("type", "intensity", "color", "particles"),
+            "tier": None,
+            "burst": None,
+            "timestamp": None,
+        },
+    },
+    "overlay": {
+        "gift_received": {
+            "event": None,
+            "gift": ("name", "repeat_count"),
+            "user": ("username",),
+            "effect": ("type", "intensity", "color"),
+            "tier": None,
+            "burst": ("merged",),
+            "timestamp": None,
+        },
+        "comment": {
+            "event": None,
+            "user": None,
+            "message": None,
+        },
+    },
+}
+DEFAULT_PAYLOAD_PROFILE = "desktop"
+
+# Clients with the "user_refs" capability get users by registry id; they are
+# grouped under "<profile>+refs" so each group still shares one frame
+USER_REFS_SUFFIX = "+refs"
+FRAME_GROUPS = tuple(PAYLOAD_PROFILES) + tuple(name + USER_REFS_SUFFIX for name in PAYLOAD_PROFILES)
+
+# clientType values from `connection:init` that imply a profile
+CLIENT_TYPE_PROFILES = {
+    "overlay": "overlay",
+    "obs": "overlay",
+    "mobile": "mobile",
+    "host": "desktop",
+    "viewer": "desktop",
+}
+
+# Events being sent to clients at once before the fan-out stage waits for one to finish
+MAX_FANOUTS_IN_FLIGHT = 256
+
+# Client snapshots: recent events replayed, and gifters ranked by coins
+SNAPSHOT_BACKLOG = 500
+SNAPSHOT_TOP_GIFTERS = 100
+
+
 class HyperfocusGiftEngine:
     async def initialize(self):
         """Initialize the TikTok client asynchronously"""
@@ -45,7 +138,23 @@ class HyperfocusGiftEngine:
             logger.error(f"Failed to initialize TikTok client: {e}")
             return False
             
-    def __init__(self, username: str, websocket_port: int = 8765, debug: bool = False):
+    def __init__(self, username: str, websocket_port: int = 8765, debug: bool = False,
+                 max_events_per_second: float = 30.0, shm_name: Optional[str] = None,
+                 shm_slots: int = DEFAULT_SLOT_COUNT, sse_port: Optional[int] = None,
+                 batch_interval_ms: float = 0, admin_token: Optional[str] = None,
+                 slow_callback_ms: float = DEFAULT_SLOW_CALLBACK * 1000,
+                 user_cache_size: int = DEFAULT_USER_CACHE, max_clients: int = DEFAULT_MAX_CLIENTS,
+                 max_clients_per_ip: int = DEFAULT_MAX_CLIENTS_PER_IP,
+                 handoff_socket: Optional[str] = None, bus_publish: Optional[str] = None,
+                 bus_subscribe: Optional[str] = None, trace_file: Optional[str] = None,
+                 trace_sample_rate: float = DEFAULT_TRACE_SAMPLE_RATE, archive_dir: Optional[str] = None,
+                 archive_row_group: int = DEFAULT_ARCHIVE_ROW_GROUP, idle_timeout: float = 0,
+                 tap_teams: tuple = DEFAULT_TAP_TEAMS, tap_tick_ms: float = DEFAULT_TAP_TICK_MS,
+                 comment_triggers: Optional[str] = None,
+                 social_interval_ms: float = DEFAULT_SOCIAL_INTERVAL_MS, like_goal: int = 0,
+                 pipeline_queue_size: int = DEFAULT_PIPELINE_QUEUE_SIZE, encode_pool: str = "thread",
+                 offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD, checkpoint_dir: Optional[str] = None,
+                 checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL):
         """
         Initialize the TikTok Live gift listener
         
@@ -53,6 +162,45 @@ class HyperfocusGiftEngine:
             username: TikTok username to monitor (without @)
             websocket_port: Port for WebSocket server
             debug: Enable debug logging
+            max_events_per_second: Gift output rate before low tiers are merged
+            shm_name: Also publish events to a shared-memory ring with this name
+            shm_slots: Number of events the shared-memory ring keeps
+            sse_port: Also serve events over Server-Sent Events on this port
+            batch_interval_ms: Collect outbound events for this long and send each
+                client one array frame per tick (0 disables batching)
+            admin_token: Shared secret for admin commands (None disables them)
+            slow_callback_ms: Loop callbacks running this long are reported as
+                offenders (0 disables callback timing)
+            user_cache_size: Users kept in the per-stream identity cache
+            max_clients: WebSocket connections accepted in total
+            max_clients_per_ip: WebSocket connections accepted from one address
+            handoff_socket: Unix socket path a successor engine connects to for
+                a zero-downtime restart (None disables handoff)
+            bus_publish: Event broker address to publish encoded events to, so
+                edge nodes can serve this stream's clients too
+            bus_subscribe: Run as an edge node: serve events from this event
+                broker address instead of connecting to TikTok
+            trace_file: Write sampled per-event traces (OTLP/JSON lines) here
+            trace_sample_rate: Fraction of gifts and comments traced
+            archive_dir: Archive received gifts and comments as Parquet files
+                under this directory (needs pyarrow)
+            archive_row_group: Rows per Parquet row group in the archive
+            idle_timeout: Close WebSocket clients that send nothing for this
+                many seconds (0 disables)
+            tap_teams: TapBattle team names
+            tap_tick_ms: How often TapBattle score changes are sent to clients
+            comment_triggers: Trigger file mapping comment keywords to effects and
+                counters (see comment_triggers.py); call triggers.load() before start()
+            social_interval_ms: How often like/follow/share/viewer summaries are sent
+            like_goal: Like total that summaries report progress towards (0 disables)
+            pipeline_queue_size: Capacity of each event pipeline stage's queue
+            encode_pool: Worker pool for large snapshot encodes ("process" or "thread")
+            offload_threshold: Snapshot size (events + ranked users) from which
+                encoding moves off the event loop
+            checkpoint_dir: Checkpoint engine state (plus a write-ahead log) here
+                so a restart picks up where a crash left off; call
+                recover_checkpoint() before start() (None disables)
+            checkpoint_interval: Seconds between full checkpoints
         """
         if debug:
             logger.setLevel(logging.DEBUG)
@@ -61,10 +209,108 @@ class HyperfocusGiftEngine:
         self.username = username.lower().lstrip('@')
         self.websocket_port = websocket_port
         self.connected_clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.profile_clients: Dict[str, Set[websockets.WebSocketServerProtocol]] = {
+            group: set() for group in FRAME_GROUPS
+        }
+        self.client_profiles: Dict[websockets.WebSocketServerProtocol, str] = {}
+        self.user_registry = UserRegistry(user_cache_size)
+        self.client_known_users: Dict[websockets.WebSocketServerProtocol, Set[int]] = {}
+        self.admission = AdmissionController(max_clients, max_clients_per_ip)
+        # Every engine timeout (batch ticks, idle clients, backoff, flushes) runs on one wheel
+        self.timers = TimerWheel()
+        self.idle_timeout = idle_timeout
+        self.idle_timers: Dict[websockets.WebSocketServerProtocol, Any] = {}
         self.should_reconnect = True
         self.reconnect_attempts = 0
         self.max_reconnect_attempts = 5
         self.client = None
+        self.admin_token = admin_token
+        self.profiler = SamplingProfiler()
+        self.timings = HandlerTimings()
+        self.loop_monitor = LoopMonitor(slow_callback=slow_callback_ms / 1000.0)
+        # on_gift/on_comment only queue events; their work is timed per pipeline stage instead
+        self.broadcast_to_clients = self.timings.wrap("broadcast_to_clients", self.broadcast_to_clients)
+        self.admin_commands = {
+            "profile:start": self._admin_profile_start,
+            "profile:stop": self._admin_profile_stop,
+            "profile:status": self._admin_profile_status,
+            "timings:reset": self._admin_timings_reset,
+            "loop:report": self._admin_loop_report,
+            "loop:reset": self._admin_loop_reset,
+            "bus:status": self._admin_bus_status,
+            "archive:status": self._admin_archive_status,
+            "timers:status": self._admin_timers_status,
+            "tapbattle:status": self._admin_tapbattle_status,
+            "tapbattle:reset": self._admin_tapbattle_reset,
+            "triggers:status": self._admin_triggers_status,
+            "triggers:reload": self._admin_triggers_reload,
+            "triggers:reset": self._admin_triggers_reset,
+            "social:status": self._admin_social_status,
+            "pipeline:status": self._admin_pipeline_status,
+            "offload:status": self._admin_offload_status,
+            "checkpoint:status": self._admin_checkpoint_status,
+        }
+        self.scheduler = GiftScheduler(
+            self._release_gift,
+            max_events_per_second=max_events_per_second,
+            timers=self.timers,
+            finish_trace=self._finish_trace
+        )
+        self.shm_name = shm_name
+        self.shm_slots = shm_slots
+        self.shm_ring: Optional[SharedRingWriter] = None
+        self.sse_port = sse_port
+        self.sse: Optional[SSEBroadcaster] = None
+        if sse_port is not None:
+            self.sse = SSEBroadcaster(tuple(PAYLOAD_PROFILES), DEFAULT_PAYLOAD_PROFILE, timers=self.timers)
+        self.event_seq = 0
+        self._encoders: Dict[tuple, RecordEncoder] = {}
+        self.batch_interval = batch_interval_ms / 1000.0
+        self.pending_frames: Dict[str, List[str]] = {}
+        self.pending_users: Dict[int, Any] = {}
+        self._batch_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.handoff_socket = handoff_socket
+        self.handoff: Optional[HandoffListener] = None
+        self.handoff_conn = None
+        self.inherited_sockets: Dict[str, Any] = {}
+        self.taken_over = False
+        self.handed_off = False
+        self.ws_server = None
+        self.edge_node = bus_subscribe is not None
+        if bus_subscribe is not None:
+            self.bus: EventBus = BrokerBus(bus_subscribe, role="subscribe", timers=self.timers)
+        elif bus_publish is not None:
+            self.bus = BrokerBus(bus_publish, role="publish", timers=self.timers)
+        else:
+            self.bus = InProcessBus()
+        # Local fan-out is a bus subscriber like any edge node
+        self.bus.subscribe(self._queue_delivery)
+        self.recent_events = RecentKeys()
+        self._fanout_tasks: Set[asyncio.Task] = set()
+        self.pipeline = self._build_pipeline(pipeline_queue_size)
+        # Snapshot state; state_version changes whenever backlog or gifter totals do
+        self.backlog: Deque[Any] = collections.deque(maxlen=SNAPSHOT_BACKLOG)
+        self.gifter_coins: Dict[str, int] = {}
+        self.state_version = 0
+        self.snapshot_encoder = SnapshotEncoder(encode_pool, inline_threshold=offload_threshold)
+        self.tracer: Optional[EventTracer] = None
+        if trace_file:
+            self.tracer = EventTracer(trace_file, trace_sample_rate, timers=self.timers)
+        self.pending_traces: List[Any] = []
+        self.archive: Optional[EventArchive] = None
+        if archive_dir:
+            self.archive = EventArchive(archive_dir, self.username, row_group_size=archive_row_group,
+                                        timers=self.timers)
+        self.tap_battle = TapBattle(self._send_tap_frame, tap_teams, tap_tick_ms, timers=self.timers)
+        self.social = SocialAggregator(self._send_social_summary, social_interval_ms, like_goal,
+                                       timers=self.timers)
+        self.triggers: Optional[CommentTriggers] = None
+        if comment_triggers:
+            self.triggers = CommentTriggers(comment_triggers, timers=self.timers)
+        self.checkpointer: Optional[StateCheckpointer] = None
+        if checkpoint_dir:
+            self.checkpointer = StateCheckpointer(checkpoint_dir, checkpoint_interval, timers=self.timers)
             
     async def _initialize_tiktok_client(self):
         """Initialize the TikTok client with proper error handling"""
@@ -109,6 +355,10 @@ class HyperfocusGiftEngine:
         client.add_listener("connect", self.on_connect)
         client.add_listener("gift", self.on_gift)
         client.add_listener("comment", self.on_comment)
+        client.add_listener("like", self.on_like)
+        client.add_listener("follow", self.on_follow)
+        client.add_listener("share", self.on_share)
+        client.add_listener("viewer_update", self.on_viewer_update)
         client.add_listener("disconnect", self.on_disconnect)
         client.add_listener("error", self.on_error)
 
@@ -153,72 +403,463 @@ class HyperfocusGiftEngine:
 
     async def on_connect(self, event: ConnectEvent):
         logger.info(f"Connected to @{self.username}'s live stream!")
-        await self.broadcast_to_clients({
+        self.pipeline.submit({
             "event": "stream_connected",
             "user": self.username,
             "timestamp": event.timestamp
-        })
+        }, "encode")
+
+    async def on_disconnect(self, event: DisconnectEvent):
+        logger.warning(f"Disconnected from @{self.username}'s live stream")
+        self.pipeline.submit({
+            "event": "stream_disconnected",
+            "user": self.username,
+            "timestamp": getattr(event, 'timestamp', None)
+        }, "encode")
 
     async def on_gift(self, event: GiftEvent):
-        gift_name = event.gift.name
-        user = event.user.unique_id
-        repeat_count = getattr(event, 'repeat_count', 1)
-
-        # Get effect configuration
-        effect_config = self.gift_effects.get(gift_name, {
-            "type": "default_sparkle",
-            "intensity": 1,
-            "color": "#FFFFFF",
-            "particles": 100,
-            "sound": "gentle_ping"
-        })
-
-        gift_data = {
-            "event": "gift_received",
-            "gift": {
-                "name": gift_name,
-                "id": event.gift.id,
-                "repeat_count": repeat_count,
-                "is_streaking": getattr(event, 'streaking', False)
-            },
-            "user": {
-                "username": user,
-                "nickname": event.user.nickname
-            },
-            "effect": effect_config,
-            "timestamp": event.timestamp
-        }
+        # Only queue the event; TikTok's dispatch never waits on the pipeline or on clients
+        trace = self.tracer.start("gift_received", event.timestamp) if self.tracer is not None else None
+        if not self.pipeline.submit(("gift", event, trace)) and trace is not None:
+            self._finish_trace(trace, "dropped")
 
-        logger.info(f"🎁 {user} sent {repeat_count}x {gift_name}!")
+    async def on_comment(self, event: CommentEvent):
+        trace = self.tracer.start("comment", event.timestamp) if self.tracer is not None else None
+        if not self.pipeline.submit(("comment", event, trace)) and trace is not None:
+            self._finish_trace(trace, "dropped")
 
-        # Broadcast to all connected WebSocket clients
-        await self.broadcast_to_clients(gift_data)
+    def _finish_trace(self, trace, outcome: Optional[str] = None):
+        """End a sampled event's trace; `outcome` says what became of the event"""
+        if outcome is not None:
+            trace.attributes["outcome"] = outcome
+        if self.tracer is not None:
+            self.tracer.finish(trace)
 
-    async def on_comment(self, event: CommentEvent):
-        # Optional: Handle chat messages for additional interactions
-        comment_data = {
-            "event": "comment",
-            "user": event.user.unique_id,
-            "message": event.comment,
-            "timestamp": event.timestamp
-        }
-        await self.broadcast_to_clients(comment_data)
+    def _build_pipeline(self, queue_size: int) -> Pipeline:
+        """ingest -> dedup -> enrich -> aggregate -> encode -> fanout (see pipeline.py)"""
+        pipeline = Pipeline(queue_size)
+        pipeline.add_stage("ingest", self._ingest_stage)
+        pipeline.add_stage("dedup", self._dedup_stage)
+        pipeline.add_stage("enrich", self._enrich_stage)
+        pipeline.add_stage("aggregate", self._aggregate_stage)
+        pipeline.add_stage("encode", self.broadcast_to_clients)  # Publishes to the bus
+        pipeline.add_stage("fanout", self.deliver_event)  # Fed by the bus subscriber
+        return pipeline
 
-    async def broadcast_to_clients(self, data: Dict[str, Any]):
-        """Broadcast data to all connected WebSocket clients"""
-        if not self.connected_clients:
+    def _ingest_stage(self, item):
+        """Key each TikTok event for the dedup stage"""
+        kind, event, trace = item
+        common = getattr(event, 'common', None)
+        key = getattr(common, 'msg_id', None) if common is not None else None
+        if not key:
+            # No message id: fall back to what TikTok repeats verbatim on a redelivery
+            timestamp = getattr(event, 'timestamp', None)
+            if timestamp:
+                if kind == "gift":
+                    # A streak's last update can repeat the count of the one before it
+                    key = (kind, event.user.unique_id, event.gift.id, getattr(event, 'repeat_count', 1),
+                           getattr(event, 'streaking', False), timestamp)
+                else:
+                    key = (kind, event.user.unique_id, event.comment, timestamp)
+        return kind, event, trace, key
+
+    def _dedup_stage(self, item):
+        """Drop events TikTok delivered twice"""
+        key = item[3]
+        if key is not None and self.recent_events.seen(key):
+            if item[2] is not None:
+                self._finish_trace(item[2], "duplicate")
+            return None
+        return item
+
+    def _enrich_stage(self, item):
+        """Build the record: effect, price tier, user profile; archive it"""
+        kind, event, trace, _ = item
+        if kind == "gift":
+            gift_name = event.gift.name
+            user = event.user.unique_id
+            repeat_count = getattr(event, 'repeat_count', 1)
+
+            # Get effect configuration (shared, never copied per event)
+            effect_config = self.gift_effects.get(gift_name, DEFAULT_EFFECT)
+
+            tier = classify_gift(gift_name, getattr(event.gift, 'diamond_count', None))
+
+            record = GiftRecord(
+                gift_name=gift_name,
+                gift_id=event.gift.id,
+                repeat_count=repeat_count,
+                is_streaking=getattr(event, 'streaking', False),
+                username=user,
+                nickname=event.user.nickname,
+                effect=effect_config,
+                tier=tier,
+                timestamp=event.timestamp,
+                diamond_count=getattr(event.gift, 'diamond_count', None)
+            )
+            record.user_ref = self.user_registry.lookup(user, event.user.nickname)
+            if trace is not None:
+                record.trace = trace
+                trace.attributes.update(gift=gift_name, tier=tier, user=user)
+                trace.mark("enqueue")
+
+            logger.info(f"🎁 {user} sent {repeat_count}x {gift_name}!")
+
+            # A streak repeats the gift with a growing count; its last event has the total
+            if not record.is_streaking and record.diamond_count:
+                coins = record.diamond_count * repeat_count
+                self.gifter_coins[user] = self.gifter_coins.get(user, 0) + coins
+                self.state_version += 1
+                if self.checkpointer is not None:
+                    self.checkpointer.log(("coins", user, coins))
+        else:
+            record = CommentRecord(
+                username=event.user.unique_id,
+                message=event.comment,
+                timestamp=event.timestamp
+            )
+            record.user_ref = self.user_registry.lookup(event.user.unique_id, event.user.nickname)
+            if trace is not None:
+                record.trace = trace
+                trace.attributes["user"] = record.username
+                trace.mark("enqueue")
+
+        # Archive what TikTok sent, before the scheduler merges anything
+        if self.archive is not None:
+            self.archive.add(record)
+        return record
+
+    async def _aggregate_stage(self, record):
+        """Gifts go to the tier scheduler; comments are matched against triggers"""
+        if isinstance(record, GiftRecord):
+            # The scheduler releases highest tiers first, into the encode stage
+            self.scheduler.submit(record, record.tier)
+            return None
+
+        # One pass over the comment matches every configured trigger
+        fired = self.triggers.match(record.message) if self.triggers is not None else ()
+        if not fired:
+            return record
+        await self.pipeline.feed("encode", record)
+        for trigger in fired:
+            await self.pipeline.feed("encode", {
+                "event": "comment_trigger",
+                "user": record.username,
+                **trigger,
+                "timestamp": record.timestamp
+            })
+        return None
+
+    async def _release_gift(self, record: GiftRecord):
+        await self.pipeline.feed("encode", record)
+
+    async def _queue_delivery(self, event: BusEvent):
+        await self.pipeline.feed("fanout", event)
+
+    # Likes, follows, shares and viewer counts only bump counters; the aggregator
+    # sends one summary per interval (see social_events.py)
+    async def on_like(self, event: LikeEvent):
+        # TikTokLive 5 names these likes/total_likes, later versions count/total
+        count = getattr(event, 'count', None) or getattr(event, 'likes', 1)
+        total = getattr(event, 'total', None) or getattr(event, 'total_likes', None)
+        self.social.add_likes(count, total)
+
+    async def on_follow(self, event: FollowEvent):
+        self.social.add_follow(event.user.unique_id)
+
+    async def on_share(self, event: ShareEvent):
+        self.social.add_share()
+
+    async def on_viewer_update(self, event):
+        viewers = getattr(event, 'viewer_count', None) or getattr(event, 'total', None)
+        if viewers is not None:
+            self.social.set_viewers(viewers)
+
+    def _send_social_summary(self, summary: Dict[str, Any]):
+        if self.checkpointer is not None:
+            self.checkpointer.log(("social", self.social.snapshot()))
+        task = asyncio.create_task(self.pipeline.feed("encode", summary))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _project_payload(self, data: Dict[str, Any], spec: Dict[str, Optional[tuple]]) -> Dict[str, Any]:
+        """Reduce an event dict to the fields listed in a profile spec"""
+        projected = {}
+        for key, fields in spec.items():
+            if key not in data:
+                continue
+            value = data[key]
+            if fields is not None and isinstance(value, dict):
+                value = {field: value[field] for field in fields if field in value}
+            projected[key] = value
+        return projected
+
+    def _record_encoder(self, record_cls, profile: Optional[str], user_refs: bool = False) -> RecordEncoder:
+        """Compiled encoder for a record type and profile (None = full payload)"""
+        key = (record_cls, profile, user_refs)
+        encoder = self._encoders.get(key)
+        if encoder is None:
+            spec = PAYLOAD_PROFILES[profile].get(record_cls.event) if profile else None
+            encoder = self._encoders[key] = RecordEncoder(record_cls, spec, user_refs=user_refs)
+        return encoder
+
+    def encode_for_profiles(self, data, include: tuple = ()) -> Dict[str, str]:
+        """
+        Encode an event once per payload profile that currently has clients
+        
+        Profiles that have no projection for this event share the full frame.
+        Profiles listed in `include` are encoded even without clients.
+        """
+        frames: Dict[str, str] = {}
+        encoded: Dict[tuple, str] = {}
+        is_record = isinstance(data, EVENT_RECORDS)
+        event_name = data.event if is_record else data.get("event")
+        for group, clients in self.profile_clients.items():
+            if not clients and group not in include:
+                continue
+            profile, refs, _ = group.partition(USER_REFS_SUFFIX)
+            user_refs = bool(refs) and is_record and data.user_ref is not None
+            spec = PAYLOAD_PROFILES[profile].get(event_name)
+            # Groups without a projection for this event share the full frame
+            key = (profile if spec is not None else None, user_refs)
+            message = encoded.get(key)
+            if message is None:
+                if is_record:
+                    message = self._record_encoder(type(data), key[0], user_refs).encode(data)
+                elif spec is None:
+                    message = json.dumps(data, default=str)  # Handle non-serializable data
+                else:
+                    message = json.dumps(self._project_payload(data, spec), default=str)
+                encoded[key] = message
+            frames[group] = message
+        return frames
+
+    def set_client_profile(self, websocket, profile: str, user_refs: bool = False):
+        """Move a client into a payload profile"""
+        previous = self.client_profiles.get(websocket)
+        if previous is not None:
+            self.profile_clients[previous].discard(websocket)
+        group = profile + USER_REFS_SUFFIX if user_refs else profile
+        self.client_profiles[websocket] = group
+        self.profile_clients[group].add(websocket)
+        if user_refs:
+            self.client_known_users.setdefault(websocket, set())
+        else:
+            self.client_known_users.pop(websocket, None)
+
+    def _remove_client(self, websocket):
+        """Forget a client and its payload profile"""
+        self.connected_clients.discard(websocket)
+        self.client_known_users.pop(websocket, None)
+        idle_timer = self.idle_timers.pop(websocket, None)
+        if idle_timer is not None:
+            idle_timer.cancel()
+        group = self.client_profiles.pop(websocket, None)
+        if group is not None:
+            self.profile_clients[group].discard(websocket)
+
+    def _resolve_profile(self, payload: Dict[str, Any]) -> str:
+        """Pick a payload profile from a `connection:init` payload"""
+        requested = payload.get("profile")
+        if requested in PAYLOAD_PROFILES:
+            return requested
+        capabilities = payload.get("capabilities") or []
+        if "minimal" in capabilities:
+            return "overlay"
+        client_type = str(payload.get("clientType", "")).lower()
+        return CLIENT_TYPE_PROFILES.get(client_type, DEFAULT_PAYLOAD_PROFILE)
+
+    async def broadcast_to_clients(self, data):
+        """Encode an event and publish it to the bus (and so to all clients)"""
+        self.event_seq += 1
+        is_record = isinstance(data, EVENT_RECORDS)
+        if is_record:
+            self.backlog.append(data)
+            self.state_version += 1
+        if self.checkpointer is not None:
+            # Flat fields, not a payload dict: this runs for every event
+            if is_record:
+                self.checkpointer.log(("event", self.event_seq, data.event, data.fields()))
+            else:
+                self.checkpointer.log(("event", self.event_seq))
+        trace = data.trace if is_record else None
+        if trace is not None:
+            trace.mark("dequeue")
+            trace.attributes["seq"] = self.event_seq
+            if getattr(data, "burst", None):
+                trace.attributes["merged"] = data.burst["merged"]
+        remote = self.bus.remote
+        if not remote and not self.connected_clients and self.shm_ring is None and self.sse is None:
+            if trace is not None:
+                self._finish_trace(trace, "no_clients")
             return
             
-        message = json.dumps(data, default=str)  # Handle non-serializable data
+        # Encode once per profile; every client in a profile shares the frame
+        include = ()
+        if remote:
+            include = FRAME_GROUPS  # Edge nodes may have clients in any group
+        elif self.sse is not None:
+            include = self.sse.active_profiles()
+        elif self.shm_ring is not None:
+            include = (DEFAULT_PAYLOAD_PROFILE,)
+        if trace is not None:
+            trace.mark("encode")
+        frames = self.encode_for_profiles(data, include=include)
+        if trace is not None:
+            trace.mark("encoded")
+        
+        user_ref = data.user_ref if is_record else None
+        await self.bus.publish(BusEvent(
+            self.event_seq,
+            frames,
+            (user_ref,) if user_ref is not None else (),
+            isinstance(data, GiftRecord),
+            trace
+        ))
+
+    def _snapshot_version(self) -> tuple:
+        return (self.state_version, self.tap_battle.round, self.tap_battle.ticks_sent,
+                self.social.summaries_sent, self.triggers.comments_matched if self.triggers is not None else 0)
+
+    def _build_snapshot(self):
+        """Snapshot payload plus the gifter table to rank (copies, safe to hand to a worker)"""
+        payload = {
+            "event": "snapshot",
+            "data": {
+                "event_seq": self.event_seq,
+                "recent": self._backlog_dicts(),
+                "tap_battle": self.tap_battle.snapshot(),
+                "social": self.social.summary()["data"],
+                "trigger_counters": dict(self.triggers.counters) if self.triggers is not None else {}
+            }
+        }
+        return payload, {"top_gifters": dict(self.gifter_coins)}
+
+    def _backlog_dicts(self) -> List[Dict[str, Any]]:
+        # Events restored from a checkpoint (not its WAL) are kept as dicts
+        return [record.to_dict() if isinstance(record, EVENT_RECORDS) else record for record in self.backlog]
+
+    async def snapshot_frame(self) -> str:
+        """Everything a client needs to draw the current state, encoded once per state version"""
+        return await self.snapshot_encoder.encode(
+            "snapshot",
+            self._snapshot_version(),
+            len(self.backlog) + len(self.gifter_coins),
+            self._build_snapshot,
+            top_n=SNAPSHOT_TOP_GIFTERS
+        )
+
+    async def deliver_event(self, event: BusEvent):
+        """Send an encoded event to this node's shared-memory, SSE and WebSocket clients"""
+        # Edge nodes take the ingest node's numbering, so ids match on every node
+        self.event_seq = max(self.event_seq, event.seq)
+        frames = event.frames
+        if self.shm_ring is not None:
+            # Same-host consumers read the full frame straight from shared memory
+            self.shm_ring.write(frames[DEFAULT_PAYLOAD_PROFILE].encode('utf-8'))
+        if self.sse is not None:
+            self.sse.publish(event.seq, frames)
+        
+        if self.batch_interval:
+            if event.is_gift and self._batch_handle is None:
+                # Queue is idle - send the gift now and batch whatever follows it
+                self._arm_batch_tick()
+            else:
+                self._queue_frames(frames, event.users, event.trace)
+                return
         
+        # Sends run as their own task so one slow client never stalls the fan-out stage
+        task = asyncio.create_task(
+            self._send_frames(frames, event.users, (event.trace,) if event.trace is not None else ())
+        )
+        self._fanout_tasks.add(task)
+        task.add_done_callback(self._fanout_tasks.discard)
+        if len(self._fanout_tasks) >= MAX_FANOUTS_IN_FLIGHT:
+            # Clients are falling behind: hold the pipeline (not TikTok) until a send finishes
+            await asyncio.wait(self._fanout_tasks, return_when=asyncio.FIRST_COMPLETED)
+
+    def _arm_batch_tick(self):
+        self._batch_handle = self.timers.call_later(self.batch_interval, self._on_batch_tick)
+
+    def _queue_frames(self, frames: Dict[str, str], users: tuple = (), trace=None):
+        """Hold encoded frames until the end of the current batch tick"""
+        for profile, message in frames.items():
+            self.pending_frames.setdefault(profile, []).append(message)
+        for user in users:
+            self.pending_users[user.user_id] = user
+        if trace is not None:
+            trace.mark("batched")
+            self.pending_traces.append(trace)
+        if self._batch_handle is None:
+            self._arm_batch_tick()
+
+    def _on_batch_tick(self):
+        """Send everything collected during the tick as one frame per client"""
+        self._batch_handle = None
+        if not self.pending_frames:
+            return  # Idle again; the next gift goes out immediately
+        
+        batch: Dict[str, str] = {}
+        for profile, messages in self.pending_frames.items():
+            # Frames are already JSON, so the array is built without re-encoding
+            batch[profile] = messages[0] if len(messages) == 1 else "[" + ",".join(messages) + "]"
+        self.pending_frames = {}
+        users = tuple(self.pending_users.values())
+        self.pending_users = {}
+        traces = tuple(self.pending_traces)
+        self.pending_traces = []
+        
+        task = asyncio.create_task(self._send_frames(batch, users, traces))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        self._arm_batch_tick()
+
+    async def _send_in_order(self, client, messages: List[str]):
+        for message in messages:
+            await client.send(message)
+
+    async def _traced_send(self, client, group: str, send, traces: tuple):
+        start = time.time_ns()
+        error = None
+        try:
+            await send
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            end = time.time_ns()
+            address = getattr(client, 'remote_address', None)
+            label = f"{group} {address[0]}:{address[1]}" if address else group
+            for trace in traces:
+                trace.client_write(label, start, end, error)
+
+    async def _send_frames(self, frames: Dict[str, str], users: tuple = (), traces: tuple = ()):
+        """Send each profile's frame to that profile's clients"""
         # Create tasks for sending to all clients
         send_tasks = []
-        for client in list(self.connected_clients):  # Create a copy of the set
-            try:
-                send_tasks.append(asyncio.create_task(client.send(message)))
-            except Exception as e:
-                logger.error(f"Error queueing message for client: {e}")
-                self.connected_clients.discard(client)
+        for group, message in frames.items():
+            check_users = users and group.endswith(USER_REFS_SUFFIX)
+            for client in list(self.profile_clients.get(group, ())):  # Create a copy of the set
+                try:
+                    send = None
+                    if check_users:
+                        # Profiles this connection hasn't seen yet go out just before the event
+                        known = self.client_known_users[client]
+                        missing = [user.frame for user in users if user.user_id not in known]
+                        if missing:
+                            if len(known) >= self.user_registry.capacity:
+                                known.clear()
+                            known.update(user.user_id for user in users)
+                            missing.append(message)
+                            send = self._send_in_order(client, missing)
+                    if send is None:
+                        send = client.send(message)
+                    if traces:
+                        send = self._traced_send(client, group, send, traces)
+                    send_tasks.append(asyncio.create_task(send))
+                except Exception as e:
+                    logger.error(f"Error queueing message for client: {e}")
+                    self._remove_client(client)
         
         # Wait for all sends to complete (with timeout)
         if send_tasks:
@@ -238,20 +879,183 @@ class HyperfocusGiftEngine:
                     await task  # This will re-raise any exceptions
                 except Exception as e:
                     logger.error(f"Error sending message: {e}")
+        
+        for trace in traces:
+            self._finish_trace(trace, "delivered")
                     
     async def on_error(self, error: Exception):
         """Handle errors from the TikTok client"""
         logger.error(f"TikTok client error: {error}", exc_info=True)
-        await self.broadcast_to_clients({
+        self.pipeline.submit({
             "event": "error",
             "error": str(error),
             "type": error.__class__.__name__
-        })
+        }, "encode")
 
-    async def websocket_handler(self, websocket, path):
-        """Handle WebSocket connections"""
-        self.connected_clients.add(websocket)
+    def _is_admin(self, data: Dict[str, Any]) -> bool:
+        """Check an admin message's token against the configured secret"""
+        token = data.get("token")
+        if not self.admin_token or not isinstance(token, str):
+            return False
+        return hmac.compare_digest(token.encode('utf-8'), self.admin_token.encode('utf-8'))
+
+    async def _handle_admin(self, websocket, data: Dict[str, Any], client_ip: str):
+        """Run an authenticated admin command and reply with its result"""
+        command = data.get("command")
+        if not self._is_admin(data):
+            logger.warning(f"Rejected admin command {command!r} from {client_ip}")
+            result = {"ok": False, "error": "unauthorized"}
+        elif command not in self.admin_commands:
+            result = {"ok": False, "error": f"unknown command {command!r}"}
+        else:
+            logger.info(f"Admin command {command!r} from {client_ip}")
+            try:
+                output = self.admin_commands[command](data.get("args") or {})
+                if asyncio.iscoroutine(output):
+                    output = await output
+                result = {"ok": True, **output}
+            except Exception as e:
+                logger.error(f"Admin command {command!r} failed: {e}")
+                result = {"ok": False, "error": str(e)}
+        await websocket.send(json.dumps({
+            "event": "admin_result",
+            "data": {"command": command, **result}
+        }, default=str))
+
+    def _admin_profile_start(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        interval_ms = float(args.get("interval_ms", DEFAULT_SAMPLE_INTERVAL * 1000))
+        self.profiler.start(interval=max(interval_ms, 0.5) / 1000.0)
+        self.timings.reset()
+        self.timings.enabled = True
+        return {"profiling": True, "interval_ms": self.profiler.interval * 1000}
+
+    def _admin_profile_stop(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        path = self.profiler.stop()
+        self.timings.enabled = False
+        return {
+            "profiling": False,
+            "output": path,
+            "samples": self.profiler.sample_count,
+            "top": self.profiler.top(),
+            "timings": self.timings.report(),
+            "stages": self.pipeline.stats()["stages"]
+        }
+
+    def _admin_profile_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "profiling": self.profiler.running,
+            "samples": self.profiler.sample_count,
+            "top": self.profiler.top(),
+            "timings": self.timings.report(),
+            "stages": self.pipeline.stats()["stages"]
+        }
+
+    def _admin_timings_reset(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        self.timings.reset()
+        return {"timings": {}}
+
+    def _admin_timers_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(self.timers.stats(), idle_clients_tracked=len(self.idle_timers))
+
+    def _admin_tapbattle_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return self.tap_battle.stats()
+
+    def _admin_tapbattle_reset(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        self.tap_battle.reset(args.get("teams"))
+        return self.tap_battle.stats()
+
+    def _admin_triggers_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        if self.triggers is None:
+            return {"enabled": False}
+        return dict(self.triggers.stats(), enabled=True)
+
+    async def _admin_triggers_reload(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        if self.triggers is None:
+            raise ValueError("no trigger file configured (--comment-triggers)")
+        await self.triggers.reload()
+        return dict(self.triggers.stats(), enabled=True)
+
+    def _admin_triggers_reset(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        if self.triggers is None:
+            raise ValueError("no trigger file configured (--comment-triggers)")
+        self.triggers.reset_counters()
+        return dict(self.triggers.stats(), enabled=True)
+
+    def _admin_social_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return self.social.stats()
+
+    def _admin_pipeline_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(
+            self.pipeline.stats(),
+            duplicates=self.recent_events.hits,
+            fanouts_in_flight=len(self._fanout_tasks),
+            scheduler=self.scheduler.stats()
+        )
+
+    def _admin_offload_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(self.snapshot_encoder.stats(), ranked_gifters=len(self.gifter_coins))
+
+    def _admin_checkpoint_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        if self.checkpointer is None:
+            return {"enabled": False}
+        return dict(self.checkpointer.stats(), enabled=True)
+
+    def _admin_loop_report(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return self.loop_monitor.report()
+
+    def _admin_loop_reset(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        self.loop_monitor.reset()
+        return self.loop_monitor.report()
+
+    def _admin_bus_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(self.bus.stats(), event_seq=self.event_seq)
+
+    def _admin_archive_status(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        if self.archive is None:
+            return {"enabled": False}
+        return dict(self.archive.stats(), enabled=True)
+
+    def _touch_client(self, websocket):
+        """Restart a client's idle timeout (O(1) on the timer wheel)"""
+        if not self.idle_timeout:
+            return
+        idle_timer = self.idle_timers.get(websocket)
+        if idle_timer is not None:
+            idle_timer.cancel()
+        self.idle_timers[websocket] = self.timers.call_later(self.idle_timeout, self._close_idle_client, websocket)
+
+    def _close_idle_client(self, websocket):
+        self.idle_timers.pop(websocket, None)
+        logger.info(f"Closing WebSocket client idle for {self.idle_timeout:g}s")
+        task = asyncio.create_task(websocket.close(code=1000, reason="idle timeout"))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _send_tap_frame(self, frame: str):
+        """Send a TapBattle score frame to every WebSocket client"""
+        if self.checkpointer is not None:
+            self.checkpointer.log(("tap", self.tap_battle.snapshot()))
+        if not self.connected_clients:
+            return
+        # Tap frames are the same for every profile
+        task = asyncio.create_task(self._send_frames(dict.fromkeys(FRAME_GROUPS, frame)))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def websocket_handler(self, websocket, path: Optional[str] = None):
+        """Handle WebSocket connections (websockets < 13 also passes the request path)"""
         client_ip = websocket.remote_address[0] if websocket.remote_address else 'unknown'
+        admitted, reason = self.admission.admit(client_ip)
+        if not admitted:
+            logger.warning(f"Rejected WebSocket connection from {client_ip}: {reason}")
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=reason)
+            return
+        
+        self.connected_clients.add(websocket)
+        self.set_client_profile(websocket, DEFAULT_PAYLOAD_PROFILE)
+        limits = ConnectionLimits()
+        tap_bucket = None
+        self._touch_client(websocket)
         logger.info(f"New WebSocket connection from {client_ip}. Total clients: {len(self.connected_clients)}")
         
         try:
@@ -268,10 +1072,52 @@ class HyperfocusGiftEngine:
             
             # Keep the connection alive
             async for message in websocket:
+                self._touch_client(websocket)
+                if is_tap_message(message):
+                    # Taps are counted straight away: no JSON, no logging, their own rate limit
+                    if tap_bucket is None:
+                        tap_bucket = new_tap_bucket()
+                    if self.tap_battle.tap(tap_bucket, message) != MALFORMED_TAP:
+                        continue
+                    limits.malformed()
+                    if limits.exceeded:
+                        logger.warning(f"Closing {client_ip}: too many malformed tap frames")
+                        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="rate limit exceeded")
+                        break
+                    continue
+                # Charged and size-checked before parsing, so junk costs no more than a bucket check
+                if limits.allow_frame(len(message)):
+                    try:
+                        data = json.loads(message)
+                    except (ValueError, RecursionError):
+                        data = None
+                    if not isinstance(data, dict):
+                        limits.malformed()
+                        logger.debug(f"Malformed message from {client_ip}")
+                        data = None
+                else:
+                    data = None
+                if data is None:
+                    if limits.exceeded:
+                        logger.warning(f"Closing {client_ip}: too many rate-limited or malformed messages")
+                        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="rate limit exceeded")
+                        break
+                    continue
                 try:
-                    # Handle incoming messages if needed
-                    data = json.loads(message)
-                    logger.debug(f"Received message from {client_ip}: {data}")
+                    message_type = data.get("type")
+                    if not isinstance(message_type, str):
+                        message_type = None
+                    logger.debug(f"Received {message_type!r} message from {client_ip}")
+                    
+                    if len(message) > inbound_size_limit(message_type):
+                        logger.warning(f"Oversized {message_type!r} message ({len(message)} bytes) from {client_ip}")
+                        continue
+                    if not limits.allow(message_type):
+                        if limits.exceeded:
+                            logger.warning(f"Closing {client_ip}: inbound rate limit exceeded")
+                            await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="rate limit exceeded")
+                            break
+                        continue
                     
                     # Example: Handle specific commands from client
                     if data.get("type") == "ping":
@@ -279,9 +1125,26 @@ class HyperfocusGiftEngine:
                             "event": "pong",
                             "data": {"timestamp": asyncio.get_event_loop().time()}
                         }))
+                    elif data.get("type") == "snapshot":
+                        await websocket.send(await self.snapshot_frame())
+                    elif data.get("type") == "admin":
+                        await self._handle_admin(websocket, data, client_ip)
+                    elif data.get("type") == "connection:init":
+                        # Choose the payload profile once, at handshake
+                        payload = data.get("payload") or {}
+                        profile = self._resolve_profile(payload)
+                        user_refs = "user_refs" in (payload.get("capabilities") or [])
+                        self.set_client_profile(websocket, profile, user_refs=user_refs)
+                        await websocket.send(json.dumps({
+                            "event": "connection_ack",
+                            "data": {
+                                "profile": profile,
+                                "profiles": list(PAYLOAD_PROFILES),
+                                "user_refs": user_refs,
+                                "tap_teams": self.tap_battle.teams
+                            }
+                        }))
                         
-                except json.JSONDecodeError:
-                    logger.warning(f"Invalid JSON received from {client_ip}")
                 except Exception as e:
                     logger.error(f"Error processing message from {client_ip}: {e}")
                     
@@ -290,13 +1153,187 @@ class HyperfocusGiftEngine:
         except Exception as e:
             logger.error(f"WebSocket error: {e}", exc_info=True)
         finally:
-            self.connected_clients.remove(websocket)
+            self._remove_client(websocket)
+            self.admission.release(client_ip)
             logger.info(f"WebSocket disconnected. Remaining clients: {len(self.connected_clients)}")
             
+    def snapshot_state(self) -> Dict[str, Any]:
+        """Engine state a successor needs to carry on where this engine stops"""
+        return {
+            "event_seq": self.event_seq,
+            "users": self.user_registry.snapshot(),
+            "scheduler": {
+                "emitted": self.scheduler.emitted_count,
+                "merged": self.scheduler.merged_count
+            },
+            "sse_recent": self.sse.snapshot() if self.sse is not None else [],
+            "tap_battle": self.tap_battle.snapshot(),
+            "trigger_counters": self.triggers.counters if self.triggers is not None else {},
+            "social": self.social.snapshot(),
+            "gifter_coins": self.gifter_coins,
+            "backlog": self._backlog_dicts()
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        """Load a snapshot taken by snapshot_state()"""
+        self.event_seq = state.get("event_seq", 0)
+        self.user_registry.restore(state.get("users", {}))
+        scheduler = state.get("scheduler", {})
+        self.scheduler.emitted_count = scheduler.get("emitted", 0)
+        self.scheduler.merged_count = scheduler.get("merged", 0)
+        if self.sse is not None:
+            self.sse.restore(state.get("sse_recent", []))
+        self.tap_battle.restore(state.get("tap_battle", {}))
+        if self.triggers is not None:
+            self.triggers.counters.update(state.get("trigger_counters", {}))
+        self.social.restore(state.get("social", {}))
+        self.gifter_coins.update(state.get("gifter_coins", {}))
+        self.backlog.extend(state.get("backlog", []))
+        self.state_version += 1
+
+    def recover_checkpoint(self):
+        """Load the last checkpoint and replay the write-ahead log after it"""
+        state, entries = self.checkpointer.recover()
+        if state is None and not entries:
+            logger.info(f"No checkpoint in {self.checkpointer.directory}; starting fresh")
+            return
+        if state is not None:
+            self.restore_state(state)
+        for entry in entries:
+            kind = entry[0]
+            if kind == "event":
+                self.event_seq = entry[1]
+                if len(entry) > 3:
+                    self.backlog.append(RECORD_TYPES[entry[2]].from_fields(entry[3]))
+                elif len(entry) > 2 and entry[2] is not None:
+                    self.backlog.append(entry[2])  # Payload dict, as logged by older engines
+            elif kind == "coins":
+                self.gifter_coins[entry[1]] = self.gifter_coins.get(entry[1], 0) + entry[2]
+            elif kind == "tap":
+                self.tap_battle.restore(entry[1])
+            elif kind == "social":
+                self.social.restore(entry[1])
+        self.state_version += 1
+        logger.info(f"Recovered state at event #{self.event_seq} from {self.checkpointer.directory} "
+                    f"({len(entries)} logged changes replayed) in {self.checkpointer.recovery_ms:.1f} ms")
+
+    def adopt_handoff(self, conn, sockets: Dict[str, Any], state: Dict[str, Any]):
+        """Take over the listening sockets and state of the engine being replaced"""
+        self.handoff_conn = conn
+        self.inherited_sockets = sockets
+        self.taken_over = True
+        self.restore_state(state)
+        logger.info(f"Took over {', '.join(sockets) or 'no'} sockets at event #{self.event_seq}")
+
+    async def _on_handoff_takeover(self):
+        """Pause ingestion and flush queued events before passing state on"""
+        if self.client:
+            try:
+                await self.client.stop()
+            except Exception as e:
+                logger.error(f"Error pausing TikTok client for handoff: {e}")
+        await self.pipeline.join()
+        await self.scheduler.drain()
+        await self.pipeline.join()  # Gifts the scheduler just released
+        if self._fanout_tasks:
+            await asyncio.wait(self._fanout_tasks, timeout=5.0)
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._on_batch_tick()  # Flushes now and re-arms the tick
+            self._batch_handle.cancel()
+            self._batch_handle = None
+        if self._flush_tasks:
+            await asyncio.wait(self._flush_tasks, timeout=5.0)
+        
+        sockets = {"websocket": self.ws_server.sockets[0]}
+        if self.sse is not None and self.sse.server is not None:
+            sockets["sse"] = self.sse.server.sockets[0]
+        return sockets, self.snapshot_state()
+
+    def _confirm_handoff(self):
+        """Serving and ingesting; let the previous engine drain"""
+        if self.handoff_conn is None:
+            return
+        try:
+            confirm_ready(self.handoff_conn)
+        except OSError as e:
+            logger.error(f"Could not confirm handoff: {e}")
+        self.handoff_conn = None
+
+    async def _on_handoff_abort(self):
+        if self.client is None:
+            return  # Edge node: the bus connection was never paused
+        logger.info("Resuming TikTok ingestion")
+        try:
+            await self.client.start()
+        except Exception as e:
+            logger.error(f"Error resuming TikTok client after failed handoff: {e}")
+
+    async def _on_handoff_ready(self):
+        # The start() loop notices, drains clients and shuts down
+        self.handed_off = True
+        self.should_reconnect = False
+
+    async def _close_for_handoff(self, client, notice: str):
+        try:
+            await client.send(notice)
+            await client.close(code=CLOSE_SERVICE_RESTART, reason="server restarting")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def _drain_for_handoff(self):
+        """Stop accepting and move clients over to the successor a few at a time"""
+        # Only this process's copy of the listening sockets is closed; the successor keeps its own
+        self.ws_server.server.close()
+        if self.sse is not None and self.sse.server is not None:
+            self.sse.server.close()
+        
+        clients = list(self.connected_clients)
+        logger.info(f"Draining {len(clients)} clients to the successor over {HANDOFF_DRAIN_SECONDS:.0f}s")
+        notice = json.dumps({"event": "server_handoff", "data": {"reconnect": True}})
+        delay = HANDOFF_DRAIN_SECONDS / max(len(clients), 1)
+        closing = set()
+        for client in clients:
+            closing.add(asyncio.create_task(self._close_for_handoff(client, notice)))
+            await self.timers.sleep(delay)
+        if closing:
+            await asyncio.wait(closing, timeout=5.0)
+
     async def shutdown(self):
         """Gracefully shut down the server and clean up resources"""
         logger.info("Shutting down Hyperfocus Gift Engine...")
         self.should_reconnect = False
+        if self.handoff is not None:
+            await self.handoff.stop()
+            self.handoff = None
+        
+        # Stop releasing gifts before closing client connections
+        await self.scheduler.stop()
+        await self.pipeline.stop()
+        await self.bus.stop()
+        self.profiler.stop()
+        await self.loop_monitor.stop()
+        self.tap_battle.stop()
+        self.social.stop()
+        if self.triggers is not None:
+            self.triggers.stop()
+        if self._batch_handle is not None:
+            self._batch_handle.cancel()
+            self._batch_handle = None
+        self.pending_frames = {}
+        self.pending_users = {}
+        self.pending_traces = []
+        if self._fanout_tasks:
+            await asyncio.wait(self._fanout_tasks, timeout=5.0)
+        if self._flush_tasks:
+            await asyncio.wait(self._flush_tasks, timeout=5.0)
+        if self.tracer is not None:
+            await self.tracer.stop()
+        if self.archive is not None:
+            await self.archive.stop()
+        if self.checkpointer is not None:
+            # After a handoff the successor checkpoints the state from here on
+            await self.checkpointer.stop(final=not self.handed_off)
         
         # Close all WebSocket connections
         if self.connected_clients:
@@ -305,6 +1342,10 @@ class HyperfocusGiftEngine:
             if close_tasks:
                 await asyncio.wait(close_tasks, timeout=5.0)
             self.connected_clients.clear()
+            self.client_profiles.clear()
+            self.client_known_users.clear()
+            for clients in self.profile_clients.values():
+                clients.clear()
         
         # Disconnect from TikTok Live
         if hasattr(self, 'client') and self.client:
@@ -314,6 +1355,16 @@ class HyperfocusGiftEngine:
             except Exception as e:
                 logger.error(f"Error disconnecting from TikTok: {e}")
         
+        if self.shm_ring is not None:
+            # After a handoff the successor keeps writing to the same ring
+            self.shm_ring.close(unlink=not self.handed_off)
+            self.shm_ring = None
+        
+        if self.sse is not None:
+            await self.sse.stop()
+        
+        self.snapshot_encoder.close()
+        self.timers.stop()
         logger.info("Shutdown complete")
 
     async def start(self):
@@ -323,18 +1374,60 @@ class HyperfocusGiftEngine:
         for sig in (signal.SIGINT, signal.SIGTERM):
             loop.add_signal_handler(sig, lambda: asyncio.create_task(self.shutdown()))
         
-        # Start WebSocket server
+        # Start WebSocket server, on the previous engine's socket after a takeover
+        if "websocket" in self.inherited_sockets:
+            listen = {"sock": self.inherited_sockets["websocket"]}
+        else:
+            listen = {"host": "0.0.0.0", "port": self.websocket_port}  # Listen on all interfaces
         try:
             async with websockets.serve(
                 self.websocket_handler,
-                "0.0.0.0",  # Listen on all interfaces
-                self.websocket_port,
+                **listen,
                 ping_interval=30,
                 ping_timeout=10,
                 close_timeout=5,
-                max_size=2**25  # 32MB max message size
+                max_size=MAX_INBOUND_MESSAGE,  # Clients only send small commands
+                max_queue=MAX_INBOUND_QUEUE
             ) as server:
+                self.ws_server = server
                 logger.info(f"WebSocket server started on ws://0.0.0.0:{self.websocket_port}")
+                self.pipeline.start()
+                self.scheduler.start()
+                self.loop_monitor.start()
+                if self.tracer is not None:
+                    self.tracer.start_flusher()
+                if self.archive is not None:
+                    self.archive.start()
+                if self.triggers is not None:
+                    self.triggers.start()
+                await self.snapshot_encoder.start()
+                if self.checkpointer is not None:
+                    self.checkpointer.start(self.snapshot_state)
+                
+                if self.shm_name and self.shm_ring is None:
+                    self.shm_ring = SharedRingWriter(self.shm_name, slot_count=self.shm_slots,
+                                                     resume=self.taken_over)
+                    logger.info(f"Shared-memory event feed available as '{self.shm_name}'")
+                
+                if self.sse is not None and self.sse.server is None:
+                    await self.sse.start("0.0.0.0", self.sse_port, sock=self.inherited_sockets.get("sse"))
+                
+                if self.handoff_socket:
+                    self.handoff = HandoffListener(
+                        self.handoff_socket,
+                        self._on_handoff_takeover,
+                        self._on_handoff_ready,
+                        self._on_handoff_abort
+                    )
+                    self.handoff.start()
+                
+                await self.bus.start()
+                if self.edge_node:
+                    # Events arrive from the bus; there is no TikTok connection to keep up
+                    logger.info("Running as an edge node")
+                    self._confirm_handoff()
+                    while self.should_reconnect:
+                        await self.timers.sleep(1)
                 
                 # Start TikTok client with reconnection logic
                 while self.should_reconnect and self.reconnect_attempts < self.max_reconnect_attempts:
@@ -344,10 +1437,11 @@ class HyperfocusGiftEngine:
                         
                         # If we get here, the connection was successful
                         self.reconnect_attempts = 0
+                        self._confirm_handoff()
                         
                         # Keep the server running until shutdown
                         while self.should_reconnect:
-                            await asyncio.sleep(1)
+                            await self.timers.sleep(1)
                             
                     except Exception as e:
                         self.reconnect_attempts += 1
@@ -356,11 +1450,14 @@ class HyperfocusGiftEngine:
                         
                         if self.reconnect_attempts < self.max_reconnect_attempts:
                             logger.info(f"Reconnecting in {wait_time} seconds...")
-                            await asyncio.sleep(wait_time)
+                            await self.timers.sleep(wait_time)
                         else:
                             logger.error("Max reconnection attempts reached. Giving up.")
                             break
                 
+                if self.handed_off:
+                    await self._drain_for_handoff()
+                
         except asyncio.CancelledError:
             logger.info("Server shutdown requested")
         except Exception as e:
@@ -374,34 +1471,177 @@ def parse_arguments():
     parser.add_argument('username', nargs='?', default=None, help='TikTok username (without @)')
     parser.add_argument('--port', type=int, default=8765, help='WebSocket server port (default: 8765)')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+    parser.add_argument('--max-events-per-second', type=float, default=30.0,
+                        help='Gift output rate per stream before low-tier gifts are merged (default: 30)')
+    parser.add_argument('--shm-name', default=None,
+                        help='Publish events to a shared-memory ring for same-host consumers (see shm_ring.py)')
+    parser.add_argument('--shm-slots', type=int, default=DEFAULT_SLOT_COUNT,
+                        help=f'Events kept in the shared-memory ring (default: {DEFAULT_SLOT_COUNT})')
+    parser.add_argument('--sse-port', type=int, default=None,
+                        help='Serve events over Server-Sent Events at http://0.0.0.0:PORT/events')
+    parser.add_argument('--batch-interval-ms', type=float, default=0,
+                        help='Batch outbound WebSocket events per tick, e.g. 16 for one render frame; '
+                             'batched frames are JSON arrays of events (default: 0, disabled)')
+    parser.add_argument('--admin-token', default=os.environ.get('HYPERFOCUS_ADMIN_TOKEN'),
+                        help='Secret required for admin commands such as profiling '
+                             '(default: $HYPERFOCUS_ADMIN_TOKEN; admin commands are disabled if unset)')
+    parser.add_argument('--slow-callback-ms', type=float, default=DEFAULT_SLOW_CALLBACK * 1000,
+                        help=f'Report event-loop callbacks that block for this long '
+                             f'(default: {DEFAULT_SLOW_CALLBACK * 1000:.0f}; 0 disables)')
+    parser.add_argument('--user-cache-size', type=int, default=DEFAULT_USER_CACHE,
+                        help=f'Users kept in the identity cache for user_refs clients (default: {DEFAULT_USER_CACHE})')
+    parser.add_argument('--max-clients', type=int, default=DEFAULT_MAX_CLIENTS,
+                        help=f'Maximum WebSocket connections (default: {DEFAULT_MAX_CLIENTS})')
+    parser.add_argument('--max-clients-per-ip', type=int, default=DEFAULT_MAX_CLIENTS_PER_IP,
+                        help=f'Maximum WebSocket connections per client address (default: {DEFAULT_MAX_CLIENTS_PER_IP})')
+    parser.add_argument('--handoff-socket', default=None,
+                        help='Unix socket path a newer engine can take over from for a zero-downtime restart')
+    parser.add_argument('--takeover', default=None, metavar='HANDOFF_SOCKET',
+                        help='Take over listening sockets and state from the engine running with this --handoff-socket')
+    parser.add_argument('--bus-publish', default=None, metavar='ADDRESS',
+                        help='Publish encoded events to an event broker (unix:/path or tcp:host:port; see event_bus.py)')
+    parser.add_argument('--bus-subscribe', default=None, metavar='ADDRESS',
+                        help='Run as an edge node serving events from an event broker instead of TikTok')
+    parser.add_argument('--trace-file', default=None,
+                        help='Write sampled per-event latency traces to this file as OTLP/JSON lines')
+    parser.add_argument('--trace-sample-rate', type=float, default=DEFAULT_TRACE_SAMPLE_RATE,
+                        help=f'Fraction of gifts and comments traced (default: {DEFAULT_TRACE_SAMPLE_RATE})')
+    parser.add_argument('--archive-dir', default=None,
+                        help='Archive gifts and comments as Parquet files partitioned by stream and day '
+                             '(needs pyarrow; see event_archive.py)')
+    parser.add_argument('--archive-row-group', type=int, default=DEFAULT_ARCHIVE_ROW_GROUP,
+                        help=f'Rows per Parquet row group in the archive (default: {DEFAULT_ARCHIVE_ROW_GROUP})')
+    parser.add_argument('--idle-timeout', type=float, default=0,
+                        help='Close WebSocket clients that send nothing for this many seconds (default: 0, disabled)')
+    parser.add_argument('--tap-teams', default=",".join(DEFAULT_TAP_TEAMS),
+                        help=f'Comma-separated TapBattle team names (default: {",".join(DEFAULT_TAP_TEAMS)})')
+    parser.add_argument('--tap-tick-ms', type=float, default=DEFAULT_TAP_TICK_MS,
+                        help=f'How often TapBattle score changes are sent (default: {DEFAULT_TAP_TICK_MS:.0f})')
+    parser.add_argument('--comment-triggers', default=None,
+                        help='JSON file of comment keywords, emoji and commands mapped to effects and counters; '
+                             'reloaded when it changes (see comment_triggers.py)')
+    parser.add_argument('--social-interval-ms', type=float, default=DEFAULT_SOCIAL_INTERVAL_MS,
+                        help=f'How often like/follow/share/viewer summaries are sent '
+                             f'(default: {DEFAULT_SOCIAL_INTERVAL_MS:.0f})')
+    parser.add_argument('--like-goal', type=int, default=0,
+                        help='Like total that summaries report progress towards (default: 0, no goal)')
+    parser.add_argument('--pipeline-queue-size', type=int, default=DEFAULT_PIPELINE_QUEUE_SIZE,
+                        help=f'Events each pipeline stage queues before applying backpressure; TikTok '
+                             f'events beyond that are dropped (default: {DEFAULT_PIPELINE_QUEUE_SIZE})')
+    parser.add_argument('--encode-pool', choices=POOL_KINDS, default="thread",
+                        help='Worker pool that encodes large client snapshots off the event loop (default: thread)')
+    parser.add_argument('--offload-threshold', type=int, default=DEFAULT_OFFLOAD_THRESHOLD,
+                        help=f'Snapshot size (events + ranked gifters) from which encoding is offloaded '
+                             f'(default: {DEFAULT_OFFLOAD_THRESHOLD})')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Checkpoint engine state to this directory and recover it on restart')
+    parser.add_argument('--checkpoint-interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help=f'Seconds between full checkpoints; changes in between go to a write-ahead log '
+                             f'(default: {DEFAULT_CHECKPOINT_INTERVAL:g})')
+    parser.add_argument('--gift-tiers', default=None,
+                        help='Gift tier file written by engagement_analysis.py (overrides the built-in tiers)')
     return parser.parse_args()
 
 async def main():
     """Main entry point"""
     args = parse_arguments()
     
-    # Get username from command line or prompt
-    username = args.username
-    if not username:
+    # Get username from command line or prompt (edge nodes don't connect to TikTok)
+    username = args.username or ("" if args.bus_subscribe else None)
+    if username is None:
         username = input("Enter TikTok username (without @): ").strip()
     
-    if not username:
+    if not username and not args.bus_subscribe:
         print("Error: No username provided")
         sys.exit(1)
     
+    if args.archive_dir and not archive_available():
+        print("Error: --archive-dir needs pyarrow (pip install pyarrow)")
+        sys.exit(1)
+    
+    if args.max_events_per_second <= 0:
+        print("Error: --max-events-per-second must be positive")
+        sys.exit(1)
+    
+    tap_teams = tuple(team.strip() for team in args.tap_teams.split(",") if team.strip())
+    if len(tap_teams) < 2:
+        print("Error: --tap-teams needs at least two teams")
+        sys.exit(1)
+    
+    if args.gift_tiers:
+        try:
+            logger.info(f"Loaded {load_gift_tiers(args.gift_tiers)} gift tiers from {args.gift_tiers}")
+        except (OSError, ValueError) as e:
+            print(f"Error: could not load gift tiers: {e}")
+            sys.exit(1)
+    
     # Create the engine
     engine = HyperfocusGiftEngine(
         username=username,
         websocket_port=args.port,
-        debug=args.debug
+        debug=args.debug,
+        max_events_per_second=args.max_events_per_second,
+        shm_name=args.shm_name,
+        shm_slots=args.shm_slots,
+        sse_port=args.sse_port,
+        batch_interval_ms=args.batch_interval_ms,
+        admin_token=args.admin_token,
+        slow_callback_ms=args.slow_callback_ms,
+        user_cache_size=args.user_cache_size,
+        max_clients=args.max_clients,
+        max_clients_per_ip=args.max_clients_per_ip,
+        handoff_socket=args.handoff_socket,
+        bus_publish=args.bus_publish,
+        bus_subscribe=args.bus_subscribe,
+        trace_file=args.trace_file,
+        trace_sample_rate=args.trace_sample_rate,
+        archive_dir=args.archive_dir,
+        archive_row_group=args.archive_row_group,
+        idle_timeout=args.idle_timeout,
+        tap_teams=tap_teams,
+        tap_tick_ms=args.tap_tick_ms,
+        comment_triggers=args.comment_triggers,
+        social_interval_ms=args.social_interval_ms,
+        like_goal=args.like_goal,
+        pipeline_queue_size=args.pipeline_queue_size,
+        encode_pool=args.encode_pool,
+        offload_threshold=args.offload_threshold,
+        checkpoint_dir=args.checkpoint_dir,
+        checkpoint_interval=args.checkpoint_interval
     )
     
+    if engine.triggers is not None:
+        try:
+            logger.info(f"Loaded {engine.triggers.load()} comment triggers from {args.comment_triggers}")
+        except (OSError, ValueError) as e:
+            print(f"Error: could not load comment triggers: {e}")
+            sys.exit(1)
+    
+    # A takeover gets fresher state from the running engine instead
+    if engine.checkpointer is not None and not args.takeover:
+        try:
+            engine.recover_checkpoint()
+        except OSError as e:
+            print(f"Error: could not recover state from {args.checkpoint_dir}: {e}")
+            sys.exit(1)
+    
     # Initialize the TikTok client
-    success = await engine.initialize()
+    success = engine.edge_node or await engine.initialize()
     if not success:
         logger.error("Failed to initialize TikTok client. Make sure the username is correct and the user is live.")
         sys.exit(1)
     
+    # Take over only once our own client is ready, so the old engine's pause is short
+    if args.takeover:
+        try:
+            conn, sockets, state = await asyncio.get_running_loop().run_in_executor(
+                None, request_takeover, args.takeover
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"Takeover from {args.takeover} failed: {e}")
+            sys.exit(1)
+        engine.adopt_handoff(conn, sockets, state)
+    
     try:
         await engine.start()
     except asyncio.CancelledError:
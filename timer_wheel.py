@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Hierarchical timer wheel for the Hyperfocus Gift Engine
+
+One wheel serves every timeout in the engine (batch ticks, rate waits, idle
+clients, reconnect backoff, periodic flushes), so thousands of timers cost
+one loop callback per tick instead of one heap entry (or task) each.
+
+Timers are bucketed by expiry tick into LEVELS wheels of SLOTS slots each:
+level 0 holds the next SLOTS ticks, level 1 the next SLOTS**2 and so on. When
+level 0 wraps, the next level-1 slot is cascaded down, the same scheme as the
+Linux kernel's classic timer wheel. Scheduling and cancelling are O(1) (a
+dict insert or delete); each tick fires one slot.
+
+Timers fire on the first tick at or after their deadline, so they are up to
+one tick (DEFAULT_TICK) late and never early. The wheel only ticks while
+timers are pending.
+"""
+
+import asyncio
+import logging
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger('TikTokLive')
+
+DEFAULT_TICK = 0.01  # Seconds per tick
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4  # 10 ms ticks cover about 497 days before timers are clamped
+
+
+class TimerHandle:
+    __slots__ = ("when", "expires", "callback", "args", "cancelled", "_bucket", "_wheel")
+
+    def __init__(self, wheel: "TimerWheel", when: float, expires: int, callback: Callable, args: tuple):
+        self._wheel = wheel
+        self.when = when
+        self.expires = expires  # Absolute tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._bucket: Optional[Dict["TimerHandle", None]] = None
+
+    def cancel(self):
+        """Remove the timer from its slot (O(1)); safe to call more than once"""
+        if self.cancelled:
+            return
+        self.cancelled = True
+        bucket = self._bucket
+        if bucket is not None:
+            del bucket[self]
+            self._bucket = None
+            self._wheel.pending -= 1
+        self.callback = None
+        self.args = ()
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class TimerWheel:
+    def __init__(self, tick: float = DEFAULT_TICK):
+        """
+        Initialize the wheel
+
+        Args:
+            tick: Timer resolution in seconds
+        """
+        self.tick = tick
+        self.wheels: List[List[Dict[TimerHandle, None]]] = [
+            [{} for _ in range(SLOTS)] for _ in range(LEVELS)
+        ]
+        self.current = 0  # Last tick processed
+        self.pending = 0  # Scheduled timers not yet fired or cancelled
+        self.fired_count = 0
+        self._origin: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def _now_tick(self) -> int:
+        return int((self._loop.time() - self._origin) / self.tick)
+
+    def _place(self, handle: TimerHandle, earliest: int):
+        """Put a timer in the slot for its expiry tick (no earlier than `earliest`)"""
+        expires = max(handle.expires, earliest)
+        delta = expires - self.current
+        level = 0
+        while level < LEVELS - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+            level += 1
+        if delta >= 1 << (SLOT_BITS * LEVELS):
+            # Beyond the last wheel: park it as far out as possible; it is re-placed on cascade
+            expires = self.current + (1 << (SLOT_BITS * LEVELS)) - 1
+        bucket = self.wheels[level][(expires >> (SLOT_BITS * level)) & SLOT_MASK]
+        bucket[handle] = None
+        handle._bucket = bucket
+
+    def call_at(self, when: float, callback: Callable, *args: Any) -> TimerHandle:
+        """Run callback(*args) at loop time `when`"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._origin = self._loop.time()
+        if self._handle is None:
+            # Idle until now; jump straight to the present instead of replaying empty ticks
+            self.current = max(self.current, self._now_tick())
+        expires = math.ceil((when - self._origin) / self.tick)
+        handle = TimerHandle(self, when, expires, callback, args)
+        self._place(handle, self.current + 1)  # The current tick has already fired
+        self.pending += 1
+        if self._handle is None:
+            self._schedule_tick()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args: Any) -> TimerHandle:
+        """Run callback(*args) after `delay` seconds"""
+        loop = self._loop or asyncio.get_running_loop()
+        return self.call_at(loop.time() + max(delay, 0.0), callback, *args)
+
+    async def sleep(self, delay: float):
+        """asyncio.sleep on the wheel; cancelling the sleeper cancels its timer"""
+        future = asyncio.get_running_loop().create_future()
+        handle = self.call_later(delay, _wake, future)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    def _schedule_tick(self):
+        next_at = self._origin + (self.current + 1) * self.tick
+        self._handle = self._loop.call_at(next_at, self._on_tick)
+
+    def _cascade(self, level: int):
+        """Move the next slot of a higher wheel down to where its timers now belong"""
+        index = (self.current >> (SLOT_BITS * level)) & SLOT_MASK
+        bucket = self.wheels[level][index]
+        if not bucket:
+            return
+        self.wheels[level][index] = {}
+        for handle in bucket:
+            self._place(handle, self.current)  # The current slot fires right after cascading
+
+    def _on_tick(self):
+        # self._handle stays set while firing, so timers scheduled by callbacks don't restart the tick
+        target = self._now_tick()
+        while self.current < target and self.pending:
+            self.current += 1
+            index = self.current & SLOT_MASK
+            if index == 0:
+                for level in range(1, LEVELS):
+                    self._cascade(level)
+                    if (self.current >> (SLOT_BITS * level)) & SLOT_MASK:
+                        break
+            bucket = self.wheels[0][index]
+            if not bucket:
+                continue
+            self.wheels[0][index] = {}
+            self.pending -= len(bucket)
+            for handle in bucket:
+                handle._bucket = None  # Callbacks may cancel timers in this same slot
+            for handle in bucket:
+                if handle.cancelled:
+                    continue
+                callback, args = handle.callback, handle.args
+                handle.cancelled = True  # Fired; a late cancel() is a no-op
+                self.fired_count += 1
+                try:
+                    callback(*args)
+                except Exception as e:
+                    logger.error(f"Timer callback {getattr(callback, '__qualname__', callback)} failed: {e}",
+                                 exc_info=True)
+        self._handle = None
+        if self.pending:
+            self._schedule_tick()
+
+    def __len__(self):
+        return sum(len(bucket) for wheel in self.wheels for bucket in wheel)
+
+    def stop(self):
+        """Stop ticking and drop every pending timer; tasks in sleep() wake up now"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for wheel in self.wheels:
+            for bucket in wheel:
+                for handle in list(bucket):
+                    sleeper = handle.args[0] if handle.callback is _wake else None
+                    handle.cancel()
+                    if sleeper is not None:
+                        _wake(sleeper)
+        self.pending = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tick_ms": self.tick * 1000,
+            "timers": len(self),
+            "fired": self.fired_count
+        }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Per-stream user identity cache for the Hyperfocus Gift Engine
+
+Top gifters and chatters appear thousands of times per stream, and every
+gift or comment frame used to repeat their username and nickname. The
+registry gives each user a compact per-stream id. Clients that opt in (the
+"user_refs" capability) get the full profile once per connection as a
+`user_profile` frame, and events carry only the id after that.
+
+Ids are never reused. A user evicted from the LRU, or whose nickname changes,
+gets a fresh id, so a client's id -> profile table can't go stale.
+"""
+
+import collections
+import json
+import sys
+from typing import Any, Dict, Optional
+
+DEFAULT_CAPACITY = 50000
+
+
+class UserEntry:
+    __slots__ = ("user_id", "username", "nickname", "frame")
+
+    def __init__(self, user_id: int, username: str, nickname: str):
+        self.user_id = user_id
+        self.username = username
+        self.nickname = nickname
+        # Encoded once and shared by every connection that needs it
+        self.frame = json.dumps({
+            "event": "user_profile",
+            "user": {"id": user_id, "username": username, "nickname": nickname}
+        })
+
+
+class UserRegistry:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        Initialize the registry
+
+        Args:
+            capacity: Users kept before the least recently seen is evicted
+        """
+        self.capacity = capacity
+        self.users: "collections.OrderedDict[str, UserEntry]" = collections.OrderedDict()
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.users)
+
+    def lookup(self, username: str, nickname: Optional[str]) -> UserEntry:
+        """Return the user's entry, registering or refreshing it as needed"""
+        nickname = nickname or ""
+        entry = self.users.get(username)
+        if entry is not None and entry.nickname == nickname:
+            self.users.move_to_end(username)
+            return entry
+
+        entry = UserEntry(self.next_id, sys.intern(username), nickname)
+        self.next_id += 1
+        self.users[entry.username] = entry
+        self.users.move_to_end(entry.username)
+        if len(self.users) > self.capacity:
+            self.users.popitem(last=False)
+        return entry
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Registry contents in LRU order, for handoff to a successor engine"""
+        return {
+            "next_id": self.next_id,
+            "users": [[entry.user_id, entry.username, entry.nickname] for entry in self.users.values()]
+        }
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """Load a snapshot taken by snapshot()"""
+        self.users.clear()
+        for user_id, username, nickname in snapshot.get("users", []):
+            self.users[sys.intern(username)] = UserEntry(user_id, sys.intern(username), nickname)
+        self.next_id = max(snapshot.get("next_id", 1), self.next_id)